@@ -0,0 +1,222 @@
+"""
+==============================================================================
+CACHE DE CONSULTAS - Embedding da pergunta + resultados da busca RAG
+==============================================================================
+
+As mesmas perguntas se repetem o tempo todo durante um evento. Dois níveis
+em memória, ambos com TTL e descarte LRU:
+1. Texto normalizado da consulta → embedding (não depende do acervo)
+2. (consulta, limiar, quantidade, filtro) → resultados da busca
+
+O nível 2 é invalidado pela versão do acervo: ingestao_rag.py incrementa
+o arquivo de versão sempre que grava documentos. A verificação é um
+`stat` do arquivo, então uma consulta repetida responde em microssegundos.
+
+Usado pelas consultas das CLIs de busca (indice_lexical.py e
+indice_vetorial.py); o app Next.js tem o equivalente em src/lib/query-cache.ts.
+
+Autor: Pipeline de Dados SESI-SENAI
+Data: 2026-10-18
+==============================================================================
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+# ============================================================================
+# CONFIGURAÇÕES
+# ============================================================================
+
+# Versão do acervo (incrementada pela ingestão)
+ARQUIVO_VERSAO_CORPUS = Path(os.getenv("PIPELINE_RAIZ_DADOS", ".")) / ".cache" / "versao_corpus.txt"
+
+# Nível 1: embeddings das consultas
+CAPACIDADE_EMBEDDINGS = 2048
+TTL_EMBEDDINGS_SEGUNDOS = 24 * 3600
+
+# Nível 2: resultados das buscas
+CAPACIDADE_RESULTADOS = 4096
+TTL_RESULTADOS_SEGUNDOS = 10 * 60
+
+
+# ============================================================================
+# VERSÃO DO ACERVO
+# ============================================================================
+
+def ler_versao_corpus(caminho: Path = ARQUIVO_VERSAO_CORPUS) -> int:
+    try:
+        return int(caminho.read_text(encoding="utf-8").strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def incrementar_versao_corpus(caminho: Path = ARQUIVO_VERSAO_CORPUS) -> int:
+    """
+    Marca o acervo como alterado (gravação atômica).
+
+    Returns:
+        Nova versão
+    """
+    versao = ler_versao_corpus(caminho) + 1
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    caminho_temp = caminho.with_name(f".{caminho.name}.tmp")
+    caminho_temp.write_text(str(versao), encoding="utf-8")
+    os.replace(caminho_temp, caminho)
+    return versao
+
+
+# ============================================================================
+# CACHE LRU COM TTL
+# ============================================================================
+
+class CacheLRU:
+    """
+    Dicionário limitado: descarta o item usado há mais tempo quando cheio e
+    ignora itens mais velhos que `ttl_segundos`. Seguro entre threads.
+    """
+
+    def __init__(self, capacidade: int, ttl_segundos: float):
+        self.capacidade = capacidade
+        self.ttl = ttl_segundos
+        self._itens: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._itens)
+
+    def obter(self, chave: Any) -> Optional[Any]:
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            criado, valor = item
+            if time.monotonic() - criado > self.ttl:
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave: Any, valor: Any) -> None:
+        with self._lock:
+            self._itens[chave] = (time.monotonic(), valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._itens.clear()
+
+
+# ============================================================================
+# CACHE DE CONSULTAS
+# ============================================================================
+
+def normalizar_consulta(texto: str) -> str:
+    """
+    Chave da consulta: mesma pergunta com outra caixa, espaços ou pontuação
+    final cai na mesma entrada ("Gamificação?" == "gamificação").
+    """
+    texto = unicodedata.normalize("NFC", texto).casefold()
+    texto = " ".join(texto.split())
+    return re.sub(r"[\s?!.,;:]+$", "", texto)
+
+
+class CacheConsultas:
+    """
+    Caminho de consulta RAG com cache em dois níveis.
+
+    Uso:
+        cache = CacheConsultas(gerar_embedding, indice.match_documents)
+        resultados = cache.buscar("gamificação no ensino médio", 0.1, 10)
+
+    Seguro entre threads (a geração de um embedding que falta não segura
+    nenhum lock).
+    """
+
+    def __init__(
+        self,
+        gerar_embedding: Callable[[str], list[float]],
+        match_documents: Callable[[list[float], float, int, dict], list[dict]],
+        caminho_versao: Path = ARQUIVO_VERSAO_CORPUS
+    ):
+        self.gerar_embedding = gerar_embedding
+        self.match_documents = match_documents
+        self.caminho_versao = caminho_versao
+        self.embeddings = CacheLRU(CAPACIDADE_EMBEDDINGS, TTL_EMBEDDINGS_SEGUNDOS)
+        self.resultados = CacheLRU(CAPACIDADE_RESULTADOS, TTL_RESULTADOS_SEGUNDOS)
+        self.estatisticas = {"embedding_acertos": 0, "embedding_falhas": 0, "resultado_acertos": 0, "resultado_falhas": 0}
+        self._lock = threading.Lock()
+        self._assinatura_versao = self._assinatura()
+
+    def _assinatura(self) -> Optional[tuple[int, int]]:
+        try:
+            estado = os.stat(self.caminho_versao)
+            return estado.st_mtime_ns, estado.st_size
+        except FileNotFoundError:
+            return None
+
+    def _verificar_versao(self) -> None:
+        """Acervo mudou desde o último acesso: descarta os resultados."""
+        assinatura = self._assinatura()
+        with self._lock:
+            if assinatura != self._assinatura_versao:
+                self._assinatura_versao = assinatura
+                self.resultados.limpar()
+
+    def _contar(self, evento: str) -> None:
+        with self._lock:
+            self.estatisticas[evento] += 1
+
+    def embedding(self, consulta: str) -> list[float]:
+        """Embedding da consulta (nível 1)."""
+        chave = normalizar_consulta(consulta)
+        vetor = self.embeddings.obter(chave)
+        if vetor is not None:
+            self._contar("embedding_acertos")
+            return vetor
+        self._contar("embedding_falhas")
+        vetor = self.gerar_embedding(consulta)
+        self.embeddings.guardar(chave, vetor)
+        return vetor
+
+    def buscar(
+        self,
+        consulta: str,
+        limiar: float,
+        quantidade: int,
+        filtro: Optional[dict] = None
+    ) -> list[dict]:
+        """
+        Busca com os mesmos parâmetros de match_documents (nível 2).
+
+        Args:
+            consulta: Texto da pergunta
+            limiar: Similaridade mínima
+            quantidade: Máximo de resultados
+            filtro: Filtro jsonb sobre metadata
+
+        Returns:
+            Resultados de match_documents (mesma lista para consultas repetidas)
+        """
+        self._verificar_versao()
+        chave = (
+            normalizar_consulta(consulta), float(limiar), int(quantidade),
+            json.dumps(filtro or {}, sort_keys=True, ensure_ascii=False)
+        )
+        resultados = self.resultados.obter(chave)
+        if resultados is not None:
+            self._contar("resultado_acertos")
+            return resultados
+
+        self._contar("resultado_falhas")
+        resultados = self.match_documents(self.embedding(consulta), limiar, quantidade, filtro or {})
+        self.resultados.guardar(chave, resultados)
+        return resultados
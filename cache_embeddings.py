@@ -0,0 +1,181 @@
+"""
+==============================================================================
+CACHE DE EMBEDDINGS - Vetores já gerados, guardados localmente
+==============================================================================
+
+Usado por ingestao_rag.py antes de chamar a API de embeddings:
+- Chave: (origem, modelo, dimensão, SHA-256 do texto)
+- Vetores em float32 num arquivo binário só de acréscimos, lido por memmap
+  (6 KB por vetor de 1536 dimensões, contra ~30 KB em lista JSON)
+- Índice {sha256: linha} num JSON ao lado, gravado de forma atômica
+
+Reconstruir a tabela `documents` (novo ambiente, mudança de esquema) a
+partir dos mesmos JSON não gera nenhuma chamada à OpenAI.
+
+A origem separa os vetores da API oficial dos de qualquer outro servidor
+(OPENAI_BASE_URL apontando para servicos_falsos.py, por exemplo): vetores
+fictícios nunca são servidos como reais.
+
+Autor: Pipeline de Dados SESI-SENAI
+Data: 2026-10-18
+==============================================================================
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# ============================================================================
+# CONFIGURAÇÕES
+# ============================================================================
+
+# Pasta do cache (um par .f32 + .indice.json por origem/modelo/dimensão)
+PASTA_CACHE_EMBEDDINGS = Path(os.getenv("PIPELINE_RAIZ_DADOS", ".")) / ".cache" / "embeddings"
+
+# Hosts cujos vetores vão para o cache sem prefixo de origem
+HOSTS_API_OFICIAL = {"api.openai.com"}
+
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+def chave_texto(texto: str) -> str:
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def caminhos_cache(modelo: str, dimensao: int, pasta: Path = PASTA_CACHE_EMBEDDINGS, origem: str = "") -> tuple[Path, Path]:
+    """
+    Arquivos do cache de uma origem/modelo/dimensão.
+
+    Returns:
+        Tupla (arquivo de vetores .f32, índice .indice.json)
+    """
+    nome = re.sub(r"[^A-Za-z0-9._-]", "_", f"{origem}-{modelo}-{dimensao}" if origem else f"{modelo}-{dimensao}")
+    return pasta / f"{nome}.f32", pasta / f"{nome}.indice.json"
+
+
+def origem_da_url(base_url: str | None) -> str:
+    """
+    Origem dos vetores a partir do OPENAI_BASE_URL.
+
+    Args:
+        base_url: URL base do cliente OpenAI (None = padrão da biblioteca)
+
+    Returns:
+        "" para a API oficial, o host de qualquer outro servidor (sem a
+        porta: o servidor falso sobe numa porta livre a cada execução)
+    """
+    if not base_url:
+        return ""
+    host = urlsplit(base_url).hostname or base_url
+    return "" if host in HOSTS_API_OFICIAL else host
+
+
+class CacheEmbeddings:
+    """
+    Cache persistente de embeddings de um modelo/dimensão, separado por
+    origem (vazia = API oficial da OpenAI).
+
+    O arquivo de vetores só cresce: cada vetor novo é acrescentado ao final e
+    o índice é regravado depois, então uma execução interrompida deixa no
+    máximo linhas órfãs, nunca um índice apontando para dados incompletos.
+    Seguro para uso por várias threads.
+    """
+
+    def __init__(self, modelo: str, dimensao: int, pasta: Path = PASTA_CACHE_EMBEDDINGS, origem: str = ""):
+        if np is None:
+            raise ImportError("numpy é necessário para o cache de embeddings")
+
+        self.modelo = modelo
+        self.dimensao = dimensao
+        self.origem = origem
+        self.caminho_vetores, self.caminho_indice = caminhos_cache(modelo, dimensao, pasta, origem)
+        self._lock = threading.Lock()
+        self._mapa = None  # memmap aberto sob demanda
+
+        try:
+            with open(self.caminho_indice, 'r', encoding='utf-8') as f:
+                self.indice: dict[str, int] = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.indice = {}
+
+        # Descarta entradas que apontam além do que foi realmente gravado
+        linhas_gravadas = self._linhas_no_arquivo()
+        self.indice = {chave: linha for chave, linha in self.indice.items() if linha < linhas_gravadas}
+
+    def __len__(self) -> int:
+        return len(self.indice)
+
+    def _linhas_no_arquivo(self) -> int:
+        try:
+            return self.caminho_vetores.stat().st_size // (4 * self.dimensao)
+        except FileNotFoundError:
+            return 0
+
+    def _vetores(self):
+        """memmap somente leitura, reaberto quando o arquivo cresce."""
+        linhas = self._linhas_no_arquivo()
+        if self._mapa is None or self._mapa.shape[0] < linhas:
+            self._mapa = np.memmap(self.caminho_vetores, dtype=np.float32, mode="r", shape=(linhas, self.dimensao))
+        return self._mapa
+
+    def buscar(self, textos: list[str]) -> dict[int, list[float]]:
+        """
+        Procura os textos no cache.
+
+        Args:
+            textos: Textos a procurar
+
+        Returns:
+            {índice do texto: vetor} só para os encontrados
+        """
+        with self._lock:
+            linhas = {i: self.indice.get(chave_texto(texto)) for i, texto in enumerate(textos)}
+            linhas = {i: linha for i, linha in linhas.items() if linha is not None}
+            if not linhas:
+                return {}
+            vetores = self._vetores()
+            return {i: vetores[linha].tolist() for i, linha in linhas.items()}
+
+    def guardar(self, textos: list[str], vetores: list[list[float]]) -> None:
+        """
+        Acrescenta vetores ao cache (textos já presentes são ignorados).
+
+        Args:
+            textos: Textos vetorizados
+            vetores: Vetores na mesma ordem dos textos
+        """
+        with self._lock:
+            novos: dict[str, list[float]] = {}
+            for texto, vetor in zip(textos, vetores):
+                if len(vetor) != self.dimensao:
+                    raise ValueError(f"Vetor com {len(vetor)} dimensões (esperado {self.dimensao})")
+                chave = chave_texto(texto)
+                if chave not in self.indice:
+                    novos[chave] = vetor
+            if not novos:
+                return
+
+            self.caminho_vetores.parent.mkdir(parents=True, exist_ok=True)
+            primeira_linha = self._linhas_no_arquivo()
+            with open(self.caminho_vetores, "ab") as f:
+                f.truncate(primeira_linha * 4 * self.dimensao)  # Descarta linha parcial de uma gravação interrompida
+                f.write(np.asarray(list(novos.values()), dtype=np.float32).tobytes())
+
+            for deslocamento, chave in enumerate(novos):
+                self.indice[chave] = primeira_linha + deslocamento
+
+            caminho_temp = self.caminho_indice.with_name(f".{self.caminho_indice.name}.tmp")
+            with open(caminho_temp, 'w', encoding='utf-8') as f:
+                json.dump(self.indice, f)
+            os.replace(caminho_temp, self.caminho_indice)
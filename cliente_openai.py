@@ -0,0 +1,299 @@
+"""
+==============================================================================
+CLIENTE OPENAI CONTROLADO - Limite de taxa e retentativas compartilhados
+==============================================================================
+
+Usado pelas três etapas do pipeline (transcritor.py, extrator_dados.py e
+ingestao_rag.py) no lugar de chamadas diretas ao SDK:
+- Balde de fichas por requisições/minuto (RPM) e tokens/minuto (TPM)
+- Retentativa com backoff exponencial e jitter em 429, 5xx e falhas de rede
+- Ritmo ajustado pelos cabeçalhos x-ratelimit-* e retry-after das respostas
+
+Assim cada script pode rodar no limite da conta sem perder itens por 429.
+
+Autor: Pipeline de Dados SESI-SENAI
+Data: 2026-10-18
+==============================================================================
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    OpenAI,
+    RateLimitError,
+)
+
+# ============================================================================
+# CONFIGURAÇÕES
+# ============================================================================
+
+# Limites da conta (ajustados em tempo real pelos cabeçalhos da API)
+RPM_PADRAO = int(os.getenv("OPENAI_RPM", "500"))
+TPM_PADRAO = int(os.getenv("OPENAI_TPM", "200000"))
+
+# Retentativas
+MAX_TENTATIVAS = int(os.getenv("OPENAI_MAX_TENTATIVAS", "6"))
+ESPERA_BASE_SEGUNDOS = 1.0
+ESPERA_MAXIMA_SEGUNDOS = 60.0
+
+# Aproximação usada para estimar tokens antes da chamada
+CARACTERES_POR_TOKEN = 4
+
+
+# ============================================================================
+# BALDE DE FICHAS
+# ============================================================================
+
+class BaldeFichas:
+    """
+    Balde de fichas com reposição contínua: `limite_por_minuto` fichas,
+    repostas a `limite_por_minuto / 60` por segundo.
+
+    `reservar` sempre desconta as fichas (o saldo pode ficar negativo) e
+    devolve quanto tempo o chamador deve esperar, então reservas concorrentes
+    entram numa fila justa sem polling.
+    """
+
+    def __init__(self, limite_por_minuto: float):
+        self.capacidade = float(limite_por_minuto)
+        self.taxa = self.capacidade / 60.0
+        self.fichas = self.capacidade
+        self.atualizado = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _repor(self) -> None:
+        agora = time.monotonic()
+        self.fichas = min(self.capacidade, self.fichas + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+
+    def reservar(self, quantidade: float) -> float:
+        """Desconta `quantidade` fichas e retorna a espera necessária (segundos)."""
+        with self._lock:
+            self._repor()
+            self.fichas -= min(quantidade, self.capacidade)
+            return 0.0 if self.fichas >= 0 else -self.fichas / self.taxa
+
+    def pausar(self, segundos: float) -> None:
+        """Garante que nenhuma nova reserva seja liberada antes de `segundos`."""
+        with self._lock:
+            self._repor()
+            self.fichas = min(self.fichas, -segundos * self.taxa)
+
+    def ajustar(
+        self,
+        limite: Optional[float] = None,
+        restante: Optional[float] = None,
+        reset_segundos: Optional[float] = None
+    ) -> None:
+        """Sincroniza o balde com o que o servidor informou nos cabeçalhos."""
+        with self._lock:
+            self._repor()
+            if limite and limite != self.capacidade:
+                self.capacidade = float(limite)
+                self.taxa = self.capacidade / 60.0
+            if restante is not None:
+                self.fichas = min(self.fichas, restante)
+                if restante <= 0 and reset_segundos:
+                    self.fichas = min(self.fichas, -reset_segundos * self.taxa)
+
+
+# ============================================================================
+# FUNÇÕES AUXILIARES
+# ============================================================================
+
+def converter_duracao(valor: Optional[str]) -> Optional[float]:
+    """
+    Converte durações no formato dos cabeçalhos da OpenAI ("1s", "6m0s", "20ms").
+
+    Args:
+        valor: Texto do cabeçalho
+
+    Returns:
+        Segundos, ou None se ausente/inválido
+    """
+    if not valor:
+        return None
+    try:
+        return float(valor)
+    except ValueError:
+        pass
+
+    partes = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", valor)
+    if not partes:
+        return None
+
+    fatores = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(numero) * fatores[unidade] for numero, unidade in partes)
+
+
+def converter_numero(valor: Optional[str]) -> Optional[float]:
+    try:
+        return float(valor) if valor is not None else None
+    except ValueError:
+        return None
+
+
+def estimar_tokens(texto: Any) -> int:
+    """
+    Estimativa grosseira de tokens para reservar TPM antes da chamada.
+
+    Args:
+        texto: String, lista de strings ou lista de mensagens do chat
+
+    Returns:
+        Número aproximado de tokens
+    """
+    if texto is None:
+        return 0
+    if isinstance(texto, str):
+        return len(texto) // CARACTERES_POR_TOKEN + 1
+    if isinstance(texto, dict):
+        return estimar_tokens(texto.get("content"))
+    if isinstance(texto, (list, tuple)):
+        return sum(estimar_tokens(item) for item in texto)
+    return 0
+
+
+def tempo_retry_after(erro: Exception) -> Optional[float]:
+    """Extrai retry-after(-ms) da resposta de erro, se houver."""
+    resposta = getattr(erro, "response", None)
+    if resposta is None:
+        return None
+    cabecalhos = resposta.headers
+    ms = converter_numero(cabecalhos.get("retry-after-ms"))
+    if ms is not None:
+        return ms / 1000.0
+    return converter_duracao(cabecalhos.get("retry-after"))
+
+
+def erro_retentavel(erro: Exception) -> bool:
+    # 429 por cota esgotada: esperar não resolve, só um novo crédito/plano
+    if isinstance(erro, RateLimitError) and getattr(erro, "code", None) == "insufficient_quota":
+        return False
+    if isinstance(erro, (RateLimitError, APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(erro, APIStatusError) and erro.status_code >= 500
+
+
+# ============================================================================
+# CLIENTE CONTROLADO
+# ============================================================================
+
+class ClienteOpenAIControlado:
+    """
+    Envolve um cliente OpenAI aplicando limite de taxa e retentativas.
+
+    Expõe os três endpoints usados pelo pipeline com os mesmos argumentos do SDK:
+    `transcrever_audio`, `completar_chat` e `criar_embeddings`. É seguro para uso
+    por várias threads ao mesmo tempo (os baldes são compartilhados).
+    """
+
+    def __init__(
+        self,
+        client: OpenAI,
+        rpm: int = RPM_PADRAO,
+        tpm: int = TPM_PADRAO,
+        max_tentativas: int = MAX_TENTATIVAS
+    ):
+        if max_tentativas < 1:
+            raise ValueError(f"max_tentativas deve ser pelo menos 1 (recebido: {max_tentativas})")
+        self.client = client
+        self.requisicoes = BaldeFichas(rpm)
+        self.tokens = BaldeFichas(tpm)
+        self.max_tentativas = max_tentativas
+
+    # ------------------------------------------------------------------------
+    # Endpoints
+    # ------------------------------------------------------------------------
+    def transcrever_audio(self, **kwargs) -> Any:
+        return self._executar(self.client.with_raw_response.audio.transcriptions.create, 0, kwargs)
+
+    def completar_chat(self, **kwargs) -> Any:
+        tokens = estimar_tokens(kwargs.get("messages")) + int(kwargs.get("max_tokens") or 0)
+        return self._executar(self.client.with_raw_response.chat.completions.create, tokens, kwargs)
+
+    def criar_embeddings(self, **kwargs) -> Any:
+        tokens = estimar_tokens(kwargs.get("input"))
+        return self._executar(self.client.with_raw_response.embeddings.create, tokens, kwargs)
+
+    # ------------------------------------------------------------------------
+    # Controle de taxa
+    # ------------------------------------------------------------------------
+    def _aguardar_vez(self, tokens: int) -> None:
+        espera = max(self.requisicoes.reservar(1), self.tokens.reservar(tokens) if tokens else 0.0)
+        if espera > 0:
+            time.sleep(espera)
+
+    def _ajustar_pelos_cabecalhos(self, cabecalhos) -> None:
+        self.requisicoes.ajustar(
+            limite=converter_numero(cabecalhos.get("x-ratelimit-limit-requests")),
+            restante=converter_numero(cabecalhos.get("x-ratelimit-remaining-requests")),
+            reset_segundos=converter_duracao(cabecalhos.get("x-ratelimit-reset-requests")),
+        )
+        self.tokens.ajustar(
+            limite=converter_numero(cabecalhos.get("x-ratelimit-limit-tokens")),
+            restante=converter_numero(cabecalhos.get("x-ratelimit-remaining-tokens")),
+            reset_segundos=converter_duracao(cabecalhos.get("x-ratelimit-reset-tokens")),
+        )
+
+    def _espera_backoff(self, tentativa: int) -> float:
+        """Backoff exponencial com jitter (metade fixa, metade aleatória)."""
+        teto = min(ESPERA_MAXIMA_SEGUNDOS, ESPERA_BASE_SEGUNDOS * (2 ** tentativa))
+        return teto / 2 + random.uniform(0, teto / 2)
+
+    def _executar(self, criar: Callable[..., Any], tokens: int, kwargs: dict) -> Any:
+        ultimo_erro: Optional[Exception] = None
+
+        for tentativa in range(self.max_tentativas):
+            # Arquivos (áudio) precisam voltar ao início a cada tentativa
+            for valor in kwargs.values():
+                if hasattr(valor, "seek"):
+                    valor.seek(0)
+
+            self._aguardar_vez(tokens)
+
+            try:
+                resposta_bruta = criar(**kwargs)
+            except Exception as e:
+                if not erro_retentavel(e):
+                    raise
+                ultimo_erro = e
+                espera = tempo_retry_after(e) or self._espera_backoff(tentativa)
+                if isinstance(e, RateLimitError):
+                    # Todo mundo espera, não só esta thread
+                    self.requisicoes.pausar(espera)
+                print(f"   ⏳ {type(e).__name__}: nova tentativa em {espera:.1f}s "
+                      f"({tentativa + 1}/{self.max_tentativas})")
+                time.sleep(espera)
+                continue
+
+            self._ajustar_pelos_cabecalhos(resposta_bruta.headers)
+            return resposta_bruta.parse()
+
+        raise ultimo_erro
+
+
+def criar_cliente_openai(api_key: Optional[str] = None, **limites) -> ClienteOpenAIControlado:
+    """
+    Cria o cliente OpenAI controlado.
+
+    As retentativas internas do SDK ficam desligadas: quem decide quando e
+    quanto esperar é o ClienteOpenAIControlado.
+
+    Args:
+        api_key: Chave da API (padrão: OPENAI_API_KEY)
+        **limites: rpm, tpm e/ou max_tentativas
+
+    Returns:
+        Cliente pronto para uso
+    """
+    client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"), max_retries=0)
+    return ClienteOpenAIControlado(client, **limites)
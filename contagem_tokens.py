@@ -0,0 +1,199 @@
+"""
+==============================================================================
+CONTAGEM DE TOKENS - Contagem local e divisão de textos por orçamento
+==============================================================================
+
+Usado pelas etapas que precisam decidir, sem chamar a API, se um texto cabe
+num orçamento de tokens e como dividi-lo:
+- extrator_dados.py: map-reduce de transcrições longas
+- ingestao_rag.py: lotes de embeddings e divisão de documentos
+
+Usa o tiktoken quando disponível (contagem exata); sem ele, ou sem o arquivo
+de vocabulário, cai numa estimativa por caracteres.
+
+Autor: Pipeline de Dados SESI-SENAI
+Data: 2026-10-18
+==============================================================================
+"""
+
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# ============================================================================
+# CONFIGURAÇÕES
+# ============================================================================
+
+# Estimativa usada sem o tiktoken (português fica perto de 4 caracteres/token)
+CARACTERES_POR_TOKEN = 4
+
+# Vocabulário usado quando o modelo não é reconhecido pelo tiktoken
+CODIFICACAO_PADRAO = "o200k_base"
+
+
+# ============================================================================
+# CONTAGEM
+# ============================================================================
+
+@lru_cache(maxsize=None)
+def _codificador(modelo: str):
+    """Codificador do tiktoken para o modelo, ou None se indisponível."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(modelo)
+    except KeyError:
+        pass
+    except Exception:
+        return None  # Vocabulário não baixado (ex.: máquina sem rede)
+    try:
+        return tiktoken.get_encoding(CODIFICACAO_PADRAO)
+    except Exception:
+        return None
+
+
+def contar_tokens(texto: str, modelo: str = "gpt-4o-mini") -> int:
+    """
+    Conta os tokens de um texto localmente.
+
+    Args:
+        texto: Texto a contar
+        modelo: Modelo cujo vocabulário deve ser usado
+
+    Returns:
+        Número de tokens (exato com tiktoken, estimado sem ele)
+    """
+    codificador = _codificador(modelo)
+    if codificador is not None:
+        return len(codificador.encode(texto, disallowed_special=()))
+    return len(texto) // CARACTERES_POR_TOKEN + 1
+
+
+# ============================================================================
+# DIVISÃO
+# ============================================================================
+
+def _dividir_paragrafo(paragrafo: str, max_tokens: int, modelo: str) -> list[str]:
+    """
+    Quebra um parágrafo grande demais: primeiro por frases e, se uma frase
+    sozinha ainda estourar, por palavras.
+    """
+    pedacos = []
+    atual: list[str] = []
+    tokens_atual = 0
+
+    frases = re.split(r"(?<=[.!?…])\s+", paragrafo)
+    for frase in frases:
+        unidades = [frase] if contar_tokens(frase, modelo) <= max_tokens else frase.split()
+        for unidade in unidades:
+            tokens = contar_tokens(unidade, modelo) + 1
+            if atual and tokens_atual + tokens > max_tokens:
+                pedacos.append(" ".join(atual))
+                atual, tokens_atual = [], 0
+            atual.append(unidade)
+            tokens_atual += tokens
+
+    if atual:
+        pedacos.append(" ".join(atual))
+    return pedacos
+
+
+def _final_do_texto(texto: str, max_tokens: int, modelo: str) -> str:
+    """
+    Maior final de `texto` com até `max_tokens` tokens que começa numa
+    fronteira de frase (ou de palavra, se nem a última frase couber).
+
+    O final é uma fatia literal do texto: quem junta os trechos de volta
+    (mergeChunkContents no app) reconhece a repetição comparando sufixos.
+    """
+    if max_tokens <= 0:
+        return ""
+    for fronteira in (r"(?<=[.!?…])\s+", r"\s+"):
+        final = ""
+        inicios = [m.end() for m in re.finditer(fronteira, texto)]
+        for inicio in reversed(inicios):
+            candidato = texto[inicio:]
+            if contar_tokens(candidato, modelo) > max_tokens:
+                break
+            final = candidato
+        if final:
+            return final
+    return ""
+
+
+def dividir_por_tokens(
+    texto: str,
+    max_tokens: int,
+    sobreposicao_tokens: int = 0,
+    modelo: str = "gpt-4o-mini"
+) -> list[str]:
+    """
+    Divide um texto em segmentos de até `max_tokens`, respeitando parágrafos
+    (linhas em branco, como no markdown) sempre que possível.
+
+    Cada segmento começa repetindo o final do anterior até somar
+    `sobreposicao_tokens`, para que nenhuma ideia fique cortada na fronteira:
+    parágrafos inteiros quando cabem e, do parágrafo que não cabe inteiro,
+    as últimas frases (ou palavras).
+
+    Args:
+        texto: Texto a dividir
+        max_tokens: Orçamento de tokens por segmento
+        sobreposicao_tokens: Tokens repetidos entre segmentos vizinhos
+        modelo: Modelo cujo vocabulário deve ser usado
+
+    Returns:
+        Lista de segmentos (um só se o texto couber inteiro)
+    """
+    texto = texto.strip()
+    if not texto:
+        return []
+    if contar_tokens(texto, modelo) <= max_tokens:
+        return [texto]
+
+    paragrafos: list[tuple[str, int]] = []
+    for paragrafo in re.split(r"\n\s*\n", texto):
+        paragrafo = paragrafo.strip()
+        if not paragrafo:
+            continue
+        for pedaco in _dividir_paragrafo(paragrafo, max_tokens, modelo):
+            paragrafos.append((pedaco, contar_tokens(pedaco, modelo)))
+
+    segmentos = []
+    atual: list[tuple[str, int]] = []
+    tokens_atual = 0
+    novos_no_atual = 0
+
+    for paragrafo, tokens in paragrafos:
+        if novos_no_atual and tokens_atual + tokens > max_tokens:
+            segmentos.append("\n\n".join(p for p, _ in atual))
+
+            # Carrega o final do segmento anterior como sobreposição
+            sobra: list[tuple[str, int]] = []
+            tokens_sobra = 0
+            limite = min(sobreposicao_tokens, max_tokens - tokens)
+            for anterior, tokens_anterior in reversed(atual):
+                if tokens_sobra + tokens_anterior <= limite:
+                    sobra.insert(0, (anterior, tokens_anterior))
+                    tokens_sobra += tokens_anterior
+                    continue
+                final = _final_do_texto(anterior, limite - tokens_sobra, modelo)
+                if final:
+                    tokens_final = contar_tokens(final, modelo)
+                    sobra.insert(0, (final, tokens_final))
+                    tokens_sobra += tokens_final
+                break
+
+            atual, tokens_atual, novos_no_atual = sobra, tokens_sobra, 0
+
+        atual.append((paragrafo, tokens))
+        tokens_atual += tokens
+        novos_no_atual += 1
+
+    if novos_no_atual:
+        segmentos.append("\n\n".join(p for p, _ in atual))
+    return segmentos
@@ -18,10 +18,19 @@ Data: 2026-01-21
 import os
 import json
 import re
+import hashlib
+import argparse
+import threading
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from openai import OpenAI
+from typing import Any, Callable
 from dotenv import load_dotenv
 
+from cliente_openai import ClienteOpenAIControlado, criar_cliente_openai
+from contagem_tokens import contar_tokens, dividir_por_tokens
+from lote_openai import ExecutorLoteLocal, ExecutorLoteOpenAI, montar_requisicao
+
 # Carrega variáveis de ambiente
 load_dotenv()
 
@@ -29,12 +38,35 @@ load_dotenv()
 # CONFIGURAÇÕES
 # ============================================================================
 
+# Raiz de Videos/ e .cache/ (benchmarks apontam para uma cópia)
+RAIZ_DADOS = Path(os.getenv("PIPELINE_RAIZ_DADOS", "."))
+
 # Diretórios de entrada e saída
-INPUT_DIR = Path("./Videos/transcricoes")
-OUTPUT_DIR = Path("./Videos/json_finais")
+INPUT_DIR = RAIZ_DADOS / "Videos" / "transcricoes"
+OUTPUT_DIR = RAIZ_DADOS / "Videos" / "json_finais"
 
 # Modelo da OpenAI
 MODEL = "gpt-4o-mini"  # Pode usar "gpt-4o" para maior qualidade
+TEMPERATURE = 0.3  # Baixa temperatura para respostas mais consistentes
+
+# Impressões digitais das extrações já feitas (transcrição + prompt + modelo + temperatura)
+IMPRESSOES_PATH = RAIZ_DADOS / ".cache" / "extracao" / "impressoes.json"
+
+# Modo --lote-local: Cédulas fictícias e suas impressões ficam separadas
+# (nunca sobrescrevem as Cédulas reais nem marcam episódios como extraídos)
+PASTA_LOTE_LOCAL = RAIZ_DADOS / ".cache" / "lote_local"
+
+# Reprocessa tudo, mesmo transcrições inalteradas (PIPELINE_SEM_CACHE=1 também
+# ignora as impressões: benchmarks repetidos chamam a API de novo)
+FORCAR_REPROCESSAMENTO = os.getenv("EXTRATOR_FORCAR", "") == "1" or os.getenv("PIPELINE_SEM_CACHE", "") == "1"
+
+# Transcrições processadas em paralelo (chamadas simultâneas ao chat)
+MAX_CONCORRENCIA = int(os.getenv("EXTRATOR_CONCORRENCIA", "4"))
+
+# Map-reduce para transcrições longas (decisão pela contagem local de tokens)
+LIMITE_TOKENS_DIRETO = 12000  # Acima disso, resume os trechos antes da extração
+TOKENS_POR_SEGMENTO = 4000
+MAX_CONCORRENCIA_MAP = 4  # Trechos resumidos em paralelo por transcrição
 
 # ============================================================================
 # SYSTEM PROMPT - Design Instrucional e BNCC
@@ -72,6 +104,80 @@ INSTRUÇÕES IMPORTANTES:
 7. Retorne SOMENTE o JSON válido, sem texto adicional."""
 
 
+# Etapa "map": resumo barato de cada trecho de uma transcrição longa
+MAP_PROMPT = """Você está ajudando a catalogar um episódio da série "Destino: Educação".
+Receberá UM TRECHO da transcrição. Resuma o trecho em tópicos objetivos (no máximo 300 palavras), preservando:
+- Nome da escola, cidade e país
+- Metodologias e práticas pedagógicas concretas (rituais de aula, organização, avaliação)
+- Problemas de alunos/educadores que a prática resolve
+- Disciplinas e áreas do conhecimento trabalhadas
+- Competências, valores e resultados mencionados
+Não invente nada que não esteja no trecho. Responda apenas com os tópicos."""
+
+
+# Correção pontual: só os campos inválidos, a partir da própria Cédula (sem a transcrição)
+CORRECAO_PROMPT = """Você revisa "Cédulas de Inovação" da série "Destino: Educação".
+Receberá uma Cédula já extraída e a lista de campos de "metadata" que vieram ausentes ou em formato inválido.
+Preencha SOMENTE esses campos, com base no "pageContent" e nos demais metadados, seguindo os tipos:
+- "titulo" e "pilar_inovacao": String não vazia
+- "temporada" e "episodio": Int positivo
+- "gatilhos_comportamentais", "gatilhos_conteudo" e "competencias_bncc": lista de Strings
+Retorne SOMENTE um JSON no formato {"metadata": {<apenas os campos pedidos>}}."""
+
+
+# ============================================================================
+# REGISTRO DE IMPRESSÕES DIGITAIS (EXTRAÇÃO INCREMENTAL)
+# ============================================================================
+
+def calcular_impressao(transcricao: str, nome_arquivo: str) -> str:
+    """
+    Impressão digital de uma extração: muda se a transcrição, o nome do arquivo
+    (vai no prompt), os prompts (inclusive o de correção), o modelo, a
+    temperatura ou os limites do map-reduce mudarem.
+    
+    Args:
+        transcricao: Texto da transcrição
+        nome_arquivo: Nome do arquivo (sem extensão)
+        
+    Returns:
+        Hash SHA-256 em hexadecimal
+    """
+    partes = [
+        transcricao, nome_arquivo, SYSTEM_PROMPT, MAP_PROMPT, CORRECAO_PROMPT, MODEL, repr(TEMPERATURE),
+        str(LIMITE_TOKENS_DIRETO), str(TOKENS_POR_SEGMENTO)
+    ]
+    return hashlib.sha256("\x00".join(partes).encode("utf-8")).hexdigest()
+
+
+class RegistroImpressoes:
+    """
+    Registro persistente {arquivo: impressão} das extrações concluídas,
+    junto com a pasta onde esses JSON são salvos.
+    
+    Atualizado (com gravação atômica) assim que cada JSON é salvo, então uma
+    execução interrompida não perde o que já foi extraído.
+    """
+    
+    def __init__(self, caminho: Path, pasta_saida: Path = OUTPUT_DIR):
+        self.caminho = caminho
+        self.pasta_saida = pasta_saida
+        self._lock = threading.Lock()
+        try:
+            with open(caminho, 'r', encoding='utf-8') as f:
+                self.impressoes: dict[str, str] = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.impressoes = {}
+    
+    def inalterado(self, nome_arquivo: str, impressao: str, arquivo_saida: Path) -> bool:
+        return self.impressoes.get(nome_arquivo) == impressao and arquivo_saida.exists()
+    
+    def registrar(self, nome_arquivo: str, impressao: str) -> None:
+        with self._lock:
+            self.impressoes[nome_arquivo] = impressao
+            self.caminho.parent.mkdir(parents=True, exist_ok=True)
+            salvar_json(self.impressoes, self.caminho)
+
+
 # ============================================================================
 # FUNÇÕES AUXILIARES
 # ============================================================================
@@ -110,30 +216,308 @@ def ler_transcricao(caminho_arquivo: Path) -> str:
 
 def salvar_json(dados: dict, caminho_saida: Path) -> None:
     """
-    Salva dados estruturados em arquivo JSON.
+    Salva dados estruturados em arquivo JSON de forma atômica
+    (grava num temporário e renomeia: nunca deixa um JSON pela metade).
     
     Args:
         dados: Dicionário com os dados extraídos
         caminho_saida: Path para o arquivo .json de saída
     """
-    with open(caminho_saida, 'w', encoding='utf-8') as f:
+    caminho_temp = caminho_saida.with_name(f".{caminho_saida.name}.tmp")
+    with open(caminho_temp, 'w', encoding='utf-8') as f:
         json.dump(dados, f, ensure_ascii=False, indent=2)
+    os.replace(caminho_temp, caminho_saida)
+
 
+# ============================================================================
+# VALIDAÇÃO E REPARO DA CÉDULA
+# ============================================================================
+
+# Estrutura esperada: caminho do campo -> tipo ("texto", "inteiro" ou "lista")
+ESQUEMA_CEDULA = {
+    "pageContent": "texto",
+    "metadata.titulo": "texto",
+    "metadata.temporada": "inteiro",
+    "metadata.episodio": "inteiro",
+    "metadata.pilar_inovacao": "texto",
+    "metadata.gatilhos_comportamentais": "lista",
+    "metadata.gatilhos_conteudo": "lista",
+    "metadata.competencias_bncc": "lista",
+}
 
-def processar_com_openai(client: OpenAI, transcricao: str, nome_arquivo: str) -> dict:
+CAMPOS_LISTA = ("gatilhos_comportamentais", "gatilhos_conteudo", "competencias_bncc")
+
+_VERIFICADORES: dict[str, Callable[[Any], bool]] = {
+    "texto": lambda valor: isinstance(valor, str) and bool(valor.strip()),
+    "inteiro": lambda valor: type(valor) is int and valor > 0,
+    "lista": lambda valor: isinstance(valor, list) and all(isinstance(item, str) and item.strip() for item in valor),
+}
+
+
+def compilar_esquema(esquema: dict[str, str]) -> list[tuple[str, tuple[str, ...], Callable[[Any], bool]]]:
     """
-    Processa a transcrição usando a API da OpenAI.
+    Compila o esquema uma única vez em (campo, caminho, verificador), para que
+    validar uma Cédula seja só percorrer uma lista de funções.
     
     Args:
-        client: Cliente OpenAI configurado
-        transcricao: Texto da transcrição
+        esquema: {caminho do campo: tipo}
+        
+    Returns:
+        Lista de verificadores prontos
+    """
+    return [(campo, tuple(campo.split(".")), _VERIFICADORES[tipo]) for campo, tipo in esquema.items()]
+
+
+_VALIDADORES_CEDULA = compilar_esquema(ESQUEMA_CEDULA)
+
+
+def _ler_campo(dados: Any, caminho: tuple[str, ...]) -> Any:
+    for chave in caminho:
+        if not isinstance(dados, dict):
+            return None
+        dados = dados.get(chave)
+    return dados
+
+
+def validar_cedula(cedula: Any) -> list[str]:
+    """
+    Valida a Cédula contra ESQUEMA_CEDULA.
+    
+    Args:
+        cedula: Dicionário devolvido pelo modelo
+        
+    Returns:
+        Campos inválidos ou ausentes (lista vazia se a Cédula é válida)
+    """
+    return [campo for campo, caminho, verificar in _VALIDADORES_CEDULA if not verificar(_ler_campo(cedula, caminho))]
+
+
+def _chave_item(item: str) -> str:
+    """Chave de comparação sem acentos, caixa ou espaços extras."""
+    sem_acentos = unicodedata.normalize("NFKD", item).encode("ascii", "ignore").decode("ascii")
+    return " ".join(sem_acentos.casefold().split())
+
+
+def _como_inteiro(valor: Any) -> int | None:
+    if type(valor) is int:
+        return valor
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    if isinstance(valor, str) and valor.strip().isdigit():
+        return int(valor.strip())
+    return None
+
+
+def reparar_cedula(cedula: dict, nome_arquivo: str) -> dict:
+    """
+    Corrige localmente (sem chamar a API) o que dá para corrigir:
+    - temporada/episodio vêm do nome do arquivo (T1E1) ou viram inteiros
+    - listas de gatilhos/competências sem itens repetidos ou vazios
+    - espaços sobrando em textos
+    
+    Args:
+        cedula: Dicionário devolvido pelo modelo (alterado no lugar)
+        nome_arquivo: Nome do arquivo (sem extensão)
+        
+    Returns:
+        A mesma Cédula, reparada
+    """
+    if isinstance(cedula.get("pageContent"), str):
+        cedula["pageContent"] = cedula["pageContent"].strip()
+    
+    metadata = cedula.get("metadata")
+    if not isinstance(metadata, dict):
+        metadata = cedula["metadata"] = {}
+    
+    # O nome do arquivo manda; sem o padrão T{n}E{n}, aproveita o que o modelo inferiu
+    temporada, episodio = extrair_temporada_episodio(nome_arquivo)
+    tem_padrao = re.match(r'T(\d+)E(\d+)', nome_arquivo) is not None
+    for campo, do_arquivo in (("temporada", temporada), ("episodio", episodio)):
+        valor = _como_inteiro(metadata.get(campo))
+        metadata[campo] = do_arquivo if tem_padrao or valor is None or valor <= 0 else valor
+    
+    for campo in ("titulo", "pilar_inovacao"):
+        if isinstance(metadata.get(campo), str):
+            metadata[campo] = metadata[campo].strip()
+    
+    for campo in CAMPOS_LISTA:
+        valor = metadata.get(campo)
+        if isinstance(valor, str):
+            valor = re.split(r"[;,]", valor)
+        if not isinstance(valor, list):
+            continue
+        vistos = set()
+        itens = []
+        for item in valor:
+            if not isinstance(item, str) or not item.strip():
+                continue
+            chave = _chave_item(item)
+            if chave not in vistos:
+                vistos.add(chave)
+                itens.append(item.strip())
+        metadata[campo] = itens
+    
+    return cedula
+
+
+def preparar_cedula(conteudo: str, nome_arquivo: str) -> tuple[dict, list[str]]:
+    """
+    Interpreta a resposta do modelo, repara o que for local e valida.
+    
+    Args:
+        conteudo: Texto JSON devolvido pelo modelo
+        nome_arquivo: Nome do arquivo (sem extensão)
+        
+    Returns:
+        Tupla (Cédula reparada, campos ainda inválidos)
+    """
+    cedula = json.loads(conteudo)
+    if not isinstance(cedula, dict):
+        raise ValueError("Resposta não é um objeto JSON")
+    reparar_cedula(cedula, nome_arquivo)
+    return cedula, validar_cedula(cedula)
+
+
+def corpo_correcao(cedula: dict, campos: list[str], nome_arquivo: str) -> dict:
+    """
+    Monta a requisição que pede de novo só os campos inválidos, usando a
+    própria Cédula como contexto (bem menor que a transcrição).
+    
+    Args:
+        cedula: Cédula reparada
+        campos: Campos inválidos (todos em "metadata")
         nome_arquivo: Nome do arquivo para contexto
         
     Returns:
-        Dicionário com pageContent e metadata
+        Corpo da requisição de chat com saída JSON
+    """
+    pedidos = ", ".join(campo.split(".", 1)[1] for campo in campos)
+    user_message = f"""ARQUIVO: {nome_arquivo}
+CAMPOS A CORRIGIR: {pedidos}
+
+=== CÉDULA ===
+{json.dumps(cedula, ensure_ascii=False, indent=2)}
+=== FIM DA CÉDULA ==="""
+
+    return {
+        "model": MODEL,
+        "response_format": {"type": "json_object"},
+        "messages": [
+            {"role": "system", "content": CORRECAO_PROMPT},
+            {"role": "user", "content": user_message}
+        ],
+        "temperature": TEMPERATURE,
+        "max_tokens": 500
+    }
+
+
+def aplicar_correcao(cedula: dict, conteudo: str, campos: list[str], nome_arquivo: str) -> list[str]:
+    """
+    Copia para a Cédula os campos devolvidos pela correção e valida de novo.
+    
+    Args:
+        cedula: Cédula reparada (alterada no lugar)
+        conteudo: Texto JSON devolvido pela correção
+        campos: Campos que foram pedidos
+        nome_arquivo: Nome do arquivo (sem extensão)
+        
+    Returns:
+        Campos que continuam inválidos
+    """
+    correcao = json.loads(conteudo)
+    for campo in campos:
+        caminho = tuple(campo.split("."))
+        valor = _ler_campo(correcao, caminho)
+        if valor is None and isinstance(correcao, dict):
+            valor = correcao.get(caminho[-1])  # Modelo respondeu sem o "metadata"
+        if valor is not None:
+            cedula["metadata"][caminho[-1]] = valor
+    reparar_cedula(cedula, nome_arquivo)
+    return validar_cedula(cedula)
+
+
+def exigir_corrigivel(campos: list[str]) -> None:
+    """Sem pageContent não há contexto para uma correção pontual."""
+    if "pageContent" in campos:
+        raise ValueError("Cédula sem 'pageContent' válido (reextração necessária)")
+
+
+def finalizar_cedula(
+    client: ClienteOpenAIControlado,
+    conteudo: str,
+    nome_arquivo: str,
+    log: list[str]
+) -> dict:
+    """
+    Valida a resposta da extração e, se preciso, pede de novo só os campos
+    inválidos (uma tentativa). Cédulas que continuam inválidas não são salvas.
+    
+    Args:
+        client: Cliente OpenAI controlado
+        conteudo: Texto JSON devolvido pela extração
+        nome_arquivo: Nome do arquivo (sem extensão)
+        log: Lista onde as mensagens de progresso são acrescentadas
+        
+    Returns:
+        Cédula válida
+    """
+    cedula, invalidos = preparar_cedula(conteudo, nome_arquivo)
+    if not invalidos:
+        return cedula
+    
+    exigir_corrigivel(invalidos)
+    log.append(f"   🩹 Corrigindo campos inválidos: {', '.join(invalidos)}")
+    response = client.completar_chat(**corpo_correcao(cedula, invalidos, nome_arquivo))
+    restantes = aplicar_correcao(cedula, response.choices[0].message.content, invalidos, nome_arquivo)
+    if restantes:
+        raise ValueError(f"Cédula continua inválida: {', '.join(restantes)}")
+    return cedula
+
+
+# ============================================================================
+# REQUISIÇÕES DE EXTRAÇÃO
+# ============================================================================
+
+def corpo_resumo(trecho: str, nome_arquivo: str, parte: str) -> dict:
+    """
+    Monta a requisição da etapa "map" (resumo de um trecho da transcrição).
+    O mesmo corpo é usado na chamada síncrona e no modo lote.
+    
+    Args:
+        trecho: Trecho da transcrição
+        nome_arquivo: Nome do arquivo para contexto
+        parte: Identificação do trecho (ex.: "2/5")
+        
+    Returns:
+        Corpo da requisição de chat
+    """
+    return {
+        "model": MODEL,
+        "messages": [
+            {"role": "system", "content": MAP_PROMPT},
+            {"role": "user", "content": f"ARQUIVO: {nome_arquivo}\nTRECHO {parte}:\n\n{trecho}"}
+        ],
+        "temperature": TEMPERATURE,
+        "max_tokens": 800
+    }
+
+
+def corpo_extracao(nome_arquivo: str, conteudo: str, resumido: bool) -> dict:
+    """
+    Monta a requisição de extração da Cédula (etapa "reduce" quando `resumido`).
+    O mesmo corpo é usado na chamada síncrona e no modo lote.
+    
+    Args:
+        nome_arquivo: Nome do arquivo para contexto
+        conteudo: Transcrição completa ou resumos dos trechos
+        resumido: True se `conteudo` são os resumos do map-reduce
+        
+    Returns:
+        Corpo da requisição de chat com saída JSON
     """
     # Extrair informações do nome do arquivo para contexto adicional
     temporada, episodio = extrair_temporada_episodio(nome_arquivo)
+    rotulo = "RESUMOS DOS TRECHOS DA TRANSCRIÇÃO" if resumido else "TRANSCRIÇÃO"
     
     # Construir mensagem do usuário com contexto
     user_message = f"""Analise a seguinte transcrição do episódio da série "Destino: Educação":
@@ -142,41 +526,317 @@ ARQUIVO: {nome_arquivo}
 TEMPORADA: {temporada}
 EPISÓDIO: {episodio}
 
-=== TRANSCRIÇÃO ===
-{transcricao}
-=== FIM DA TRANSCRIÇÃO ===
+=== {rotulo} ===
+{conteudo}
+=== FIM DA {rotulo} ===
 
 Extraia a Cédula de Inovação conforme o formato JSON especificado."""
 
-    # Chamar API com response_format JSON
-    response = client.chat.completions.create(
-        model=MODEL,
-        response_format={"type": "json_object"},
-        messages=[
+    return {
+        "model": MODEL,
+        "response_format": {"type": "json_object"},
+        "messages": [
             {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": user_message}
         ],
-        temperature=0.3,  # Baixa temperatura para respostas mais consistentes
-        max_tokens=4000
-    )
+        "temperature": TEMPERATURE,
+        "max_tokens": 4000
+    }
+
+
+def dividir_para_map(transcricao: str) -> list[str]:
+    """
+    Trechos para a etapa "map", ou lista vazia se a transcrição cabe direto
+    (decisão pela contagem local de tokens).
+    """
+    if contar_tokens(transcricao, MODEL) <= LIMITE_TOKENS_DIRETO:
+        return []
+    return dividir_por_tokens(transcricao, TOKENS_POR_SEGMENTO, modelo=MODEL)
+
+
+def juntar_resumos(resumos: list[str]) -> str:
+    total = len(resumos)
+    return "\n\n".join(f"--- Trecho {i}/{total} ---\n{resumo.strip()}" for i, resumo in enumerate(resumos, 1))
+
+
+def resumir_transcricao_longa(client: ClienteOpenAIControlado, trechos: list[str], nome_arquivo: str) -> str:
+    """
+    Resume todos os trechos em paralelo, devolvendo os resumos na ordem original.
+    
+    Args:
+        client: Cliente OpenAI controlado
+        trechos: Trechos de até TOKENS_POR_SEGMENTO tokens
+        nome_arquivo: Nome do arquivo para contexto
+        
+    Returns:
+        Resumos concatenados, prontos para a etapa "reduce"
+    """
+    total = len(trechos)
+    
+    def resumir(item: tuple[int, str]) -> str:
+        indice, trecho = item
+        response = client.completar_chat(**corpo_resumo(trecho, nome_arquivo, f"{indice}/{total}"))
+        return response.choices[0].message.content
     
-    # Parsear resposta JSON
-    json_response = json.loads(response.choices[0].message.content)
+    with ThreadPoolExecutor(max_workers=max(1, MAX_CONCORRENCIA_MAP)) as executor:
+        resumos = list(executor.map(resumir, enumerate(trechos, 1)))
     
-    return json_response
+    return juntar_resumos(resumos)
+
+
+def processar_com_openai(
+    client: ClienteOpenAIControlado,
+    transcricao: str,
+    nome_arquivo: str,
+    log: list[str] | None = None
+) -> dict:
+    """
+    Processa a transcrição usando a API da OpenAI.
+    
+    Transcrições acima de LIMITE_TOKENS_DIRETO (contagem local) passam antes
+    por um map-reduce: os trechos são resumidos em paralelo e só os resumos
+    vão para a extração final da Cédula. A resposta é validada contra
+    ESQUEMA_CEDULA e só os campos inválidos são pedidos de novo.
+    
+    Args:
+        client: Cliente OpenAI controlado (limite de taxa + retentativas)
+        transcricao: Texto da transcrição
+        nome_arquivo: Nome do arquivo para contexto
+        log: Lista opcional para mensagens de progresso
+        
+    Returns:
+        Dicionário com pageContent e metadata (válido)
+    """
+    # Transcrições longas: etapa "map" (resumos por trecho)
+    trechos = dividir_para_map(transcricao)
+    if trechos:
+        corpo = corpo_extracao(nome_arquivo, resumir_transcricao_longa(client, trechos, nome_arquivo), True)
+    else:
+        corpo = corpo_extracao(nome_arquivo, transcricao, False)
+    
+    # Chamar API com response_format JSON (etapa "reduce" quando houve resumos)
+    response = client.completar_chat(**corpo)
+    
+    return finalizar_cedula(client, response.choices[0].message.content, nome_arquivo, log if log is not None else [])
+
+
+def registrar_cedula(
+    resultado: dict,
+    nome_arquivo: str,
+    impressao: str,
+    registro: RegistroImpressoes,
+    log: list[str]
+) -> None:
+    """
+    Salva a Cédula e registra a impressão digital (comum aos modos online e lote).
+    
+    Args:
+        resultado: Cédula extraída
+        nome_arquivo: Nome do arquivo (sem extensão)
+        impressao: Impressão digital desta extração
+        registro: Registro de impressões
+        log: Lista onde as mensagens de progresso são acrescentadas
+    """
+    arquivo_saida = registro.pasta_saida / f"{nome_arquivo}.json"
+    salvar_json(resultado, arquivo_saida)
+    registro.registrar(nome_arquivo, impressao)
+    log.append(f"   ✅ Salvo: {arquivo_saida.name}")
+    
+    # Log de metadados extraídos
+    if "metadata" in resultado:
+        meta = resultado["metadata"]
+        log.append(f"   📊 Título: {meta.get('titulo', 'N/A')}")
+        log.append(f"   📊 Pilar: {meta.get('pilar_inovacao', 'N/A')}")
+
+
+def processar_arquivo(
+    client: ClienteOpenAIControlado,
+    arquivo: Path,
+    transcricao: str,
+    impressao: str,
+    registro: RegistroImpressoes
+) -> tuple[bool, list[str]]:
+    """
+    Processa uma transcrição de ponta a ponta (OpenAI → JSON → registro).
+    
+    Roda em uma thread do pool: o JSON é salvo assim que fica pronto e as
+    mensagens de progresso são devolvidas para serem impressas em ordem.
+    
+    Args:
+        client: Cliente OpenAI controlado
+        arquivo: Path para o arquivo .txt
+        transcricao: Conteúdo já lido do arquivo
+        impressao: Impressão digital desta extração
+        registro: Registro onde a impressão é gravada após o sucesso
+        
+    Returns:
+        Tupla (sucesso, linhas de log)
+    """
+    nome_arquivo = arquivo.stem  # Nome sem extensão
+    log = [f"   📖 Transcrição lida ({len(transcricao):,} caracteres)"]
+    
+    try:
+        # Processar com OpenAI
+        log.append(f"   🤖 Enviado para OpenAI ({MODEL})")
+        resultado = processar_com_openai(client, transcricao, nome_arquivo, log)
+        
+        registrar_cedula(resultado, nome_arquivo, impressao, registro, log)
+        return True, log
+        
+    except json.JSONDecodeError as e:
+        log.append(f"   ❌ ERRO ao parsear JSON: {e}")
+        return False, log
+        
+    except Exception as e:
+        log.append(f"   ❌ ERRO: {type(e).__name__}: {e}")
+        return False, log
+
+
+def processar_em_lote(
+    executor_lote,
+    tarefas: list[tuple[Path, str, str]],
+    registro: RegistroImpressoes
+) -> dict[Path, tuple[bool, list[str]]]:
+    """
+    Processa as transcrições pela Batch API (ou pelo substituto local).
+    
+    Até três lotes: os resumos "map" das transcrições longas, as extrações
+    finais e, se alguma Cédula vier inválida, as correções pontuais. Os
+    corpos são os mesmos do modo online e cada resposta volta ao seu arquivo
+    pelo custom_id, então os JSON finais são iguais.
+    
+    Args:
+        executor_lote: ExecutorLoteOpenAI ou ExecutorLoteLocal
+        tarefas: Lista de (arquivo, transcrição, impressão)
+        registro: Registro de impressões
+        
+    Returns:
+        {arquivo: (sucesso, linhas de log)}
+    """
+    resultados: dict[Path, tuple[bool, list[str]]] = {}
+    logs = {arquivo: [f"   📖 Transcrição lida ({len(transcricao):,} caracteres)"]
+            for arquivo, transcricao, _ in tarefas}
+    
+    # 1. Lote "map": trechos das transcrições longas
+    trechos_por_tarefa = [dividir_para_map(transcricao) for _, transcricao, _ in tarefas]
+    requisicoes_map = [
+        montar_requisicao(
+            f"map-{i}-{j}", "/v1/chat/completions",
+            corpo_resumo(trecho, arquivo.stem, f"{j + 1}/{len(trechos)}")
+        )
+        for i, ((arquivo, _, _), trechos) in enumerate(zip(tarefas, trechos_por_tarefa))
+        for j, trecho in enumerate(trechos)
+    ]
+    respostas_map, erros_map = executor_lote.executar(requisicoes_map, "extrator_map")
+    
+    # 2. Lote de extração: transcrição inteira ou resumos (reduce)
+    requisicoes = []
+    for i, ((arquivo, transcricao, _), trechos) in enumerate(zip(tarefas, trechos_por_tarefa)):
+        if not trechos:
+            corpo = corpo_extracao(arquivo.stem, transcricao, False)
+        else:
+            ids = [f"map-{i}-{j}" for j in range(len(trechos))]
+            faltando = [custom_id for custom_id in ids if custom_id not in respostas_map]
+            if faltando:
+                logs[arquivo].append(f"   ❌ ERRO no resumo de trechos: {erros_map.get(faltando[0], 'sem resposta')}")
+                resultados[arquivo] = (False, logs[arquivo])
+                continue
+            resumos = [respostas_map[custom_id]["choices"][0]["message"]["content"] for custom_id in ids]
+            corpo = corpo_extracao(arquivo.stem, juntar_resumos(resumos), True)
+        requisicoes.append(montar_requisicao(f"cedula-{i}", "/v1/chat/completions", corpo))
+    
+    respostas, erros = executor_lote.executar(requisicoes, "extrator_cedulas")
+    
+    # 3. Mapear de volta pelo custom_id, reparar e validar
+    cedulas: dict[Path, dict] = {}
+    requisicoes_correcao = []
+    campos_correcao: dict[Path, list[str]] = {}
+    for i, (arquivo, _, _) in enumerate(tarefas):
+        if arquivo in resultados:
+            continue
+        log = logs[arquivo]
+        custom_id = f"cedula-{i}"
+        
+        if custom_id not in respostas:
+            log.append(f"   ❌ ERRO no lote: {erros.get(custom_id, 'sem resposta')}")
+            resultados[arquivo] = (False, log)
+            continue
+        
+        log.append(f"   📦 Extraído via lote ({MODEL})")
+        try:
+            cedula, invalidos = preparar_cedula(respostas[custom_id]["choices"][0]["message"]["content"], arquivo.stem)
+            if invalidos:
+                exigir_corrigivel(invalidos)
+                log.append(f"   🩹 Corrigindo campos inválidos: {', '.join(invalidos)}")
+                campos_correcao[arquivo] = invalidos
+                requisicoes_correcao.append(montar_requisicao(
+                    f"correcao-{i}", "/v1/chat/completions", corpo_correcao(cedula, invalidos, arquivo.stem)
+                ))
+            cedulas[arquivo] = cedula
+        except json.JSONDecodeError as e:
+            log.append(f"   ❌ ERRO ao parsear JSON: {e}")
+            resultados[arquivo] = (False, log)
+        except ValueError as e:
+            log.append(f"   ❌ ERRO: {e}")
+            resultados[arquivo] = (False, log)
+    
+    # 4. Lote de correção: só os campos inválidos, sem a transcrição
+    respostas_correcao, erros_correcao = executor_lote.executar(requisicoes_correcao, "extrator_correcoes")
+    
+    for i, (arquivo, _, impressao) in enumerate(tarefas):
+        if arquivo not in cedulas:
+            continue
+        log = logs[arquivo]
+        cedula = cedulas[arquivo]
+        
+        try:
+            if arquivo in campos_correcao:
+                custom_id = f"correcao-{i}"
+                if custom_id not in respostas_correcao:
+                    raise ValueError(f"correção sem resposta: {erros_correcao.get(custom_id, 'sem resposta')}")
+                conteudo = respostas_correcao[custom_id]["choices"][0]["message"]["content"]
+                restantes = aplicar_correcao(cedula, conteudo, campos_correcao[arquivo], arquivo.stem)
+                if restantes:
+                    raise ValueError(f"Cédula continua inválida: {', '.join(restantes)}")
+            
+            registrar_cedula(cedula, arquivo.stem, impressao, registro, log)
+            resultados[arquivo] = (True, log)
+        except json.JSONDecodeError as e:
+            log.append(f"   ❌ ERRO ao parsear JSON: {e}")
+            resultados[arquivo] = (False, log)
+        except ValueError as e:
+            log.append(f"   ❌ ERRO: {e}")
+            resultados[arquivo] = (False, log)
+    
+    return resultados
 
 
 # ============================================================================
 # FUNÇÃO PRINCIPAL
 # ============================================================================
 
-def main():
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """
+    Lê as opções de linha de comando.
+    """
+    parser = argparse.ArgumentParser(description="Extrator de Cédulas de Inovação (Etapa 2)")
+    modo = parser.add_mutually_exclusive_group()
+    modo.add_argument("--lote", action="store_true",
+                      help="Usa a Batch API da OpenAI (offline, mais barata) em vez de chamadas síncronas")
+    modo.add_argument("--lote-local", action="store_true",
+                      help="Modo lote com substituto local determinístico (testes, sem rede)")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None):
     """
     Função principal do pipeline ETL.
     
     Itera sobre todos os arquivos .txt na pasta de transcrições,
     processa cada um com a API da OpenAI e salva o resultado como JSON.
     """
+    args = parse_args(argv)
+    
     print("=" * 60)
     print("🚀 EXTRATOR DE DADOS - Pipeline ETL")
     print("   Série: Destino Educação - Escolas Inovadoras")
@@ -184,21 +844,32 @@ def main():
     
     # Verificar se a chave da API está configurada
     api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+    if not api_key and not args.lote_local:
         print("\n❌ ERRO: OPENAI_API_KEY não encontrada!")
         print("   Configure a variável de ambiente ou adicione ao .env.local")
         return
     
-    # Inicializar cliente OpenAI
-    client = OpenAI(api_key=api_key)
-    print(f"\n✅ Cliente OpenAI inicializado (modelo: {MODEL})")
+    # Inicializar cliente OpenAI (limite de taxa + retentativas com backoff)
+    client = None
+    if args.lote_local:
+        print("\n🧪 Modo lote local (substituto determinístico, sem rede)")
+    else:
+        client = criar_cliente_openai(api_key)
+        print(f"\n✅ Cliente OpenAI inicializado (modelo: {MODEL})")
+    
+    # Cédulas fictícias do modo local vão para uma pasta própria
+    if args.lote_local:
+        registro = RegistroImpressoes(PASTA_LOTE_LOCAL / "impressoes.json", PASTA_LOTE_LOCAL / "json_finais")
+    else:
+        registro = RegistroImpressoes(IMPRESSOES_PATH)
+    pasta_saida = registro.pasta_saida
     
     # Verificar/criar diretório de saída
-    if not OUTPUT_DIR.exists():
-        OUTPUT_DIR.mkdir(parents=True)
-        print(f"📁 Diretório de saída criado: {OUTPUT_DIR}")
+    if not pasta_saida.exists():
+        pasta_saida.mkdir(parents=True)
+        print(f"📁 Diretório de saída criado: {pasta_saida}")
     else:
-        print(f"📁 Diretório de saída: {OUTPUT_DIR}")
+        print(f"📁 Diretório de saída: {pasta_saida}")
     
     # Verificar diretório de entrada
     if not INPUT_DIR.exists():
@@ -206,7 +877,7 @@ def main():
         return
     
     # Listar arquivos .txt
-    arquivos_txt = list(INPUT_DIR.glob("*.txt"))
+    arquivos_txt = sorted(INPUT_DIR.glob("*.txt"))
     total_arquivos = len(arquivos_txt)
     
     if total_arquivos == 0:
@@ -214,57 +885,87 @@ def main():
         return
     
     print(f"\n📄 Arquivos encontrados: {total_arquivos}")
+    if args.lote or args.lote_local:
+        print("📦 Modo lote: requisições enviadas em JSONL")
+    else:
+        print(f"⚡ Processamento paralelo: até {MAX_CONCORRENCIA} arquivo(s) por vez")
     print("-" * 60)
     
     # Contadores de sucesso/erro
     processados = 0
+    inalterados = 0
     erros = 0
     
-    # Processar cada arquivo
-    for idx, arquivo in enumerate(arquivos_txt, 1):
-        nome_arquivo = arquivo.stem  # Nome sem extensão
-        arquivo_saida = OUTPUT_DIR / f"{nome_arquivo}.json"
-        
-        print(f"\n[{idx}/{total_arquivos}] 📝 Processando: {arquivo.name}")
-        
+    # Processar só o que mudou; o progresso é impresso na ordem dos arquivos
+    # Um item por arquivo: None (inalterado), (False, log) (erro de leitura) ou (transcrição, impressão)
+    estados = []
+    for arquivo in arquivos_txt:
         try:
-            # Ler transcrição
             transcricao = ler_transcricao(arquivo)
-            print(f"   📖 Transcrição lida ({len(transcricao):,} caracteres)")
-            
-            # Processar com OpenAI
-            print(f"   🤖 Enviando para OpenAI ({MODEL})...")
-            resultado = processar_com_openai(client, transcricao, nome_arquivo)
-            
-            # Salvar JSON
-            salvar_json(resultado, arquivo_saida)
-            print(f"   ✅ Salvo: {arquivo_saida.name}")
-            
-            # Log de metadados extraídos
-            if "metadata" in resultado:
-                meta = resultado["metadata"]
-                print(f"   📊 Título: {meta.get('titulo', 'N/A')}")
-                print(f"   📊 Pilar: {meta.get('pilar_inovacao', 'N/A')}")
+        except Exception as e:
+            estados.append((False, [f"   ❌ ERRO ao ler transcrição: {type(e).__name__}: {e}"]))
+            continue
+        
+        impressao = calcular_impressao(transcricao, arquivo.stem)
+        arquivo_saida = pasta_saida / f"{arquivo.stem}.json"
+        
+        if not FORCAR_REPROCESSAMENTO and registro.inalterado(arquivo.stem, impressao, arquivo_saida):
+            estados.append(None)
+        else:
+            estados.append((transcricao, impressao))
+    
+    tarefas = [
+        (arquivo, estado[0], estado[1])
+        for arquivo, estado in zip(arquivos_txt, estados)
+        if estado is not None and estado[0] is not False
+    ]
+    
+    with ThreadPoolExecutor(max_workers=max(1, MAX_CONCORRENCIA)) as executor:
+        resultados: dict[Path, Future | tuple[bool, list[str]]] = {}
+        
+        if args.lote or args.lote_local:
+            executor_lote = ExecutorLoteLocal() if args.lote_local else ExecutorLoteOpenAI(client.client)
+            try:
+                resultados.update(processar_em_lote(executor_lote, tarefas, registro))
+            except RuntimeError as e:
+                # Lote falhou, expirou ou foi cancelado sem saída: todos os arquivos dele são erro
+                for arquivo, transcricao, _ in tarefas:
+                    resultados[arquivo] = (False, [
+                        f"   📖 Transcrição lida ({len(transcricao):,} caracteres)",
+                        f"   ❌ ERRO no lote: {e}"
+                    ])
+        else:
+            for arquivo, transcricao, impressao in tarefas:
+                resultados[arquivo] = executor.submit(
+                    processar_arquivo, client, arquivo, transcricao, impressao, registro
+                )
+        
+        for idx, (arquivo, estado) in enumerate(zip(arquivos_txt, estados), 1):
+            print(f"\n[{idx}/{total_arquivos}] 📝 Arquivo: {arquivo.name}")
             
-            processados += 1
+            if estado is None:
+                print("   ⏭️ Inalterado desde a última extração")
+                inalterados += 1
+                continue
             
-        except json.JSONDecodeError as e:
-            print(f"   ❌ ERRO ao parsear JSON: {e}")
-            erros += 1
-            continue
+            resultado = resultados.get(arquivo, estado)
+            sucesso, log = resultado.result() if isinstance(resultado, Future) else resultado
+            for linha in log:
+                print(linha)
             
-        except Exception as e:
-            print(f"   ❌ ERRO: {type(e).__name__}: {e}")
-            erros += 1
-            continue
+            if sucesso:
+                processados += 1
+            else:
+                erros += 1
     
     # Resumo final
     print("\n" + "=" * 60)
     print("📊 RESUMO DO PROCESSAMENTO")
     print("=" * 60)
     print(f"   ✅ Processados com sucesso: {processados}/{total_arquivos}")
+    print(f"   ⏭️ Inalterados (sem chamada à API): {inalterados}/{total_arquivos}")
     print(f"   ❌ Erros: {erros}/{total_arquivos}")
-    print(f"   📁 Arquivos JSON em: {OUTPUT_DIR}")
+    print(f"   📁 Arquivos JSON em: {pasta_saida}")
     print("=" * 60)
 
 
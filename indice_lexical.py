@@ -0,0 +1,514 @@
+"""
+==============================================================================
+ÍNDICE LEXICAL - BM25 sobre as Cédulas + busca híbrida (RRF)
+==============================================================================
+
+Busca por termos exatos ("gamificação", "BNCC Competência 5", nome da
+escola), que a similaridade de cosseno ranqueia mal:
+- Tokenização para português: minúsculas, sem acentos, sem stopwords e com
+  redução simples de plural ("gamificações" → "gamificacao")
+- Índice invertido BM25 sobre pageContent + metadados de ./Videos/json_finais,
+  construído uma vez e salvo compacto (postings em arrays NumPy, formato CSR);
+  execuções seguintes carregam o índice salvo enquanto os JSON não mudam
+- Fusão com a busca vetorial (indice_vetorial.py) por Reciprocal Rank Fusion
+- Consultas de termo exato são respondidas só pelo BM25, sem gerar embedding
+
+Autor: Pipeline de Dados SESI-SENAI
+Data: 2026-10-18
+==============================================================================
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+import unicodedata
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+from cache_consultas import CacheConsultas
+from indice_vetorial import IndiceVetorial, assinatura_arquivos, contem, gravar_assinatura, ler_assinatura
+
+# ============================================================================
+# CONFIGURAÇÕES
+# ============================================================================
+
+# Entrada (mesmos JSON da ingestão) e onde o índice é salvo
+RAIZ_DADOS = Path(os.getenv("PIPELINE_RAIZ_DADOS", "."))
+INPUT_DIR = RAIZ_DADOS / "Videos" / "json_finais"
+PASTA_INDICE = RAIZ_DADOS / ".cache" / "indice_lexical"
+
+# Muda quando a tokenização muda: índices salvos antes são reconstruídos
+VERSAO_TOKENIZACAO = 2
+
+# Parâmetros do BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Reciprocal Rank Fusion: score = Σ 1 / (RRF_K + posição)
+RRF_K = 60
+
+# Consultas com até este número de termos, todos presentes juntos no melhor
+# documento, podem ser tratadas como busca de termo exato (sem embedding)...
+MAX_TERMOS_CONSULTA_EXATA = 3
+
+# ...se estiverem no título de uma única Cédula ou se o melhor score BM25
+# superar o segundo por este fator (termo raro, não um termo comum a todas)
+MARGEM_CONSULTA_EXATA = 2.0
+
+# Campos de metadata indexados junto com o pageContent
+CAMPOS_METADATA = (
+    "titulo", "pilar_inovacao", "gatilhos_comportamentais", "gatilhos_conteudo", "competencias_bncc"
+)
+
+STOPWORDS = frozenset("""
+a ao aos as ate com como da das de dela delas dele deles do dos e ela elas ele eles em entre era essa
+essas esse esses esta estas este estes eu foi foram ha isso isto ja la lhe mais mas me mesmo muito na
+nao nas nem no nos nossa nosso num numa o os ou para pela pelas pelo pelos por qual quando que quem
+se sem ser seu seus so sua suas tambem te tem ter um uma umas uns voce
+""".split())
+
+# Terminados em "ais"/"aes"/"eis" que não são plural de "-al"/"-ão"/"-el"
+EXCECOES_PLURAL = frozenset({"cais", "leis", "maes", "mais", "pais", "reis", "seis"})
+
+
+# ============================================================================
+# TOKENIZAÇÃO
+# ============================================================================
+
+def dobrar_acentos(texto: str) -> str:
+    """Minúsculas e sem acentos ("Competência" → "competencia")."""
+    sem_acentos = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return sem_acentos.casefold()
+
+
+def reduzir_plural(termo: str) -> str:
+    """
+    Redução leve de plural do português (sem stemmer completo), que leva
+    singular e plural ao mesmo radical sem acentos:
+    "gamificações"/"gamificação" → "gamificacao", "países"/"país" → "pais",
+    "professores"/"professor" → "professor", "bases"/"base" → "bas".
+
+    Args:
+        termo: Termo em minúsculas, ainda com acentos
+
+    Returns:
+        Radical sem acentos
+    """
+    dobrado = dobrar_acentos(termo)
+    if len(dobrado) <= 3 or dobrado.isdigit():
+        return dobrado
+    # Oxítona terminada em "s" é singular (país, mês, inglês): só perde o acento
+    if re.search(r"[áéíóúâêô]s$", termo):
+        return dobrado
+    if dobrado not in EXCECOES_PLURAL:
+        for sufixo, troca in (("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"), ("ns", "m")):
+            if dobrado.endswith(sufixo):
+                return dobrado[: -len(sufixo)] + troca
+    if dobrado.endswith("s") and not dobrado.endswith("ss"):
+        dobrado = dobrado[:-1]
+    # "-e" final cai sempre: "professore(s)" e "professor", "base(s)" e "bas"
+    if dobrado.endswith("e") and len(dobrado) > 3:
+        dobrado = dobrado[:-1]
+    return dobrado
+
+
+def tokenizar(texto: str) -> list[str]:
+    """
+    Tokeniza um texto em português para o BM25.
+
+    Args:
+        texto: Texto livre
+
+    Returns:
+        Termos normalizados (sem acentos, stopwords e plural)
+    """
+    termos = re.findall(r"[^\W_]+", unicodedata.normalize("NFC", texto).casefold())
+    return [
+        reduzir_plural(termo) for termo in termos
+        if dobrar_acentos(termo) and dobrar_acentos(termo) not in STOPWORDS
+    ]
+
+
+def texto_do_documento(dados: dict) -> str:
+    """pageContent + metadados textuais de uma Cédula."""
+    metadata = dados.get("metadata", {})
+    partes = [dados.get("pageContent", "")]
+    for campo in CAMPOS_METADATA:
+        valor = metadata.get(campo)
+        partes.extend(valor if isinstance(valor, list) else [valor] if valor else [])
+    return "\n".join(str(parte) for parte in partes)
+
+
+# ============================================================================
+# ÍNDICE BM25
+# ============================================================================
+
+class IndiceLexical:
+    """
+    Índice invertido BM25 (um documento por Cédula).
+
+    Postings em formato CSR: para o termo t, `docs[inicio[t]:inicio[t + 1]]`
+    são os documentos e `freqs[...]` as frequências do termo em cada um.
+    """
+
+    def __init__(
+        self,
+        vocabulario: dict[str, int],
+        inicio: np.ndarray,
+        docs: np.ndarray,
+        freqs: np.ndarray,
+        comprimentos: np.ndarray,
+        metadados: list[dict]
+    ):
+        self.vocabulario = vocabulario
+        self.inicio = inicio
+        self.docs = docs
+        self.freqs = freqs
+        self.comprimentos = comprimentos
+        self.metadados = metadados
+        self.media_comprimento = float(comprimentos.mean()) if len(comprimentos) else 0.0
+
+        # IDF do BM25 (variante sempre positiva)
+        n = len(comprimentos)
+        df = np.diff(inicio).astype(np.float32)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.metadados)
+
+    @classmethod
+    def construir(cls, documentos: list[tuple[str, dict]]) -> "IndiceLexical":
+        """
+        Constrói o índice.
+
+        Args:
+            documentos: Lista de (texto, metadata)
+
+        Returns:
+            Índice pronto
+        """
+        vocabulario: dict[str, int] = {}
+        postings: list[list[tuple[int, int]]] = []
+        comprimentos = []
+
+        for d, (texto, _) in enumerate(documentos):
+            termos = tokenizar(texto)
+            comprimentos.append(len(termos))
+            contagem: dict[str, int] = {}
+            for termo in termos:
+                contagem[termo] = contagem.get(termo, 0) + 1
+            for termo, freq in contagem.items():
+                if termo not in vocabulario:
+                    vocabulario[termo] = len(vocabulario)
+                    postings.append([])
+                postings[vocabulario[termo]].append((d, freq))
+
+        tamanhos = np.array([len(p) for p in postings], dtype=np.int64)
+        inicio = np.concatenate([[0], np.cumsum(tamanhos)]).astype(np.int64)
+        docs = np.array([d for p in postings for d, _ in p], dtype=np.int32)
+        freqs = np.array([min(f, 65535) for p in postings for _, f in p], dtype=np.uint16)
+
+        return cls(
+            vocabulario, inicio, docs, freqs,
+            np.array(comprimentos, dtype=np.float32),
+            [metadata for _, metadata in documentos]
+        )
+
+    @classmethod
+    def de_json_finais(cls, pasta: Path = INPUT_DIR) -> "IndiceLexical":
+        documentos = []
+        for arquivo in sorted(pasta.glob("*.json")):
+            with open(arquivo, 'r', encoding='utf-8') as f:
+                dados = json.load(f)
+            if dados.get("pageContent"):
+                documentos.append((texto_do_documento(dados), dados.get("metadata", {})))
+        return cls.construir(documentos)
+
+    # ------------------------------------------------------------------------
+    # Persistência
+    # ------------------------------------------------------------------------
+    def salvar(self, pasta: Path = PASTA_INDICE, assinatura: Optional[str] = None) -> None:
+        pasta.mkdir(parents=True, exist_ok=True)
+        gravar_assinatura(pasta, None)  # Gravação interrompida não parece atual
+        np.savez_compressed(
+            pasta / "postings.npz",
+            inicio=self.inicio, docs=self.docs, freqs=self.freqs, comprimentos=self.comprimentos
+        )
+        termos = sorted(self.vocabulario, key=self.vocabulario.get)
+        with open(pasta / "documentos.json", 'w', encoding='utf-8') as f:
+            json.dump({"termos": termos, "metadados": self.metadados}, f, ensure_ascii=False)
+        gravar_assinatura(pasta, assinatura)
+
+    @classmethod
+    def carregar(cls, pasta: Path = PASTA_INDICE) -> "IndiceLexical":
+        with open(pasta / "documentos.json", 'r', encoding='utf-8') as f:
+            documentos = json.load(f)
+        arrays = np.load(pasta / "postings.npz")
+        vocabulario = {termo: i for i, termo in enumerate(documentos["termos"])}
+        return cls(
+            vocabulario, arrays["inicio"], arrays["docs"], arrays["freqs"],
+            arrays["comprimentos"], documentos["metadados"]
+        )
+
+    @classmethod
+    def abrir(
+        cls,
+        pasta: Path = INPUT_DIR,
+        pasta_indice: Path = PASTA_INDICE,
+        reconstruir: bool = False
+    ) -> tuple["IndiceLexical", bool]:
+        """
+        Carrega o índice salvo se ele ainda corresponde aos JSON (mesmos
+        arquivos, tamanhos e datas, mesma tokenização); senão constrói de
+        novo e salva.
+
+        Args:
+            pasta: Pasta dos JSON finais
+            pasta_indice: Onde o índice é salvo
+            reconstruir: Constrói de novo mesmo sem mudanças nos JSON
+
+        Returns:
+            Tupla (índice, True se foi reconstruído)
+        """
+        assinatura = assinatura_arquivos(list(pasta.glob("*.json")), VERSAO_TOKENIZACAO, CAMPOS_METADATA)
+        if not reconstruir and ler_assinatura(pasta_indice) == assinatura:
+            return cls.carregar(pasta_indice), False
+        indice = cls.de_json_finais(pasta)
+        indice.salvar(pasta_indice, assinatura)
+        return indice, True
+
+    # ------------------------------------------------------------------------
+    # Busca
+    # ------------------------------------------------------------------------
+    def pontuar(self, termos: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Scores BM25 de todos os documentos e quantos termos distintos cada um contém.
+        """
+        scores = np.zeros(len(self), dtype=np.float32)
+        cobertura = np.zeros(len(self), dtype=np.int32)
+        normalizacao = BM25_K1 * (1 - BM25_B + BM25_B * self.comprimentos / max(self.media_comprimento, 1e-9))
+
+        for termo in set(termos):
+            t = self.vocabulario.get(termo)
+            if t is None:
+                continue
+            fatia = slice(self.inicio[t], self.inicio[t + 1])
+            docs = self.docs[fatia]
+            tf = self.freqs[fatia].astype(np.float32)
+            scores[docs] += self.idf[t] * tf * (BM25_K1 + 1) / (tf + normalizacao[docs])
+            cobertura[docs] += 1
+        return scores, cobertura
+
+    def buscar(self, consulta: str, quantidade: int = 10, filtro: Optional[dict] = None) -> list[dict]:
+        """
+        Busca BM25.
+
+        Args:
+            consulta: Texto da consulta
+            quantidade: Máximo de resultados
+            filtro: Filtro jsonb sobre metadata (`metadata @> filtro`)
+
+        Returns:
+            Lista de {metadata, score, termos_encontrados}, do maior score para o menor
+        """
+        termos = tokenizar(consulta)
+        scores, cobertura = self.pontuar(termos)
+        candidatos = np.flatnonzero(scores > 0)
+        if filtro:
+            candidatos = np.array([d for d in candidatos if contem(self.metadados[d], filtro)], dtype=np.int64)
+        if len(candidatos) > quantidade:
+            candidatos = candidatos[np.argpartition(-scores[candidatos], quantidade - 1)[:quantidade]]
+        candidatos = candidatos[np.argsort(-scores[candidatos], kind="stable")]
+
+        return [
+            {"metadata": self.metadados[d], "score": float(scores[d]), "termos_encontrados": int(cobertura[d])}
+            for d in candidatos
+        ]
+
+
+# ============================================================================
+# BUSCA HÍBRIDA
+# ============================================================================
+
+def fundir_rrf(rankings: list[list[str]], k: int = RRF_K) -> list[tuple[str, float]]:
+    """
+    Reciprocal Rank Fusion de várias listas ranqueadas de chaves.
+
+    Args:
+        rankings: Listas de chaves, da melhor para a pior
+        k: Constante do RRF (amortece o peso das primeiras posições)
+
+    Returns:
+        Lista de (chave, score fundido), do maior para o menor
+    """
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for posicao, chave in enumerate(ranking, 1):
+            scores[chave] = scores.get(chave, 0.0) + 1.0 / (k + posicao)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def consulta_exata(consulta: str, resultados_lexicais: list[dict]) -> bool:
+    """
+    Decide se a consulta é de termo exato (respondida só pelo BM25): frase
+    entre aspas, ou consulta curta com todos os termos no melhor documento e
+    que seja um nome ("Ritaharju", "Projeto Âncora": termos no título de uma
+    única Cédula) ou um termo raro ("gamificação": melhor score BM25 pelo
+    menos MARGEM_CONSULTA_EXATA vezes o segundo).
+
+    Termos comuns ("escola", "falta de engajamento") aparecem em muitas
+    Cédulas com scores parecidos e seguem para a busca híbrida.
+    """
+    texto = consulta.strip()
+    if len(texto) > 2 and texto[0] == texto[-1] == '"':
+        return True
+    termos = set(tokenizar(texto))
+    if not (0 < len(termos) <= MAX_TERMOS_CONSULTA_EXATA) or not resultados_lexicais:
+        return False
+    melhor = resultados_lexicais[0]
+    if melhor["termos_encontrados"] < len(termos):
+        return False
+
+    titulos = {
+        r["metadata"].get("titulo", "") for r in resultados_lexicais
+        if termos <= set(tokenizar(r["metadata"].get("titulo", "")))
+    }
+    if titulos == {melhor["metadata"].get("titulo", "")}:
+        return True
+
+    segundo = resultados_lexicais[1]["score"] if len(resultados_lexicais) > 1 else 0.0
+    return melhor["score"] >= MARGEM_CONSULTA_EXATA * segundo
+
+
+def busca_hibrida(
+    consulta: str,
+    lexical: IndiceLexical,
+    vetorial: Optional[IndiceVetorial] = None,
+    gerar_embedding: Optional[Callable[[str], list[float]]] = None,
+    quantidade: int = 10,
+    limiar: float = 0.1,
+    filtro: Optional[dict] = None,
+    cache: Optional[CacheConsultas] = None
+) -> tuple[list[dict], bool]:
+    """
+    BM25 + busca vetorial fundidos por RRF, um resultado por Cédula (título).
+
+    Consultas de termo exato (ou sem índice vetorial) usam só o BM25 e não
+    chamam `gerar_embedding`. Com `cache` (montado sobre `gerar_embedding` e
+    `vetorial.match_documents`), consultas repetidas não geram embedding nem
+    refazem a busca vetorial.
+
+    Args:
+        consulta: Texto da consulta
+        lexical: Índice BM25
+        vetorial: Índice vetorial (trechos), opcional
+        gerar_embedding: Função texto -> embedding da consulta
+        quantidade: Máximo de resultados
+        limiar: Similaridade mínima na busca vetorial
+        filtro: Filtro jsonb sobre metadata
+        cache: Cache de consultas da parte vetorial, opcional
+
+    Returns:
+        Tupla (resultados {titulo, metadata, score}, usou_embedding)
+    """
+    candidatos = max(quantidade * 3, 30)
+    resultados_lexicais = lexical.buscar(consulta, candidatos, filtro)
+    metadados = {r["metadata"].get("titulo", ""): r["metadata"] for r in resultados_lexicais}
+    ranking_lexical = list(metadados)
+
+    if vetorial is None or gerar_embedding is None or consulta_exata(consulta, resultados_lexicais):
+        fundidos = fundir_rrf([ranking_lexical])
+        usou_embedding = False
+    else:
+        texto = consulta.strip('"')
+        if cache is not None:
+            resultados_vetoriais = cache.buscar(texto, limiar, candidatos, filtro)
+        else:
+            resultados_vetoriais = vetorial.match_documents(gerar_embedding(texto), limiar, candidatos, filtro)
+
+        ranking_vetorial = []
+        for r in resultados_vetoriais:
+            titulo = r["metadata"].get("titulo", "")
+            if titulo not in ranking_vetorial:  # Vários trechos do mesmo documento: vale o melhor
+                ranking_vetorial.append(titulo)
+                metadados.setdefault(titulo, {k: v for k, v in r["metadata"].items()
+                                              if k not in ("chunk_index", "total_chunks")})
+        fundidos = fundir_rrf([ranking_lexical, ranking_vetorial])
+        usou_embedding = True
+
+    return [
+        {"titulo": titulo, "metadata": metadados[titulo], "score": score}
+        for titulo, score in fundidos[:quantidade]
+    ], usou_embedding
+
+
+# ============================================================================
+# FUNÇÃO PRINCIPAL
+# ============================================================================
+
+def main(argv: list[str] | None = None):
+    """
+    Constrói o índice BM25 e, opcionalmente, responde uma consulta híbrida.
+    """
+    parser = argparse.ArgumentParser(description="Índice lexical BM25 + busca híbrida")
+    parser.add_argument("--consulta", action="append",
+                        help="Texto da consulta (entre aspas duplas = termo exato); pode se repetir, "
+                             "e consultas repetidas saem do cache de consultas")
+    parser.add_argument("--quantidade", type=int, default=10)
+    parser.add_argument("--filtro", default="{}", help='Filtro jsonb, ex.: \'{"temporada": 1}\'')
+    parser.add_argument("--sem-vetorial", action="store_true", help="Usa só o BM25")
+    parser.add_argument("--reconstruir", action="store_true", help="Reconstrói os índices mesmo sem mudanças nos JSON")
+    args = parser.parse_args(argv)
+
+    print("=" * 60)
+    print("🔤 ÍNDICE LEXICAL (BM25)")
+    print("=" * 60)
+
+    indice, reconstruido = IndiceLexical.abrir(reconstruir=args.reconstruir)
+    situacao = "indexados" if reconstruido else "carregados do índice salvo"
+    print(f"✅ {len(indice)} documento(s), {len(indice.vocabulario)} termo(s) {situacao}")
+    print(f"📁 Índice em: {PASTA_INDICE}")
+
+    if not args.consulta:
+        return
+
+    vetorial, gerar, cache = None, None, None
+    if not args.sem_vetorial:
+        import ingestao_rag
+        vetorial, _ = IndiceVetorial.abrir_json_finais(reconstruir=args.reconstruir)
+        cliente = {}
+
+        def gerar(texto: str) -> list[float]:
+            # Cliente criado só se a consulta realmente precisar de embedding
+            if "openai" not in cliente:
+                cliente["openai"] = ingestao_rag.get_openai_client()
+            return ingestao_rag.gerar_embedding(cliente["openai"], texto)
+
+        cache = CacheConsultas(gerar, vetorial.match_documents)
+
+    filtro = json.loads(args.filtro)
+    for consulta in args.consulta:
+        inicio = time.perf_counter()
+        resultados, usou_embedding = busca_hibrida(
+            consulta, indice, vetorial, gerar, args.quantidade, filtro=filtro, cache=cache
+        )
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        modo = "híbrido" if usou_embedding else "só BM25, sem embedding"
+        print(f"\n🔎 {consulta}: {len(resultados)} resultado(s) ({modo}) em {duracao_ms:.2f} ms")
+        for resultado in resultados:
+            print(f"   {resultado['score']:.4f}  {resultado['titulo']}")
+
+    if cache is not None:
+        print(f"\n💾 Cache de consultas: {cache.estatisticas}")
+
+
+# ============================================================================
+# EXECUÇÃO
+# ============================================================================
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,567 @@
+"""
+==============================================================================
+ÍNDICE VETORIAL - Busca semântica local (sem Postgres)
+==============================================================================
+
+Alternativa local à função `match_documents` do Supabase, para servir e
+testar consultas RAG sem rede:
+- Embeddings numa matriz float32 contígua, normalizados (produto escalar = cosseno)
+- Busca exata: um produto matriz-vetor + argpartition para o top-k
+- Busca aproximada opcional para acervos maiores:
+  - "hnsw": grafo HNSW (requer `pip install hnswlib`)
+  - "ivf": listas invertidas com k-means (só NumPy)
+- Mesmos parâmetros de match_documents: limiar, quantidade e filtro jsonb
+  (`metadata @> filter`), com as facetas em listas invertidas: consultas
+  filtradas só comparam as linhas que satisfazem o filtro
+
+O índice pode ser montado a partir do Supabase ou, sem rede nenhuma, a
+partir dos JSON finais + cache de embeddings da ingestão. Neste caso ele é
+salvo com a assinatura das fontes e só é remontado quando elas mudam.
+
+Autor: Pipeline de Dados SESI-SENAI
+Data: 2026-10-18
+==============================================================================
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+# ============================================================================
+# CONFIGURAÇÕES
+# ============================================================================
+
+# Onde o índice é salvo (matriz .npy + documentos .json)
+PASTA_INDICE = Path(os.getenv("PIPELINE_RAIZ_DADOS", ".")) / ".cache" / "indice_vetorial"
+
+# Assinatura das fontes de um índice salvo (gravada por último)
+ARQUIVO_ASSINATURA = "assinatura.txt"
+
+# Busca aproximada: candidatos pedidos ao índice por resultado desejado
+FATOR_CANDIDATOS = 4
+MIN_CANDIDATOS = 64
+
+# HNSW
+HNSW_M = 16
+HNSW_EF_CONSTRUCAO = 200
+HNSW_EF_BUSCA = 128
+
+# IVF: número de listas ≈ √n, listas visitadas por consulta
+IVF_ITERACOES = 10
+IVF_LISTAS_VISITADAS = 8
+
+# Facetas de metadata com índice invertido (mesmas da migração de filtros)
+CAMPOS_FACETA = (
+    "temporada", "pilar_inovacao", "gatilhos_comportamentais", "gatilhos_conteudo", "competencias_bncc"
+)
+
+# Filtro que deixa até esta fração das linhas: busca exata só nessas linhas
+# (pré-filtro); acima disso, índice aproximado + pós-filtro
+PRE_FILTRO_MAX_FRACAO = 0.25
+
+# Filtros memorizados por índice
+MAX_FILTROS_MEMORIZADOS = 256
+
+BACKENDS = ("exato", "hnsw", "ivf")
+
+
+# ============================================================================
+# FUNÇÕES AUXILIARES
+# ============================================================================
+
+def normalizar(vetores: np.ndarray) -> np.ndarray:
+    """Normaliza as linhas para norma 1 (vetores nulos ficam nulos)."""
+    vetores = np.ascontiguousarray(vetores, dtype=np.float32)
+    normas = np.linalg.norm(vetores, axis=-1, keepdims=True)
+    return vetores / np.where(normas == 0, 1, normas)
+
+
+def contem(documento: Any, filtro: Any) -> bool:
+    """
+    Mesma semântica do operador `@>` do jsonb: objetos contêm as chaves do
+    filtro (recursivamente), listas contêm todos os itens do filtro.
+    Dentro de um objeto, escalar não casa com lista:
+    '{"a": ["x"]}' @> '{"a": "x"}' é falso, como no Postgres.
+    """
+    if isinstance(filtro, dict):
+        return isinstance(documento, dict) and all(
+            chave in documento and contem(documento[chave], valor) for chave, valor in filtro.items()
+        )
+    if isinstance(filtro, list):
+        if not isinstance(documento, list):
+            return False
+        return all(any(contem(item, esperado) for item in documento) for esperado in filtro)
+    return not isinstance(documento, (dict, list)) and documento == filtro
+
+
+def assinatura_arquivos(arquivos: list[Path], *parametros: Any) -> str:
+    """
+    Assinatura das fontes de um índice: nome, tamanho e mtime de cada
+    arquivo, mais os parâmetros de construção. Muda quando um arquivo muda,
+    entra ou sai.
+    """
+    itens = []
+    for arquivo in sorted(arquivos):
+        try:
+            estado = arquivo.stat()
+            itens.append([arquivo.name, estado.st_size, estado.st_mtime_ns])
+        except FileNotFoundError:
+            itens.append([arquivo.name, None, None])
+    conteudo = json.dumps([itens, list(parametros)], default=str)
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+def ler_assinatura(pasta: Path) -> Optional[str]:
+    """Assinatura do índice salvo em `pasta` (None se não há um completo)."""
+    try:
+        return (pasta / ARQUIVO_ASSINATURA).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+
+
+def gravar_assinatura(pasta: Path, assinatura: Optional[str]) -> None:
+    """Chamada antes de salvar (None apaga) e depois de salvar o índice."""
+    caminho = pasta / ARQUIVO_ASSINATURA
+    if assinatura is None:
+        caminho.unlink(missing_ok=True)
+    else:
+        caminho.write_text(assinatura, encoding="utf-8")
+
+
+def chave_faceta(valor: Any) -> str:
+    return json.dumps(valor, sort_keys=True, ensure_ascii=False)
+
+
+def kmeans_esferico(vetores: np.ndarray, k: int, iteracoes: int, semente: int = 0) -> np.ndarray:
+    """
+    k-means sobre vetores normalizados (similaridade de cosseno).
+
+    Returns:
+        Centroides normalizados (k x dimensão)
+    """
+    gerador = np.random.default_rng(semente)
+    centroides = vetores[gerador.choice(len(vetores), size=k, replace=False)].copy()
+    for _ in range(iteracoes):
+        atribuicao = np.argmax(vetores @ centroides.T, axis=1)
+        for c in range(k):
+            membros = vetores[atribuicao == c]
+            if len(membros):
+                centroides[c] = membros.sum(axis=0)
+        centroides = normalizar(centroides)
+    return centroides
+
+
+# ============================================================================
+# ÍNDICE
+# ============================================================================
+
+class IndiceVetorial:
+    """
+    Índice em memória dos documentos (ou trechos) da tabela `documents`.
+
+    `match_documents` devolve o mesmo formato da função SQL: lista de
+    {id, content, metadata, similarity}, da maior para a menor similaridade.
+    """
+
+    def __init__(
+        self,
+        ids: list,
+        conteudos: list[str],
+        metadados: list[dict],
+        vetores: np.ndarray,
+        backend: str = "exato"
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend desconhecido: {backend} (use {', '.join(BACKENDS)})")
+        if not (len(ids) == len(conteudos) == len(metadados) == len(vetores)):
+            raise ValueError("ids, conteúdos, metadados e vetores com tamanhos diferentes")
+
+        self.ids = list(ids)
+        self.conteudos = list(conteudos)
+        self.metadados = list(metadados)
+        self.vetores = normalizar(np.asarray(vetores, dtype=np.float32).reshape(len(ids), -1))
+        self.backend = backend
+        self._filtros: dict[str, Optional[np.ndarray]] = {}
+        self._facetas = self._construir_facetas()
+        self._hnsw = None
+        self._centroides: Optional[np.ndarray] = None
+        self._listas: list[np.ndarray] = []
+
+        if backend == "hnsw":
+            self._construir_hnsw()
+        elif backend == "ivf":
+            self._construir_ivf()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ------------------------------------------------------------------------
+    # Construção dos índices (facetas e aproximados)
+    # ------------------------------------------------------------------------
+    def _construir_facetas(self) -> dict[str, dict[str, np.ndarray]]:
+        """
+        Índice invertido {campo: {valor: posições ordenadas}} das facetas.
+        Em campos lista, cada item aponta para a linha.
+        """
+        listas: dict[str, dict[str, list[int]]] = {campo: {} for campo in CAMPOS_FACETA}
+        for posicao, metadata in enumerate(self.metadados):
+            for campo in CAMPOS_FACETA:
+                if campo not in metadata:
+                    continue
+                valor = metadata[campo]
+                itens = valor if isinstance(valor, list) else [valor]
+                for item in itens:
+                    if not isinstance(item, (dict, list)):
+                        posicoes = listas[campo].setdefault(chave_faceta(item), [])
+                        if not posicoes or posicoes[-1] != posicao:
+                            posicoes.append(posicao)
+        return {
+            campo: {valor: np.array(posicoes, dtype=np.int64) for valor, posicoes in valores.items()}
+            for campo, valores in listas.items()
+        }
+
+    def _construir_hnsw(self) -> None:
+        if hnswlib is None:
+            raise ImportError("Backend 'hnsw' requer o pacote hnswlib (pip install hnswlib)")
+        self._hnsw = hnswlib.Index(space="ip", dim=self.vetores.shape[1])
+        self._hnsw.init_index(max_elements=max(1, len(self)), ef_construction=HNSW_EF_CONSTRUCAO, M=HNSW_M)
+        if len(self):
+            self._hnsw.add_items(self.vetores, np.arange(len(self)))
+        self._hnsw.set_ef(HNSW_EF_BUSCA)
+
+    def _construir_ivf(self) -> None:
+        if not len(self):
+            return
+        n_listas = max(1, int(np.sqrt(len(self))))
+        self._centroides = kmeans_esferico(self.vetores, n_listas, IVF_ITERACOES)
+        atribuicao = np.argmax(self.vetores @ self._centroides.T, axis=1)
+        self._listas = [np.flatnonzero(atribuicao == c) for c in range(n_listas)]
+
+    # ------------------------------------------------------------------------
+    # Busca
+    # ------------------------------------------------------------------------
+    def _filtrar(self, filtro: dict) -> Optional[np.ndarray]:
+        """
+        Posições (ordenadas) das linhas que satisfazem o filtro; None = todas.
+        Facetas conhecidas saem da interseção das listas invertidas e o
+        filtro completo é conferido só nas linhas que sobraram. Memorizado.
+        """
+        if not filtro:
+            return None
+        chave = chave_faceta(filtro)
+        if chave in self._filtros:
+            return self._filtros[chave]
+
+        # Estreita pelas listas invertidas; a conferência exata (`@>`, que
+        # também distingue escalar de lista) roda só nas linhas que sobram
+        posicoes: Optional[np.ndarray] = None
+        for campo, valor in filtro.items():
+            itens = valor if isinstance(valor, list) else [valor]
+            if campo not in self._facetas or any(isinstance(item, (dict, list)) for item in itens):
+                continue
+            for item in itens:
+                lista = self._facetas[campo].get(chave_faceta(item), np.empty(0, dtype=np.int64))
+                posicoes = lista if posicoes is None else np.intersect1d(posicoes, lista, assume_unique=True)
+
+        if posicoes is None:
+            posicoes = np.arange(len(self))
+        posicoes = np.array([p for p in posicoes if contem(self.metadados[p], filtro)], dtype=np.int64)
+
+        if len(self._filtros) >= MAX_FILTROS_MEMORIZADOS:
+            self._filtros.clear()
+        self._filtros[chave] = posicoes
+        return posicoes
+
+    def _candidatos(self, consulta: np.ndarray, quantidade: int) -> Optional[np.ndarray]:
+        """Posições candidatas do índice aproximado (None = todas)."""
+        if self.backend == "hnsw":
+            rotulos, _ = self._hnsw.knn_query(consulta, k=min(quantidade, len(self)))
+            return rotulos[0].astype(np.int64)
+        if self.backend == "ivf" and self._centroides is not None:
+            proximas = np.argsort(-(self._centroides @ consulta))[:IVF_LISTAS_VISITADAS]
+            return np.concatenate([self._listas[c] for c in proximas])
+        return None
+
+    def _top_k(
+        self,
+        consulta: np.ndarray,
+        posicoes: Optional[np.ndarray],
+        limiar: float,
+        quantidade: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Top-k exato entre `posicoes` (None = todas as linhas)."""
+        if posicoes is None:
+            similaridades = self.vetores @ consulta
+            posicoes = np.arange(len(self))
+        else:
+            similaridades = self.vetores[posicoes] @ consulta
+        acima = similaridades > limiar
+        posicoes, similaridades = posicoes[acima], similaridades[acima]
+
+        if len(posicoes) > quantidade:
+            melhores = np.argpartition(-similaridades, quantidade - 1)[:quantidade]
+            posicoes, similaridades = posicoes[melhores], similaridades[melhores]
+
+        ordem = np.argsort(-similaridades, kind="stable")
+        return posicoes[ordem], similaridades[ordem]
+
+    def match_documents(
+        self,
+        query_embedding,
+        match_threshold: float,
+        match_count: int,
+        filter: Optional[dict] = None
+    ) -> list[dict]:
+        """
+        Equivalente local da função SQL `match_documents`.
+
+        Args:
+            query_embedding: Embedding da consulta (mesmo modelo dos documentos)
+            match_threshold: Similaridade mínima (estritamente maior)
+            match_count: Máximo de resultados
+            filter: Filtro jsonb sobre metadata (`metadata @> filter`)
+
+        Returns:
+            Lista de {id, content, metadata, similarity}
+        """
+        if not len(self) or match_count <= 0:
+            return []
+
+        consulta = normalizar(np.asarray(query_embedding, dtype=np.float32))
+        qualificadas = self._filtrar(filter or {})
+
+        if self.backend == "exato" or (
+            qualificadas is not None and len(qualificadas) <= PRE_FILTRO_MAX_FRACAO * len(self)
+        ):
+            # Pré-filtro: só as linhas que satisfazem o filtro são comparadas
+            posicoes, similaridades = self._top_k(consulta, qualificadas, match_threshold, match_count)
+        else:
+            # Filtro pouco seletivo: índice aproximado + pós-filtro
+            candidatos = self._candidatos(consulta, max(match_count * FATOR_CANDIDATOS, MIN_CANDIDATOS))
+            if qualificadas is not None:
+                candidatos = np.intersect1d(candidatos, qualificadas)
+            posicoes, similaridades = self._top_k(consulta, candidatos, match_threshold, match_count)
+
+            # Candidatos aproximados insuficientes depois do filtro: refaz exato
+            if qualificadas is not None and len(posicoes) < match_count:
+                posicoes, similaridades = self._top_k(consulta, qualificadas, match_threshold, match_count)
+
+        return [
+            {
+                "id": self.ids[p],
+                "content": self.conteudos[p],
+                "metadata": self.metadados[p],
+                "similarity": float(s),
+            }
+            for p, s in zip(posicoes, similaridades)
+        ]
+
+    # ------------------------------------------------------------------------
+    # Persistência e construção
+    # ------------------------------------------------------------------------
+    def salvar(self, pasta: Path = PASTA_INDICE, assinatura: Optional[str] = None) -> None:
+        pasta.mkdir(parents=True, exist_ok=True)
+        gravar_assinatura(pasta, None)  # Gravação interrompida não parece atual
+        np.save(pasta / "vetores.npy", self.vetores)
+        with open(pasta / "documentos.json", 'w', encoding='utf-8') as f:
+            json.dump({"ids": self.ids, "conteudos": self.conteudos, "metadados": self.metadados}, f, ensure_ascii=False)
+        gravar_assinatura(pasta, assinatura)
+
+    @classmethod
+    def carregar(cls, pasta: Path = PASTA_INDICE, backend: str = "exato") -> "IndiceVetorial":
+        with open(pasta / "documentos.json", 'r', encoding='utf-8') as f:
+            documentos = json.load(f)
+        vetores = np.load(pasta / "vetores.npy", mmap_mode="r")
+        return cls(documentos["ids"], documentos["conteudos"], documentos["metadados"], vetores, backend)
+
+    @classmethod
+    def de_supabase(cls, supabase, backend: str = "exato", tamanho_pagina: int = 1000) -> "IndiceVetorial":
+        """
+        Carrega todos os documentos da tabela `documents` (consulta paginada).
+
+        Args:
+            supabase: Cliente Supabase
+            backend: "exato", "hnsw" ou "ivf"
+            tamanho_pagina: Linhas por página
+
+        Returns:
+            Índice montado
+        """
+        ids, conteudos, metadados, vetores = [], [], [], []
+        inicio = 0
+        while True:
+            response = supabase.table("documents")\
+                .select("id, content, metadata, embedding")\
+                .order("id")\
+                .range(inicio, inicio + tamanho_pagina - 1)\
+                .execute()
+            for linha in response.data:
+                embedding = linha["embedding"]
+                ids.append(linha["id"])
+                conteudos.append(linha["content"])
+                metadados.append(linha["metadata"] or {})
+                # pgvector chega como texto "[0.1,0.2,...]" pelo PostgREST
+                vetores.append(json.loads(embedding) if isinstance(embedding, str) else embedding)
+            if len(response.data) < tamanho_pagina:
+                break
+            inicio += tamanho_pagina
+        return cls(ids, conteudos, metadados, np.asarray(vetores, dtype=np.float32), backend)
+
+    @staticmethod
+    def assinatura_json_finais(pasta: Optional[Path] = None) -> str:
+        """JSON finais, cache de embeddings e parâmetros da divisão em trechos."""
+        import ingestao_rag
+        from cache_embeddings import caminhos_cache, origem_da_url
+
+        _, indice_cache = caminhos_cache(
+            ingestao_rag.EMBEDDING_MODEL, ingestao_rag.EMBEDDING_DIMENSION,
+            origem=origem_da_url(os.getenv("OPENAI_BASE_URL"))
+        )
+        return assinatura_arquivos(
+            [*(pasta or ingestao_rag.INPUT_DIR).glob("*.json"), indice_cache],
+            ingestao_rag.TOKENS_POR_TRECHO, ingestao_rag.SOBREPOSICAO_TOKENS
+        )
+
+    @classmethod
+    def abrir_json_finais(
+        cls,
+        pasta: Optional[Path] = None,
+        backend: str = "exato",
+        pasta_indice: Path = PASTA_INDICE,
+        reconstruir: bool = False
+    ) -> tuple["IndiceVetorial", bool]:
+        """
+        Carrega o índice salvo se ele ainda corresponde aos JSON finais e ao
+        cache de embeddings; senão monta de novo (de_json_finais) e salva.
+
+        Args:
+            pasta: Pasta dos JSON (padrão: a mesma da ingestão)
+            backend: "exato", "hnsw" ou "ivf"
+            pasta_indice: Onde o índice é salvo
+            reconstruir: Monta de novo mesmo sem mudanças nas fontes
+
+        Returns:
+            Tupla (índice, True se foi remontado)
+        """
+        assinatura = cls.assinatura_json_finais(pasta)
+        if not reconstruir and ler_assinatura(pasta_indice) == assinatura:
+            return cls.carregar(pasta_indice, backend), False
+        indice = cls.de_json_finais(pasta, backend)
+        indice.salvar(pasta_indice, assinatura)
+        return indice, True
+
+    @classmethod
+    def de_json_finais(cls, pasta: Optional[Path] = None, backend: str = "exato") -> "IndiceVetorial":
+        """
+        Monta o índice sem rede: JSON finais divididos em trechos como na
+        ingestão, com os vetores do cache de embeddings. Trechos ainda sem
+        embedding no cache ficam de fora.
+
+        Args:
+            pasta: Pasta dos JSON (padrão: a mesma da ingestão)
+            backend: "exato", "hnsw" ou "ivf"
+
+        Returns:
+            Índice montado
+        """
+        import ingestao_rag
+        from cache_embeddings import CacheEmbeddings, origem_da_url
+
+        cache = CacheEmbeddings(
+            ingestao_rag.EMBEDDING_MODEL, ingestao_rag.EMBEDDING_DIMENSION,
+            origem=origem_da_url(os.getenv("OPENAI_BASE_URL"))
+        )
+        trechos: list[tuple[str, dict]] = []
+        for arquivo in sorted((pasta or ingestao_rag.INPUT_DIR).glob("*.json")):
+            dados = ingestao_rag.carregar_json(arquivo)
+            if dados.get("pageContent"):
+                trechos.extend(ingestao_rag.dividir_documento(dados["pageContent"], dados.get("metadata", {})))
+
+        encontrados = cache.buscar([texto for texto, _ in trechos])
+        if len(encontrados) < len(trechos):
+            print(f"   ⚠️ {len(trechos) - len(encontrados)} trecho(s) sem embedding no cache (rode a ingestão)")
+
+        posicoes = sorted(encontrados)
+        return cls(
+            posicoes,
+            [trechos[p][0] for p in posicoes],
+            [trechos[p][1] for p in posicoes],
+            np.asarray([encontrados[p] for p in posicoes], dtype=np.float32).reshape(len(posicoes), -1),
+            backend
+        )
+
+
+# ============================================================================
+# FUNÇÃO PRINCIPAL
+# ============================================================================
+
+def main(argv: list[str] | None = None):
+    """
+    Monta o índice local (e opcionalmente responde uma consulta).
+    """
+    parser = argparse.ArgumentParser(description="Índice vetorial local (match_documents sem Postgres)")
+    parser.add_argument("--origem", choices=("json", "supabase"), default="json",
+                        help="json: JSON finais + cache de embeddings (sem rede); supabase: tabela documents")
+    parser.add_argument("--backend", choices=BACKENDS, default="exato")
+    parser.add_argument("--consulta", action="append",
+                        help="Texto da consulta (gera o embedding pela OpenAI); pode se repetir, "
+                             "e consultas repetidas saem do cache de consultas")
+    parser.add_argument("--limiar", type=float, default=0.1)
+    parser.add_argument("--quantidade", type=int, default=10)
+    parser.add_argument("--filtro", default="{}", help='Filtro jsonb, ex.: \'{"temporada": 1}\'')
+    parser.add_argument("--reconstruir", action="store_true", help="Remonta o índice mesmo sem mudanças nas fontes")
+    args = parser.parse_args(argv)
+
+    print("=" * 60)
+    print("🧭 ÍNDICE VETORIAL LOCAL")
+    print("=" * 60)
+
+    inicio = time.perf_counter()
+    if args.origem == "supabase":
+        import ingestao_rag
+        indice = IndiceVetorial.de_supabase(ingestao_rag.get_supabase_client(), args.backend)
+        indice.salvar()
+        situacao = "indexado(s)"
+    else:
+        indice, remontado = IndiceVetorial.abrir_json_finais(backend=args.backend, reconstruir=args.reconstruir)
+        situacao = "indexado(s)" if remontado else "carregado(s) do índice salvo"
+    print(f"✅ {len(indice)} vetor(es) {situacao} em {time.perf_counter() - inicio:.2f}s ({args.backend})")
+    print(f"📁 Salvo em: {PASTA_INDICE}")
+
+    if not args.consulta:
+        return
+
+    import ingestao_rag
+    from cache_consultas import CacheConsultas
+
+    cliente = ingestao_rag.get_openai_client()
+    cache = CacheConsultas(lambda texto: ingestao_rag.gerar_embedding(cliente, texto), indice.match_documents)
+    filtro = json.loads(args.filtro)
+
+    for consulta in args.consulta:
+        inicio = time.perf_counter()
+        resultados = cache.buscar(consulta, args.limiar, args.quantidade, filtro)
+        print(f"\n🔎 {consulta}: {len(resultados)} resultado(s) em {(time.perf_counter() - inicio) * 1000:.2f} ms")
+        for resultado in resultados:
+            print(f"   {resultado['similarity']:.3f}  {resultado['metadata'].get('titulo', 'Sem título')}")
+
+    print(f"\n💾 Cache de consultas: {cache.estatisticas}")
+
+
+# ============================================================================
+# EXECUÇÃO
+# ============================================================================
+
+if __name__ == "__main__":
+    main()
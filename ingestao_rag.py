@@ -19,10 +19,20 @@ Data: 2026-01-21
 import os
 import json
 import glob
+import argparse
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urlsplit
 from dotenv import load_dotenv
-from openai import OpenAI
 from supabase import create_client, Client
+from postgrest.types import ReturnMethod
+
+from cache_embeddings import CacheEmbeddings, origem_da_url
+from cache_consultas import incrementar_versao_corpus
+from cliente_openai import ClienteOpenAIControlado, criar_cliente_openai
+from contagem_tokens import contar_tokens, dividir_por_tokens
+from lote_openai import ExecutorLoteLocal, ExecutorLoteOpenAI, montar_requisicao
 
 # Carrega variáveis de ambiente
 load_dotenv(".env.local")
@@ -31,8 +41,8 @@ load_dotenv(".env.local")
 # CONFIGURAÇÕES
 # ============================================================================
 
-# Diretório de entrada (JSONs estruturados)
-INPUT_DIR = Path("./Videos/json_finais")
+# Diretório de entrada (JSONs estruturados), sob PIPELINE_RAIZ_DADOS se definida
+INPUT_DIR = Path(os.getenv("PIPELINE_RAIZ_DADOS", ".")) / "Videos" / "json_finais"
 
 # Modelo de embedding da OpenAI
 EMBEDDING_MODEL = "text-embedding-3-small"
@@ -40,6 +50,23 @@ EMBEDDING_MODEL = "text-embedding-3-small"
 # Dimensão do embedding (text-embedding-3-small = 1536)
 EMBEDDING_DIMENSION = 1536
 
+# Vários textos por requisição de embeddings (limites da API: 2048 itens, 300k tokens)
+EMBEDDINGS_MAX_ITENS = int(os.getenv("EMBEDDINGS_MAX_ITENS", "256"))
+EMBEDDINGS_MAX_TOKENS = int(os.getenv("EMBEDDINGS_MAX_TOKENS", "100000"))
+
+# Divisão do pageContent em trechos antes do embedding (um vetor por trecho)
+TOKENS_POR_TRECHO = int(os.getenv("INGESTAO_TOKENS_POR_TRECHO", "300"))
+SOBREPOSICAO_TOKENS = int(os.getenv("INGESTAO_SOBREPOSICAO_TOKENS", "50"))
+
+# Requisições de embeddings simultâneas
+EMBEDDINGS_CONCORRENCIA = int(os.getenv("EMBEDDINGS_CONCORRENCIA", "4"))
+
+# Linhas por página ao carregar os títulos existentes (limite padrão do PostgREST)
+TAMANHO_PAGINA_SUPABASE = 1000
+
+# Documentos por upsert (cada linha leva um vetor de 1536 floats, ~30 KB em JSON)
+DOCUMENTOS_POR_LOTE = int(os.getenv("INGESTAO_DOCUMENTOS_POR_LOTE", "100"))
+
 # ============================================================================
 # FUNÇÕES DE CONEXÃO
 # ============================================================================
@@ -63,12 +90,25 @@ def get_supabase_client() -> Client:
     return create_client(url, key)
 
 
-def get_openai_client() -> OpenAI:
+def supabase_local(url: str | None) -> bool:
+    """
+    True se o Supabase configurado roda nesta máquina (ex.: servicos_falsos.py).
+    
+    Args:
+        url: SUPABASE_URL
+        
+    Returns:
+        True para localhost/127.0.0.1/::1
+    """
+    return bool(url) and urlsplit(url).hostname in ("localhost", "127.0.0.1", "::1")
+
+
+def get_openai_client() -> ClienteOpenAIControlado:
     """
-    Inicializa e retorna o cliente OpenAI.
+    Inicializa e retorna o cliente OpenAI (limite de taxa + retentativas).
     
     Returns:
-        Cliente OpenAI configurado
+        Cliente OpenAI controlado
     """
     api_key = os.getenv("OPENAI_API_KEY")
     
@@ -78,25 +118,25 @@ def get_openai_client() -> OpenAI:
             "   Configure no arquivo .env.local"
         )
     
-    return OpenAI(api_key=api_key)
+    return criar_cliente_openai(api_key)
 
 
 # ============================================================================
 # FUNÇÕES DE PROCESSAMENTO
 # ============================================================================
 
-def gerar_embedding(client: OpenAI, texto: str) -> list[float]:
+def gerar_embedding(client: ClienteOpenAIControlado, texto: str) -> list[float]:
     """
     Gera o embedding vetorial para um texto.
     
     Args:
-        client: Cliente OpenAI
+        client: Cliente OpenAI controlado
         texto: Texto para vetorizar
         
     Returns:
         Lista de floats representando o vetor
     """
-    response = client.embeddings.create(
+    response = client.criar_embeddings(
         model=EMBEDDING_MODEL,
         input=texto
     )
@@ -104,6 +144,193 @@ def gerar_embedding(client: OpenAI, texto: str) -> list[float]:
     return response.data[0].embedding
 
 
+def dividir_documento(content: str, metadata: dict) -> list[tuple[str, dict]]:
+    """
+    Divide o pageContent em trechos de até TOKENS_POR_TRECHO tokens, por
+    parágrafos do markdown, repetindo SOBREPOSICAO_TOKENS entre vizinhos.
+    
+    Cada trecho vira uma linha em `documents` com os metadados do documento
+    (filtros continuam funcionando) mais `chunk_index` e `total_chunks`.
+    
+    Args:
+        content: pageContent do JSON
+        metadata: Metadados do documento
+        
+    Returns:
+        Lista de (texto do trecho, metadados do trecho)
+    """
+    trechos = dividir_por_tokens(content, TOKENS_POR_TRECHO, SOBREPOSICAO_TOKENS, EMBEDDING_MODEL)
+    return [
+        (trecho, {**metadata, "chunk_index": i, "total_chunks": len(trechos)})
+        for i, trecho in enumerate(trechos)
+    ]
+
+
+def agrupar_por_orcamento(
+    textos: list[str],
+    max_itens: int = EMBEDDINGS_MAX_ITENS,
+    max_tokens: int = EMBEDDINGS_MAX_TOKENS
+) -> list[list[int]]:
+    """
+    Agrupa os textos (pelos índices) em requisições que respeitam o limite de
+    itens e de tokens (contagem local). Um texto sozinho acima do limite de
+    tokens vai num grupo só dele.
+    
+    Args:
+        textos: Textos para vetorizar
+        max_itens: Máximo de textos por requisição
+        max_tokens: Máximo de tokens somados por requisição
+        
+    Returns:
+        Lista de grupos de índices, na ordem original
+    """
+    grupos: list[list[int]] = []
+    atual: list[int] = []
+    tokens_atual = 0
+    
+    for i, texto in enumerate(textos):
+        tokens = contar_tokens(texto, EMBEDDING_MODEL)
+        if atual and (len(atual) >= max_itens or tokens_atual + tokens > max_tokens):
+            grupos.append(atual)
+            atual, tokens_atual = [], 0
+        atual.append(i)
+        tokens_atual += tokens
+    
+    if atual:
+        grupos.append(atual)
+    return grupos
+
+
+def gerar_embeddings(
+    client: ClienteOpenAIControlado,
+    textos: list[str]
+) -> tuple[dict[int, list[float]], dict[int, str]]:
+    """
+    Gera os embeddings de vários textos em poucas requisições: agrupa por
+    orçamento de itens/tokens e envia até EMBEDDINGS_CONCORRENCIA grupos ao
+    mesmo tempo. Cada vetor volta ao seu texto pelo `index` da resposta.
+    
+    Args:
+        client: Cliente OpenAI controlado
+        textos: Textos para vetorizar
+        
+    Returns:
+        Tupla ({índice: vetor}, {índice: mensagem de erro})
+    """
+    embeddings: dict[int, list[float]] = {}
+    falhas: dict[int, str] = {}
+    
+    def vetorizar(grupo: list[int]) -> dict[int, list[float]]:
+        response = client.criar_embeddings(
+            model=EMBEDDING_MODEL,
+            input=[textos[i] for i in grupo]
+        )
+        return {grupo[item.index]: item.embedding for item in response.data}
+    
+    grupos = agrupar_por_orcamento(textos)
+    with ThreadPoolExecutor(max_workers=max(1, EMBEDDINGS_CONCORRENCIA)) as executor:
+        futures = [(executor.submit(vetorizar, grupo), grupo) for grupo in grupos]
+        for future, grupo in futures:
+            try:
+                embeddings.update(future.result())
+            except Exception as e:
+                falhas.update({i: f"{type(e).__name__}: {e}" for i in grupo})
+    
+    return embeddings, falhas
+
+
+def gerar_embeddings_em_lote(executor_lote, textos: list[str]) -> tuple[dict[int, list[float]], dict[int, str]]:
+    """
+    Gera os embeddings de vários textos pela Batch API (ou substituto local).
+    
+    Cada linha do lote leva um grupo de textos (mesmo agrupamento do modo
+    online), então os vetores são os mesmos.
+    
+    Args:
+        executor_lote: ExecutorLoteOpenAI ou ExecutorLoteLocal
+        textos: Textos para vetorizar
+        
+    Returns:
+        Tupla ({índice: vetor}, {índice: mensagem de erro})
+    """
+    grupos = agrupar_por_orcamento(textos)
+    requisicoes = [
+        montar_requisicao(
+            f"grupo-{g}", "/v1/embeddings",
+            {"model": EMBEDDING_MODEL, "input": [textos[i] for i in grupo]}
+        )
+        for g, grupo in enumerate(grupos)
+    ]
+    try:
+        respostas, erros = executor_lote.executar(requisicoes, "ingestao_embeddings")
+    except RuntimeError as e:
+        # Lote falhou, expirou ou foi cancelado sem saída: todos os trechos dele são erro
+        respostas, erros = {}, {requisicao["custom_id"]: str(e) for requisicao in requisicoes}
+    
+    embeddings: dict[int, list[float]] = {}
+    falhas: dict[int, str] = {}
+    for g, grupo in enumerate(grupos):
+        custom_id = f"grupo-{g}"
+        if custom_id in respostas:
+            for item in respostas[custom_id]["data"]:
+                embeddings[grupo[item["index"]]] = item["embedding"]
+        else:
+            falhas.update({i: erros.get(custom_id, "sem resposta") for i in grupo})
+    return embeddings, falhas
+
+
+def gerar_embeddings_com_cache(
+    cache: CacheEmbeddings | None,
+    textos: list[str],
+    gerar
+) -> tuple[dict[int, list[float]], dict[int, str]]:
+    """
+    Consulta o cache local antes da API: só os textos ausentes vão para
+    `gerar`, e o que voltar é guardado para as próximas execuções.
+    
+    Args:
+        cache: Cache de embeddings (None = sem cache)
+        textos: Textos para vetorizar
+        gerar: Função textos -> ({índice: vetor}, {índice: erro})
+        
+    Returns:
+        Tupla ({índice: vetor}, {índice: mensagem de erro})
+    """
+    if cache is None:
+        return gerar(textos)
+    
+    embeddings = cache.buscar(textos)
+    faltando = [i for i in range(len(textos)) if i not in embeddings]
+    if embeddings:
+        print(f"   💾 {len(embeddings)} embedding(s) do cache local, {len(faltando)} para gerar")
+    if not faltando:
+        return embeddings, {}
+    
+    gerados, falhas = gerar([textos[i] for i in faltando])
+    cache.guardar([textos[faltando[i]] for i in gerados], list(gerados.values()))
+    
+    embeddings.update({faltando[i]: vetor for i, vetor in gerados.items()})
+    return embeddings, {faltando[i]: mensagem for i, mensagem in falhas.items()}
+
+
+def abrir_cache_embeddings() -> CacheEmbeddings | None:
+    """
+    Abre o cache de embeddings do modelo atual (None se indisponível).
+    
+    Com OPENAI_BASE_URL apontando para outro servidor que não a API oficial,
+    o cache usa um arquivo separado, com o host como origem. Com
+    PIPELINE_SEM_CACHE=1 não há cache (todo texto vai à API).
+    """
+    if os.getenv("PIPELINE_SEM_CACHE", "") == "1":
+        print("   ⚠️ Cache de embeddings desativado (PIPELINE_SEM_CACHE=1)")
+        return None
+    try:
+        return CacheEmbeddings(EMBEDDING_MODEL, EMBEDDING_DIMENSION, origem=origem_da_url(os.getenv("OPENAI_BASE_URL")))
+    except ImportError as e:
+        print(f"   ⚠️ Cache de embeddings desativado: {e}")
+        return None
+
+
 def carregar_json(caminho: Path) -> dict:
     """
     Carrega e retorna o conteúdo de um arquivo JSON.
@@ -125,7 +352,8 @@ def inserir_documento(
     embedding: list[float]
 ) -> dict:
     """
-    Insere um documento na tabela `documents` do Supabase.
+    Insere (ou atualiza, pelo content_hash) um documento na tabela `documents`.
+    Para muitos documentos, use EscritorDocumentos.
     
     Args:
         supabase: Cliente Supabase
@@ -139,18 +367,56 @@ def inserir_documento(
     data = {
         "content": content,
         "metadata": metadata,
-        "embedding": embedding
+        "embedding": embedding,
+        "content_hash": calcular_hash_conteudo(content, metadata)
     }
     
-    response = supabase.table("documents").insert(data).execute()
+    response = supabase.table("documents").upsert(data, on_conflict="content_hash").execute()
     
     return response
 
 
+def carregar_hashes_por_titulo(supabase: Client) -> dict[str, set[str]]:
+    """
+    Carrega, numa consulta paginada, o content_hash de cada trecho gravado,
+    agrupado pelo título do documento. Comparado aos hashes dos trechos de um
+    JSON, diz se o documento no banco está atualizado e quais linhas ficaram
+    obsoletas (usado pela ingestão e pelo orquestrador).
+    
+    Args:
+        supabase: Cliente Supabase
+    
+    Returns:
+        Dicionário {título: conjunto de content_hash}
+    """
+    hashes_por_titulo: dict[str, set[str]] = {}
+    inicio = 0
+    
+    while True:
+        response = supabase.table("documents")\
+            .select("id, titulo:metadata->>titulo, content_hash")\
+            .order("id")\
+            .range(inicio, inicio + TAMANHO_PAGINA_SUPABASE - 1)\
+            .execute()
+    
+        for linha in response.data:
+            if linha.get("titulo"):
+                hashes_por_titulo.setdefault(linha["titulo"], set()).add(linha.get("content_hash"))
+    
+        if len(response.data) < TAMANHO_PAGINA_SUPABASE:
+            break
+        inicio += TAMANHO_PAGINA_SUPABASE
+    
+    return hashes_por_titulo
+
+
 def verificar_documento_existe(supabase: Client, titulo: str) -> bool:
     """
     Verifica se um documento com o mesmo título já existe no banco.
     
+    Consulta pontual (usa o índice documents_titulo_idx); para comparar
+    muitos documentos, prefira `carregar_hashes_por_titulo`.
+    
     Args:
         supabase: Cliente Supabase
         titulo: Título do documento
@@ -161,22 +427,158 @@ def verificar_documento_existe(supabase: Client, titulo: str) -> bool:
     response = supabase.table("documents")\
         .select("id")\
         .eq("metadata->>titulo", titulo)\
+        .limit(1)\
         .execute()
     
     return len(response.data) > 0
 
 
+def marcar_acervo_alterado(supabase: Client) -> None:
+    """
+    Incrementa a versão do acervo, invalidando os caches de resultados de
+    busca (arquivo local para cache_consultas.py, tabela corpus_versao para
+    o app Next.js).
+    
+    Args:
+        supabase: Cliente Supabase
+    """
+    versao = incrementar_versao_corpus()
+    try:
+        supabase.rpc("incrementar_versao_corpus").execute()
+    except Exception as e:
+        print(f"   ⚠️ Versão do acervo não atualizada no Supabase: {e}")
+    print(f"🔄 Versão do acervo: {versao} (caches de busca invalidados)")
+
+
+# ============================================================================
+# ESCRITA EM LOTE
+# ============================================================================
+
+def calcular_hash_conteudo(content: str, metadata: dict) -> str:
+    """
+    Chave de idempotência do documento (coluna `content_hash`): o mesmo
+    trecho reingerido atualiza a linha existente em vez de duplicá-la.
+    
+    A chave inclui a identidade do trecho (título + chunk_index), não só o
+    texto: dois documentos com um trecho idêntico ficam em linhas separadas
+    e a remoção dos obsoletos de um nunca apaga a linha do outro. A mesma
+    fórmula está no backfill da migração 20261018_add_documents_content_hash.sql.
+    
+    Args:
+        content: Texto do trecho
+        metadata: Metadados do trecho (usa `titulo` e `chunk_index`)
+        
+    Returns:
+        Hash SHA-256 em hexadecimal
+    """
+    chave = "\x1f".join([
+        str(metadata.get("titulo", "")),
+        str(metadata.get("chunk_index", "")),
+        content
+    ])
+    return hashlib.sha256(chave.encode("utf-8")).hexdigest()
+
+
+class EscritorDocumentos:
+    """
+    Acumula linhas da tabela `documents` e grava em upserts de
+    `tamanho_lote` linhas (conflito em `content_hash`).
+    
+    Se um lote falha, ele é dividido ao meio e cada metade é reenviada,
+    até isolar as linhas problemáticas: uma linha ruim não bloqueia as outras.
+    
+    Com supabase=None (dry run) só conta as linhas, sem gravar nada.
+    
+    Uso:
+        with EscritorDocumentos(supabase) as escritor:
+            escritor.adicionar(content, metadata, embedding)
+    """
+    
+    def __init__(self, supabase: Client | None, tamanho_lote: int = DOCUMENTOS_POR_LOTE):
+        self.supabase = supabase
+        self.tamanho_lote = max(1, tamanho_lote)
+        self.pendentes: list[dict] = []
+        self.gravados = 0
+        self.requisicoes = 0
+        self.falhas: list[tuple[str, str]] = []  # (título, erro)
+    
+    def __enter__(self) -> "EscritorDocumentos":
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.descarregar()
+    
+    def adicionar(self, content: str, metadata: dict, embedding: list[float]) -> None:
+        self.pendentes.append({
+            "content": content,
+            "metadata": metadata,
+            "embedding": embedding,
+            "content_hash": calcular_hash_conteudo(content, metadata)
+        })
+        if len(self.pendentes) >= self.tamanho_lote:
+            self.descarregar()
+    
+    def descarregar(self) -> None:
+        """Grava tudo o que está pendente."""
+        linhas, self.pendentes = self.pendentes, []
+        # Um upsert não pode tocar a mesma linha duas vezes ("cannot affect
+        # row a second time"): dentro do lote, a última versão de cada chave vale
+        linhas = list({linha["content_hash"]: linha for linha in linhas}.values())
+        if linhas:
+            self._gravar(linhas)
+    
+    def _gravar(self, linhas: list[dict]) -> None:
+        if self.supabase is None:
+            self.gravados += len(linhas)
+            return
+        self.requisicoes += 1
+        try:
+            self.supabase.table("documents")\
+                .upsert(linhas, on_conflict="content_hash", returning=ReturnMethod.minimal)\
+                .execute()
+        except Exception as e:
+            if len(linhas) == 1:
+                titulo = linhas[0]["metadata"].get("titulo", "Sem título")
+                self.falhas.append((titulo, f"{type(e).__name__}: {e}"))
+                return
+            # Bissecção: reenvia cada metade separadamente
+            meio = len(linhas) // 2
+            self._gravar(linhas[:meio])
+            self._gravar(linhas[meio:])
+            return
+        self.gravados += len(linhas)
+
+
 # ============================================================================
 # FUNÇÃO PRINCIPAL
 # ============================================================================
 
-def main():
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """
+    Lê as opções de linha de comando.
+    """
+    parser = argparse.ArgumentParser(description="Ingestão RAG (Etapa 3)")
+    modo = parser.add_mutually_exclusive_group()
+    modo.add_argument("--lote", action="store_true",
+                      help="Gera os embeddings pela Batch API da OpenAI (offline, mais barata)")
+    modo.add_argument("--lote-local", action="store_true",
+                      help="Modo lote com substituto local determinístico (sem chamar a OpenAI); "
+                           "exige --dry-run ou um SUPABASE_URL local")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Gera os embeddings mas não lê nem grava nada no Supabase")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None):
     """
     Função principal do pipeline de ingestão RAG.
     
     Itera sobre todos os arquivos JSON na pasta de entrada,
     gera embeddings e insere no Supabase.
     """
+    args = parse_args(argv)
+    modo_lote = args.lote or args.lote_local
+    
     print("=" * 60)
     print("🚀 INGESTÃO RAG - Pipeline de Vetorização")
     print("   Destino: Supabase (tabela: documents)")
@@ -187,19 +589,40 @@ def main():
     # -------------------------------------------------------------------------
     print("\n📡 Inicializando conexões...")
     
-    try:
-        supabase = get_supabase_client()
-        print("   ✅ Supabase conectado")
-    except ValueError as e:
-        print(f"   {e}")
+    # Vetores fictícios nunca vão para um banco real
+    if args.lote_local and not args.dry_run and not supabase_local(os.getenv("SUPABASE_URL")):
+        print("   ❌ --lote-local gera vetores fictícios: use --dry-run ou um SUPABASE_URL local")
+        print("      (ex.: python servicos_falsos.py)")
         return
     
-    try:
-        openai_client = get_openai_client()
-        print(f"   ✅ OpenAI conectado (modelo: {EMBEDDING_MODEL})")
-    except ValueError as e:
-        print(f"   {e}")
-        return
+    supabase = None
+    if args.dry_run:
+        print("   🔎 Dry run: nada será lido ou gravado no Supabase")
+    else:
+        try:
+            supabase = get_supabase_client()
+            print("   ✅ Supabase conectado")
+        except ValueError as e:
+            print(f"   {e}")
+            return
+    
+    executor_lote = None
+    cache_embeddings = None
+    if args.lote_local:
+        openai_client = None
+        executor_lote = ExecutorLoteLocal()
+        print("   🧪 Embeddings pelo substituto local de lotes (sem rede, sem cache de embeddings)")
+    else:
+        try:
+            openai_client = get_openai_client()
+            print(f"   ✅ OpenAI conectado (modelo: {EMBEDDING_MODEL})")
+        except ValueError as e:
+            print(f"   {e}")
+            return
+        if args.lote:
+            executor_lote = ExecutorLoteOpenAI(openai_client.client)
+            print("   📦 Embeddings pela Batch API")
+        cache_embeddings = abrir_cache_embeddings()
     
     # -------------------------------------------------------------------------
     # 2. Listar arquivos JSON
@@ -221,10 +644,60 @@ def main():
     # -------------------------------------------------------------------------
     # 3. Processar cada arquivo
     # -------------------------------------------------------------------------
-    inseridos = 0
     ignorados = 0
     erros = 0
     
+    # content_hash dos trechos já gravados: uma consulta paginada em vez de uma por arquivo
+    try:
+        hashes_no_banco = carregar_hashes_por_titulo(supabase) if supabase else {}
+    except Exception as e:
+        print(f"\n❌ ERRO ao carregar documentos existentes: {type(e).__name__}: {e}")
+        return
+    print(f"\n🗂️ Documentos já no banco: {len(hashes_no_banco)}")
+    
+    # Pré-leitura: os documentos são divididos em trechos e só os que mudaram
+    # (hashes dos trechos diferentes dos gravados) vão para embedding, agrupados
+    # em poucas requisições (ou num lote)
+    pendentes: dict[int, list[tuple[str, dict]]] = {}
+    obsoletos_por_titulo: dict[str, set[str]] = {}
+    for idx, arquivo in enumerate(arquivos_json, 1):
+        try:
+            dados = carregar_json(arquivo)
+        except Exception:
+            continue  # O erro é reportado no laço abaixo
+        content = dados.get("pageContent", "")
+        metadata = dados.get("metadata", {})
+        titulo = metadata.get("titulo", "Sem título")
+        if not content or titulo in obsoletos_por_titulo:
+            continue  # Títulos repetidos na pasta entram uma vez só
+        trechos = dividir_documento(content, metadata)
+        hashes = {calcular_hash_conteudo(trecho, metadata_trecho) for trecho, metadata_trecho in trechos}
+        no_banco = hashes_no_banco.get(titulo, set())
+        obsoletos_por_titulo[titulo] = no_banco - hashes
+        if hashes != no_banco:
+            pendentes[idx] = trechos
+    
+    # (arquivo, trecho) de cada texto enviado para embedding
+    indices = [(idx, j) for idx, trechos in pendentes.items() for j in range(len(trechos))]
+    textos = [pendentes[idx][j][0] for idx, j in indices]
+    if textos:
+        print(f"\n🧠 Embeddings de {len(textos)} trecho(s) de {len(pendentes)} documento(s) novo(s)...")
+    
+    def gerar(textos_faltando: list[str]) -> tuple[dict[int, list[float]], dict[int, str]]:
+        print(f"   🧠 Gerando {len(textos_faltando)} embedding(s) em "
+              f"{len(agrupar_por_orcamento(textos_faltando))} requisição(ões)...")
+        if modo_lote:
+            return gerar_embeddings_em_lote(executor_lote, textos_faltando)
+        return gerar_embeddings(openai_client, textos_faltando)
+    
+    gerados, falhas = gerar_embeddings_com_cache(cache_embeddings, textos, gerar)
+    embeddings = {indices[i]: vetor for i, vetor in gerados.items()}
+    falhas_embedding = {indices[i]: mensagem for i, mensagem in falhas.items()}
+    
+    # Inserções agrupadas em upserts de DOCUMENTOS_POR_LOTE linhas
+    escritor = EscritorDocumentos(supabase)
+    enfileirados: set[str] = set()
+    
     for idx, arquivo in enumerate(arquivos_json, 1):
         nome_arquivo = arquivo.name
         
@@ -244,27 +717,28 @@ def main():
                 ignorados += 1
                 continue
             
-            # Verificar se já existe
-            if verificar_documento_existe(supabase, titulo):
-                print(f"   ⏭️ Documento já existe: {titulo}")
+            # Verificar se o banco já tem estes trechos (comparado na pré-leitura)
+            if idx not in pendentes:
+                print(f"   ⏭️ Documento já atualizado no banco: {titulo}")
                 ignorados += 1
                 continue
             
-            # Gerar embedding
-            print(f"   🧠 Gerando embedding ({len(content)} chars)...")
-            embedding = gerar_embedding(openai_client, content)
-            print(f"   📊 Vetor gerado: {len(embedding)} dimensões")
+            # Embeddings dos trechos gerados na pré-leitura
+            trechos = pendentes[idx]
+            for j in range(len(trechos)):
+                if (idx, j) in falhas_embedding:
+                    raise RuntimeError(f"Falha ao gerar embedding: {falhas_embedding[(idx, j)]}")
+            print(f"   ✂️ {len(trechos)} trecho(s) de até {TOKENS_POR_TRECHO} tokens ({len(content)} chars)")
             
-            # Inserir no Supabase
-            print(f"   💾 Inserindo no Supabase...")
-            response = inserir_documento(supabase, content, metadata, embedding)
+            # Enfileirar para o próximo upsert em lote
+            for j, (trecho, metadata_trecho) in enumerate(trechos):
+                escritor.adicionar(trecho, metadata_trecho, embeddings[(idx, j)])
+            enfileirados.add(titulo)
             
-            print(f"   ✅ Inserido com sucesso!")
+            print(f"   💾 Enfileirado para inserção no Supabase")
             print(f"   📊 Título: {titulo}")
             print(f"   📊 Temporada: {metadata.get('temporada', 'N/A')}, Episódio: {metadata.get('episodio', 'N/A')}")
             
-            inseridos += 1
-            
         except json.JSONDecodeError as e:
             print(f"   ❌ ERRO ao parsear JSON: {e}")
             erros += 1
@@ -275,6 +749,36 @@ def main():
             erros += 1
             continue
     
+    # Gravar o que sobrou no buffer
+    escritor.descarregar()
+    titulos_com_falha = {titulo for titulo, _ in escritor.falhas}
+    inseridos = len(enfileirados - titulos_com_falha)
+    erros += len(titulos_com_falha)
+    
+    if supabase is None:
+        print(f"\n🔎 Dry run: {escritor.gravados} trecho(s) seriam gravados no Supabase")
+    else:
+        print(f"\n💾 {escritor.gravados} trecho(s) gravado(s) em {escritor.requisicoes} requisição(ões) ao Supabase")
+    for titulo, erro in escritor.falhas:
+        print(f"   ❌ ERRO ao inserir '{titulo}': {erro}")
+    
+    # Trechos de versões anteriores dos documentos regravados (texto mudou ou
+    # foi dividido de outro jeito): só depois que a versão nova foi gravada
+    obsoletos = sorted(
+        hash_conteudo
+        for titulo in enfileirados - titulos_com_falha
+        for hash_conteudo in obsoletos_por_titulo.get(titulo, set())
+    )
+    if supabase and obsoletos:
+        try:
+            supabase.table("documents").delete().in_("content_hash", obsoletos).execute()
+            print(f"   🧹 {len(obsoletos)} trecho(s) obsoleto(s) removido(s)")
+        except Exception as e:
+            print(f"   ⚠️ Falha ao remover trechos obsoletos: {type(e).__name__}: {e}")
+    
+    if supabase and (escritor.gravados > 0 or obsoletos):
+        marcar_acervo_alterado(supabase)
+    
     # -------------------------------------------------------------------------
     # 4. Resumo final
     # -------------------------------------------------------------------------
@@ -282,7 +786,7 @@ def main():
     print("📊 RESUMO DA INGESTÃO")
     print("=" * 60)
     print(f"   ✅ Inseridos: {inseridos}/{total_arquivos}")
-    print(f"   ⏭️ Ignorados (já existem ou vazios): {ignorados}/{total_arquivos}")
+    print(f"   ⏭️ Ignorados (já atualizados ou vazios): {ignorados}/{total_arquivos}")
     print(f"   ❌ Erros: {erros}/{total_arquivos}")
     print(f"   📁 Fonte: {INPUT_DIR}")
     print(f"   🎯 Destino: Supabase → tabela 'documents'")
@@ -0,0 +1,305 @@
+"""
+==============================================================================
+LOTE OPENAI - Modo offline (Batch API) para extração e embeddings em massa
+==============================================================================
+
+Usado por extrator_dados.py e ingestao_rag.py para reprocessar o catálogo
+inteiro pela Batch API (mais barata e sem pressão de limite de taxa):
+1. Grava as requisições num arquivo JSONL (uma por linha, com custom_id)
+2. Envia o arquivo e cria o lote
+3. Consulta o status com backoff até o lote terminar
+4. Baixa a saída e devolve as respostas indexadas por custom_id
+
+ExecutorLoteLocal é um substituto local do endpoint de lotes: lê o mesmo JSONL
+e produz a mesma saída, respondendo cada linha com uma função local. Serve
+para testar o modo lote sem rede e sem custo.
+
+Autor: Pipeline de Dados SESI-SENAI
+Data: 2026-10-18
+==============================================================================
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import struct
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from openai import OpenAI
+
+# ============================================================================
+# CONFIGURAÇÕES
+# ============================================================================
+
+# Pasta onde ficam os JSONL de entrada e saída de cada lote
+PASTA_LOTES = Path(os.getenv("PIPELINE_RAIZ_DADOS", ".")) / ".cache" / "lotes"
+
+# Janela de conclusão pedida à Batch API
+JANELA_CONCLUSAO = "24h"
+
+# Consulta de status: começa rápido e vai espaçando
+ESPERA_INICIAL_SEGUNDOS = 5.0
+ESPERA_MAXIMA_SEGUNDOS = 300.0
+FATOR_ESPERA = 1.5
+
+STATUS_FINAIS = {"completed", "failed", "expired", "cancelled"}
+
+
+# ============================================================================
+# FORMATO JSONL
+# ============================================================================
+
+def montar_requisicao(custom_id: str, url: str, corpo: dict) -> dict:
+    """
+    Monta uma linha do JSONL de entrada da Batch API.
+
+    Args:
+        custom_id: Identificador usado para mapear a resposta de volta
+        url: Endpoint (ex.: "/v1/chat/completions")
+        corpo: Mesmo corpo que seria enviado na chamada síncrona
+
+    Returns:
+        Dicionário da linha
+    """
+    return {"custom_id": custom_id, "method": "POST", "url": url, "body": corpo}
+
+
+def escrever_jsonl(linhas: list[dict], caminho: Path) -> None:
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    with open(caminho, "w", encoding="utf-8") as f:
+        for linha in linhas:
+            f.write(json.dumps(linha, ensure_ascii=False) + "\n")
+
+
+def ler_saida_jsonl(texto: str) -> tuple[dict[str, dict], dict[str, str]]:
+    """
+    Interpreta o JSONL de saída (ou de erros) de um lote.
+
+    Args:
+        texto: Conteúdo do arquivo de saída
+
+    Returns:
+        Tupla (respostas {custom_id: corpo}, erros {custom_id: mensagem})
+    """
+    respostas: dict[str, dict] = {}
+    erros: dict[str, str] = {}
+
+    for linha in texto.splitlines():
+        if not linha.strip():
+            continue
+        item = json.loads(linha)
+        custom_id = item["custom_id"]
+        resposta = item.get("response") or {}
+
+        if item.get("error"):
+            erros[custom_id] = str(item["error"].get("message", item["error"]))
+        elif resposta.get("status_code") != 200:
+            erros[custom_id] = f"HTTP {resposta.get('status_code')}: {resposta.get('body')}"
+        else:
+            respostas[custom_id] = resposta["body"]
+
+    return respostas, erros
+
+
+# ============================================================================
+# EXECUTORES
+# ============================================================================
+
+class ExecutorLoteOpenAI:
+    """
+    Executa requisições pela Batch API da OpenAI.
+    """
+
+    def __init__(self, client: OpenAI, pasta: Path = PASTA_LOTES):
+        self.client = client
+        self.pasta = pasta
+
+    def executar(self, requisicoes: list[dict], nome: str) -> tuple[dict[str, dict], dict[str, str]]:
+        """
+        Envia as requisições como um lote e espera o resultado.
+
+        Args:
+            requisicoes: Linhas montadas com `montar_requisicao` (mesmo endpoint)
+            nome: Nome do lote (usado nos arquivos locais)
+
+        Returns:
+            Tupla (respostas {custom_id: corpo}, erros {custom_id: mensagem})
+        """
+        if not requisicoes:
+            return {}, {}
+
+        caminho_entrada = self.pasta / f"{nome}.entrada.jsonl"
+        escrever_jsonl(requisicoes, caminho_entrada)
+
+        with open(caminho_entrada, "rb") as f:
+            arquivo = self.client.files.create(file=f, purpose="batch")
+
+        lote = self.client.batches.create(
+            input_file_id=arquivo.id,
+            endpoint=requisicoes[0]["url"],
+            completion_window=JANELA_CONCLUSAO,
+        )
+        print(f"   📦 Lote {lote.id} criado ({len(requisicoes)} requisições)")
+
+        espera = ESPERA_INICIAL_SEGUNDOS
+        while lote.status not in STATUS_FINAIS:
+            time.sleep(espera)
+            espera = min(ESPERA_MAXIMA_SEGUNDOS, espera * FATOR_ESPERA)
+            lote = self.client.batches.retrieve(lote.id)
+            contagem = lote.request_counts
+            if contagem:
+                print(f"   ⏳ {lote.status}: {contagem.completed}/{contagem.total} concluídas")
+
+        if lote.status != "completed" and not lote.output_file_id:
+            raise RuntimeError(f"Lote {lote.id} terminou com status '{lote.status}'")
+
+        texto_saida = ""
+        if lote.output_file_id:
+            texto_saida = self.client.files.content(lote.output_file_id).text
+        if lote.error_file_id:
+            texto_saida += "\n" + self.client.files.content(lote.error_file_id).text
+
+        (self.pasta / f"{nome}.saida.jsonl").write_text(texto_saida, encoding="utf-8")
+        respostas, erros = ler_saida_jsonl(texto_saida)
+
+        # Requisições que não apareceram em nenhum arquivo (ex.: lote expirado)
+        for requisicao in requisicoes:
+            custom_id = requisicao["custom_id"]
+            if custom_id not in respostas and custom_id not in erros:
+                erros[custom_id] = f"sem resposta (lote {lote.status})"
+
+        return respostas, erros
+
+
+class ExecutorLoteLocal:
+    """
+    Substituto local do endpoint de lotes, com a mesma interface de
+    ExecutorLoteOpenAI: grava o JSONL de entrada, responde cada linha com
+    `responder(url, corpo)` e passa a saída pelo mesmo parser.
+    """
+
+    def __init__(
+        self,
+        responder: Optional[Callable[[str, dict], dict]] = None,
+        pasta: Path = PASTA_LOTES
+    ):
+        self.responder = responder or resposta_deterministica
+        self.pasta = pasta
+
+    def executar(self, requisicoes: list[dict], nome: str) -> tuple[dict[str, dict], dict[str, str]]:
+        if not requisicoes:
+            return {}, {}
+
+        escrever_jsonl(requisicoes, self.pasta / f"{nome}.entrada.jsonl")
+
+        linhas_saida = []
+        for requisicao in requisicoes:
+            try:
+                corpo = self.responder(requisicao["url"], requisicao["body"])
+                resposta = {"status_code": 200, "body": corpo}
+                erro = None
+            except Exception as e:
+                resposta = None
+                erro = {"message": f"{type(e).__name__}: {e}"}
+            linhas_saida.append({"custom_id": requisicao["custom_id"], "response": resposta, "error": erro})
+
+        texto_saida = "\n".join(json.dumps(linha, ensure_ascii=False) for linha in linhas_saida)
+        (self.pasta / f"{nome}.saida.jsonl").write_text(texto_saida, encoding="utf-8")
+        print(f"   📦 Lote local '{nome}' executado ({len(requisicoes)} requisições)")
+        return ler_saida_jsonl(texto_saida)
+
+
+# ============================================================================
+# RESPOSTAS DETERMINÍSTICAS (SEM REDE)
+# ============================================================================
+
+def vetor_deterministico(texto: str, dimensao: int) -> list[float]:
+    """
+    Vetor unitário pseudoaleatório derivado do SHA-256 do texto:
+    o mesmo texto sempre gera o mesmo vetor.
+    """
+    valores = []
+    contador = 0
+    while len(valores) < dimensao:
+        bloco = hashlib.sha256(f"{contador}|{texto}".encode("utf-8")).digest()
+        valores.extend(v / 2**31 - 1.0 for v in struct.unpack("<8I", bloco))
+        contador += 1
+    valores = valores[:dimensao]
+    norma = math.sqrt(sum(v * v for v in valores)) or 1.0
+    return [v / norma for v in valores]
+
+
+def _cedula_deterministica(mensagem_usuario: str) -> dict:
+    """Cédula válida montada a partir do cabeçalho da mensagem de extração."""
+    def campo(nome: str, padrao: str) -> str:
+        encontrado = re.search(rf"^{nome}: (.*)$", mensagem_usuario, re.MULTILINE)
+        return encontrado.group(1).strip() if encontrado else padrao
+
+    arquivo = campo("ARQUIVO", "Episódio")
+    partes = [p.strip() for p in arquivo.split(" - ")]
+    titulo = " - ".join(partes[1:3]) if len(partes) >= 3 else arquivo
+
+    return {
+        "pageContent": f"Resumo determinístico de {arquivo}.\n\n" + mensagem_usuario[-400:],
+        "metadata": {
+            "titulo": titulo,
+            "temporada": int(campo("TEMPORADA", "1")),
+            "episodio": int(campo("EPISÓDIO", "1")),
+            "pilar_inovacao": "Autonomia do Aluno",
+            "gatilhos_comportamentais": ["falta de engajamento"],
+            "gatilhos_conteudo": ["Projetos de Vida"],
+            "competencias_bncc": ["Competência 5 - Cultura Digital"],
+        },
+    }
+
+
+def resposta_deterministica(url: str, corpo: dict) -> dict:
+    """
+    Resposta local e determinística no formato da API para os endpoints do
+    pipeline (chat/completions e embeddings).
+
+    Args:
+        url: Endpoint da requisição
+        corpo: Corpo da requisição
+
+    Returns:
+        Corpo da resposta no formato da OpenAI
+    """
+    if url.endswith("/embeddings"):
+        entradas = corpo["input"] if isinstance(corpo["input"], list) else [corpo["input"]]
+        dimensao = corpo.get("dimensions") or 1536
+        return {
+            "object": "list",
+            "model": corpo["model"],
+            "data": [
+                {"object": "embedding", "index": i, "embedding": vetor_deterministico(texto, dimensao)}
+                for i, texto in enumerate(entradas)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    if url.endswith("/chat/completions"):
+        mensagem_usuario = corpo["messages"][-1]["content"]
+        if (corpo.get("response_format") or {}).get("type") == "json_object":
+            conteudo = json.dumps(_cedula_deterministica(mensagem_usuario), ensure_ascii=False)
+        else:
+            conteudo = "- " + mensagem_usuario[:200].replace("\n", " ")
+        digest = hashlib.sha256(json.dumps(corpo, sort_keys=True).encode("utf-8")).hexdigest()
+        return {
+            "id": f"chatcmpl-{digest[:24]}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": corpo["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": conteudo},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    raise ValueError(f"Endpoint não suportado no lote local: {url}")
@@ -0,0 +1,499 @@
+"""
+==============================================================================
+ORQUESTRADOR - Pipeline completo: áudio → transcrição → Cédula → vetores
+==============================================================================
+
+Os três scripts (transcritor.py → extrator_dados.py → ingestao_rag.py) só se
+conhecem pelas pastas ./Videos/transcricoes e ./Videos/json_finais, e cada
+um varre tudo de novo. Aqui cada episódio é um DAG de artefatos:
+
+    áudio ──► transcrição (.txt) ──► Cédula (.json) ──► trechos em `documents`
+
+Cada artefato depende do hash do conteúdo que o gerou e só é refeito quando
+esse hash muda:
+- transcrição: SHA-256 do áudio (memorizado por tamanho + mtime, para não
+  reler centenas de MB a cada execução), em .cache/orquestrador/estado.json
+- Cédula: impressão digital do próprio extrator (transcrição + prompts + modelo)
+- vetores: content_hash dos trechos do JSON contra os gravados no banco
+
+Um artefato refeito com o mesmo conteúdo não propaga (transcrição idêntica
+não gera nova extração). Cada episódio passa para a etapa seguinte assim que
+termina a atual: um episódio novo vai do áudio aos vetores sem reprocessar
+os demais.
+
+Autor: Pipeline de Dados SESI-SENAI
+Data: 2026-10-18
+==============================================================================
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Optional
+
+import extrator_dados
+import ingestao_rag
+import transcritor
+
+# ============================================================================
+# CONFIGURAÇÕES
+# ============================================================================
+
+# Pastas de cada artefato (as mesmas dos scripts de cada etapa)
+PASTA_AUDIOS = transcritor.VIDEOS_FOLDER
+PASTA_TRANSCRICOES = extrator_dados.INPUT_DIR
+PASTA_CEDULAS = extrator_dados.OUTPUT_DIR
+
+# Hashes dos áudios e dependências registradas de cada episódio
+ESTADO_PATH = Path(os.getenv("PIPELINE_RAIZ_DADOS", ".")) / ".cache" / "orquestrador" / "estado.json"
+
+# Episódios em cada etapa ao mesmo tempo
+TRANSCRICOES_SIMULTANEAS = int(os.getenv("ORQUESTRADOR_TRANSCRICOES", "2"))
+EXTRACOES_SIMULTANEAS = extrator_dados.MAX_CONCORRENCIA
+INGESTOES_SIMULTANEAS = int(os.getenv("ORQUESTRADOR_INGESTOES", "2"))
+
+ETAPAS = ("transcricao", "cedula", "vetores")
+
+
+# ============================================================================
+# ESTADO PERSISTENTE
+# ============================================================================
+
+def calcular_hash_arquivo(caminho: Path) -> str:
+    digest = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(bloco)
+    return digest.hexdigest()
+
+
+class EstadoOrquestrador:
+    """
+    Registro persistente por episódio:
+        {episódio: {"audio": {tamanho, mtime_ns, sha256},
+                    "transcricao": sha256 do áudio transcrito,
+                    "vetores": título gravado no banco}}
+
+    Regravado de forma atômica a cada mudança (seguro entre threads).
+    """
+
+    def __init__(self, caminho: Path):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        try:
+            with open(caminho, "r", encoding="utf-8") as f:
+                self.dados: dict[str, dict] = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.dados = {}
+
+    def obter(self, episodio: str, chave: str):
+        with self._lock:
+            return self.dados.get(episodio, {}).get(chave)
+
+    def registrar(self, episodio: str, chave: str, valor) -> None:
+        with self._lock:
+            self.dados.setdefault(episodio, {})[chave] = valor
+            self.caminho.parent.mkdir(parents=True, exist_ok=True)
+            extrator_dados.salvar_json(self.dados, self.caminho)
+
+    def hash_audio(self, episodio: str, audio: Path, persistir: bool = True) -> str:
+        """
+        SHA-256 do áudio, recalculado só se tamanho ou mtime mudarem
+        (persistir=False não memoriza o recalculado, para o dry run).
+        """
+        estado = audio.stat()
+        memo = self.obter(episodio, "audio")
+        if memo and memo["tamanho"] == estado.st_size and memo["mtime_ns"] == estado.st_mtime_ns:
+            return memo["sha256"]
+        sha256 = calcular_hash_arquivo(audio)
+        if persistir:
+            self.registrar(episodio, "audio", {
+                "tamanho": estado.st_size, "mtime_ns": estado.st_mtime_ns, "sha256": sha256
+            })
+        return sha256
+
+
+# ============================================================================
+# DEPENDÊNCIAS DE CADA ARTEFATO
+# ============================================================================
+
+def transcricao_atual(estado: EstadoOrquestrador, episodio: str, audio: Path, persistir: bool = True) -> bool:
+    """
+    A transcrição existe e veio deste áudio. Transcrições feitas antes do
+    orquestrador (sem registro) são adotadas como atuais.
+
+    Com persistir=False (dry run) nada é gravado no estado: nem o hash do
+    áudio nem a adoção, que ficam para a execução de verdade.
+    """
+    if not (PASTA_TRANSCRICOES / f"{episodio}.txt").exists():
+        return False
+    hash_audio = estado.hash_audio(episodio, audio, persistir)
+    registrado = estado.obter(episodio, "transcricao")
+    if registrado is None:
+        if persistir:
+            estado.registrar(episodio, "transcricao", hash_audio)
+        return True
+    return registrado == hash_audio
+
+
+def impressao_cedula(
+    registro: extrator_dados.RegistroImpressoes,
+    episodio: str
+) -> tuple[str, str, bool]:
+    """
+    Returns:
+        Tupla (transcrição, impressão digital, Cédula atual?)
+    """
+    transcricao = extrator_dados.ler_transcricao(PASTA_TRANSCRICOES / f"{episodio}.txt")
+    impressao = extrator_dados.calcular_impressao(transcricao, episodio)
+    atual = not extrator_dados.FORCAR_REPROCESSAMENTO and registro.inalterado(
+        episodio, impressao, PASTA_CEDULAS / f"{episodio}.json"
+    )
+    return transcricao, impressao, atual
+
+
+def trechos_cedula(episodio: str) -> tuple[str, list[tuple[str, dict]], list[str]]:
+    """
+    Divide a Cédula em trechos exatamente como a ingestão.
+
+    Returns:
+        Tupla (título, [(trecho, metadados)], [content_hash de cada trecho])
+    """
+    dados = ingestao_rag.carregar_json(PASTA_CEDULAS / f"{episodio}.json")
+    content = dados.get("pageContent", "")
+    metadata = dados.get("metadata", {})
+    if not content:
+        raise ValueError("Campo 'pageContent' vazio")
+    trechos = ingestao_rag.dividir_documento(content, metadata)
+    hashes = [ingestao_rag.calcular_hash_conteudo(trecho, metadata_trecho) for trecho, metadata_trecho in trechos]
+    return metadata.get("titulo", "Sem título"), trechos, hashes
+
+
+# ============================================================================
+# ORQUESTRADOR
+# ============================================================================
+
+class Orquestrador:
+    """
+    Um pool por etapa; cada etapa, ao terminar um episódio, já o entrega à
+    seguinte. Episódios que falham param na etapa da falha (os demais seguem).
+
+    Uso:
+        orquestrador = Orquestrador(supabase)
+        resultados = orquestrador.executar({"T1E1 - Escola": Path("Videos/T1E1 - Escola.mp3")})
+    """
+
+    def __init__(self, supabase):
+        self.supabase = supabase
+        self.estado = EstadoOrquestrador(ESTADO_PATH)
+        self.registro = extrator_dados.RegistroImpressoes(extrator_dados.IMPRESSOES_PATH)
+        self.hashes_banco = ingestao_rag.carregar_hashes_por_titulo(supabase)
+        self.cache_embeddings = ingestao_rag.abrir_cache_embeddings()
+        self.acervo_alterado = False
+        self.resultados: dict[str, dict[str, str]] = {}
+        self._client: Optional[ingestao_rag.ClienteOpenAIControlado] = None
+        self._lock = threading.Lock()
+        self._futures: list[Future] = []
+        self._pools = {
+            "transcricao": ThreadPoolExecutor(max(1, TRANSCRICOES_SIMULTANEAS), "transcricao"),
+            "cedula": ThreadPoolExecutor(max(1, EXTRACOES_SIMULTANEAS), "cedula"),
+            "vetores": ThreadPoolExecutor(max(1, INGESTOES_SIMULTANEAS), "vetores"),
+        }
+
+    @property
+    def client(self) -> ingestao_rag.ClienteOpenAIControlado:
+        """Cliente OpenAI de chat + embeddings (criado só se alguma etapa precisar)."""
+        with self._lock:
+            if self._client is None:
+                self._client = ingestao_rag.get_openai_client()
+            return self._client
+
+    # ------------------------------------------------------------------------
+    # Agendamento
+    # ------------------------------------------------------------------------
+    def executar(self, episodios: dict[str, Optional[Path]]) -> dict[str, dict[str, str]]:
+        """
+        Leva cada episódio até os vetores.
+
+        Args:
+            episodios: {episódio: áudio}; sem áudio, começa pela transcrição
+                (ou pela Cédula, se também não houver transcrição)
+
+        Returns:
+            {episódio: {etapa: situação}}
+        """
+        for episodio, audio in episodios.items():
+            self.resultados[episodio] = {}
+            if audio is not None:
+                self._agendar("transcricao", self._etapa_transcricao, episodio, audio)
+            elif (PASTA_TRANSCRICOES / f"{episodio}.txt").exists():
+                self._marcar(episodio, "transcricao", "— sem áudio")
+                self._agendar("cedula", self._etapa_cedula, episodio)
+            else:
+                self._marcar(episodio, "transcricao", "— sem áudio")
+                self._marcar(episodio, "cedula", "— sem transcrição")
+                self._agendar("vetores", self._etapa_vetores, episodio)
+
+        # Cada etapa agenda a seguinte antes de terminar: quando não há mais
+        # nada pendente, todos os episódios chegaram ao fim
+        while True:
+            with self._lock:
+                pendentes = [future for future in self._futures if not future.done()]
+            if not pendentes:
+                break
+            wait(pendentes, return_when=FIRST_COMPLETED)
+
+        for pool in self._pools.values():
+            pool.shutdown()
+        if self.acervo_alterado:
+            ingestao_rag.marcar_acervo_alterado(self.supabase)
+        return self.resultados
+
+    def _agendar(self, etapa: str, funcao: Callable, episodio: str, *args) -> None:
+        def rodar():
+            try:
+                funcao(episodio, *args)
+            except Exception as e:
+                print(f"  ❌ [{episodio}] Erro em {etapa}: {type(e).__name__}: {e}")
+                self._marcar(episodio, etapa, f"❌ {type(e).__name__}")
+
+        future = self._pools[etapa].submit(rodar)
+        with self._lock:
+            self._futures.append(future)
+
+    def _marcar(self, episodio: str, etapa: str, situacao: str) -> None:
+        with self._lock:
+            self.resultados[episodio][etapa] = situacao
+
+    # ------------------------------------------------------------------------
+    # Etapas
+    # ------------------------------------------------------------------------
+    def _etapa_transcricao(self, episodio: str, audio: Path) -> None:
+        if transcricao_atual(self.estado, episodio, audio):
+            self._marcar(episodio, "transcricao", "⏭️ atual")
+        else:
+            por_arquivo = max(1, transcritor.MAX_CONCURRENT_TRANSCRIPTIONS // max(1, TRANSCRICOES_SIMULTANEAS))
+            if not transcritor.transcribe_audio_file(audio, PASTA_TRANSCRICOES, por_arquivo):
+                self._marcar(episodio, "transcricao", "❌ falhou")
+                return
+            self.estado.registrar(episodio, "transcricao", self.estado.hash_audio(episodio, audio))
+            self._marcar(episodio, "transcricao", "✅ gerada")
+        self._agendar("cedula", self._etapa_cedula, episodio)
+
+    def _etapa_cedula(self, episodio: str) -> None:
+        transcricao, impressao, atual = impressao_cedula(self.registro, episodio)
+        if atual:
+            self._marcar(episodio, "cedula", "⏭️ atual")
+        else:
+            arquivo = PASTA_TRANSCRICOES / f"{episodio}.txt"
+            print(f"  🤖 [{episodio}] Extraindo Cédula ({extrator_dados.MODEL})")
+            sucesso, log = extrator_dados.processar_arquivo(self.client, arquivo, transcricao, impressao, self.registro)
+            for linha in log:
+                print(f"  [{episodio}] {linha.strip()}")
+            if not sucesso:
+                self._marcar(episodio, "cedula", "❌ falhou")
+                return
+            self._marcar(episodio, "cedula", "✅ gerada")
+        self._agendar("vetores", self._etapa_vetores, episodio)
+
+    def _etapa_vetores(self, episodio: str) -> None:
+        titulo, trechos, hashes = trechos_cedula(episodio)
+        titulo_anterior = self.estado.obter(episodio, "vetores") or titulo
+        with self._lock:
+            no_banco = self.hashes_banco.get(titulo, set()) | self.hashes_banco.get(titulo_anterior, set())
+
+        if no_banco == set(hashes):
+            self.estado.registrar(episodio, "vetores", titulo)
+            self._marcar(episodio, "vetores", "⏭️ atual")
+            return
+
+        print(f"  🧠 [{episodio}] Vetorizando {len(trechos)} trecho(s)")
+        textos = [trecho for trecho, _ in trechos]
+        embeddings, falhas = ingestao_rag.gerar_embeddings_com_cache(
+            self.cache_embeddings, textos, lambda faltando: ingestao_rag.gerar_embeddings(self.client, faltando)
+        )
+        if falhas:
+            raise RuntimeError(f"Falha ao gerar embedding: {next(iter(falhas.values()))}")
+
+        with ingestao_rag.EscritorDocumentos(self.supabase) as escritor:
+            for i, (trecho, metadata_trecho) in enumerate(trechos):
+                escritor.adicionar(trecho, metadata_trecho, embeddings[i])
+        if escritor.falhas:
+            raise RuntimeError(escritor.falhas[0][1])
+
+        # Trechos da versão anterior que não existem mais nesta
+        obsoletos = sorted(no_banco - set(hashes))
+        if obsoletos:
+            self.supabase.table("documents").delete().in_("content_hash", obsoletos).execute()
+
+        with self._lock:
+            self.hashes_banco.pop(titulo_anterior, None)
+            self.hashes_banco[titulo] = set(hashes)
+            self.acervo_alterado = True
+        self.estado.registrar(episodio, "vetores", titulo)
+        removidos = f", {len(obsoletos)} obsoleto(s) removido(s)" if obsoletos else ""
+        self._marcar(episodio, "vetores", f"✅ {escritor.gravados} trecho(s){removidos}")
+
+
+# ============================================================================
+# PLANO (DRY RUN)
+# ============================================================================
+
+def planejar(
+    episodios: dict[str, Optional[Path]],
+    hashes_banco: Optional[dict[str, set[str]]]
+) -> dict[str, dict[str, str]]:
+    """
+    O que seria refeito, sem chamar nenhuma API nem gravar nada (estado e
+    impressões ficam como estão). Etapas depois de uma desatualizada
+    aparecem como "depende" (só se sabe após refazer a anterior).
+    """
+    estado = EstadoOrquestrador(ESTADO_PATH)
+    registro = extrator_dados.RegistroImpressoes(extrator_dados.IMPRESSOES_PATH)
+    plano: dict[str, dict[str, str]] = {}
+
+    for episodio, audio in episodios.items():
+        etapas: dict[str, str] = {}
+        desatualizado = False
+
+        if audio is None:
+            etapas["transcricao"] = "— sem áudio"
+        elif transcricao_atual(estado, episodio, audio, persistir=False):
+            etapas["transcricao"] = "⏭️ atual"
+        else:
+            etapas["transcricao"] = "🔄 refazer"
+            desatualizado = True
+
+        if desatualizado:
+            etapas["cedula"] = "⏳ depende"
+        elif not (PASTA_TRANSCRICOES / f"{episodio}.txt").exists():
+            etapas["cedula"] = "— sem transcrição"
+        elif impressao_cedula(registro, episodio)[2]:
+            etapas["cedula"] = "⏭️ atual"
+        else:
+            etapas["cedula"] = "🔄 refazer"
+            desatualizado = True
+
+        if desatualizado:
+            etapas["vetores"] = "⏳ depende"
+        elif hashes_banco is None:
+            etapas["vetores"] = "? sem Supabase"
+        else:
+            try:
+                titulo, _, hashes = trechos_cedula(episodio)
+                anterior = estado.obter(episodio, "vetores") or titulo
+                no_banco = hashes_banco.get(titulo, set()) | hashes_banco.get(anterior, set())
+                etapas["vetores"] = "⏭️ atual" if no_banco == set(hashes) else "🔄 refazer"
+            except Exception as e:
+                etapas["vetores"] = f"❌ {type(e).__name__}"
+
+        plano[episodio] = etapas
+    return plano
+
+
+# ============================================================================
+# FUNÇÃO PRINCIPAL
+# ============================================================================
+
+def listar_episodios(filtro: Optional[str] = None) -> dict[str, Optional[Path]]:
+    """
+    Episódios conhecidos em qualquer etapa (áudio, transcrição ou Cédula).
+
+    Returns:
+        {episódio: áudio ou None}, em ordem de nome
+    """
+    audios = {audio.stem: audio for audio in transcritor.get_audio_files(PASTA_AUDIOS)}
+    nomes = set(audios)
+    nomes.update(caminho.stem for caminho in PASTA_TRANSCRICOES.glob("*.txt"))
+    nomes.update(caminho.stem for caminho in PASTA_CEDULAS.glob("*.json"))
+    return {
+        nome: audios.get(nome)
+        for nome in sorted(nomes)
+        if filtro is None or filtro.lower() in nome.lower()
+    }
+
+
+def imprimir_tabela(situacoes: dict[str, dict[str, str]]) -> None:
+    for episodio, etapas in situacoes.items():
+        print(f"\n   📺 {episodio}")
+        for etapa in ETAPAS:
+            print(f"      {etapa:<12} {etapas.get(etapa, '—')}")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    """
+    Lê as opções de linha de comando.
+    """
+    parser = argparse.ArgumentParser(description="Orquestrador do pipeline (áudio → vetores)")
+    parser.add_argument("--episodio", help="Só episódios cujo nome contém este texto (ex.: T2E5)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Mostra o que seria refeito em cada etapa, sem chamar APIs")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None):
+    """
+    Função principal do orquestrador.
+    """
+    args = parse_args(argv)
+
+    print("=" * 60)
+    print("🎼 ORQUESTRADOR - áudio → transcrição → Cédula → vetores")
+    print("=" * 60)
+
+    episodios = listar_episodios(args.episodio)
+    if not episodios:
+        print("\n⚠️ Nenhum episódio encontrado")
+        return
+    print(f"\n📺 Episódios: {len(episodios)}")
+
+    try:
+        supabase = ingestao_rag.get_supabase_client()
+    except ValueError as e:
+        if not args.dry_run:
+            print(f"\n{e}")
+            return
+        supabase = None
+
+    if args.dry_run:
+        hashes_banco = ingestao_rag.carregar_hashes_por_titulo(supabase) if supabase else None
+        imprimir_tabela(planejar(episodios, hashes_banco))
+        print("\n🔎 Dry run: nenhum artefato foi gerado.")
+        return
+
+    PASTA_TRANSCRICOES.mkdir(parents=True, exist_ok=True)
+    PASTA_CEDULAS.mkdir(parents=True, exist_ok=True)
+
+    # FFmpeg e a chave do Whisper são resolvidos aqui (podem pedir a chave no
+    # terminal), e só se algum áudio precisar ser transcrito
+    estado = EstadoOrquestrador(ESTADO_PATH)
+    if any(audio and not transcricao_atual(estado, episodio, audio) for episodio, audio in episodios.items()):
+        try:
+            transcritor.runtime.ffmpeg_path
+            transcritor.runtime.client
+        except RuntimeError as e:
+            print(f"❌ {e}. Encerrando.")
+            return
+
+    orquestrador = Orquestrador(supabase)
+    resultados = orquestrador.executar(episodios)
+
+    print("\n" + "=" * 60)
+    print("📊 RESUMO DO ORQUESTRADOR")
+    print("=" * 60)
+    imprimir_tabela(resultados)
+    completos = sum(1 for etapas in resultados.values() if etapas.get("vetores", "").startswith(("✅", "⏭️")))
+    print(f"\n   ✅ Episódios com vetores em dia: {completos}/{len(resultados)}")
+    print("=" * 60)
+
+
+# ============================================================================
+# EXECUÇÃO
+# ============================================================================
+
+if __name__ == "__main__":
+    main()
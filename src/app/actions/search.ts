@@ -3,11 +3,37 @@
 import { createServerClient } from "@/lib/supabase-server";
 import OpenAI from "openai";
 import { SchoolEntry } from "@/components/dashboard/dashboard-client";
+import { TtlLruCache, normalizeQuery } from "@/lib/query-cache";
 
 const openai = new OpenAI({
     apiKey: process.env.OPENAI_API_KEY,
 });
 
+const EMBEDDING_MODEL = "text-embedding-3-small";
+const MATCH_THRESHOLD = 0.1;
+const MATCH_COUNT = 30; // Vários trechos podem ser do mesmo documento
+
+// Cache em dois níveis: pergunta → embedding (não muda com o acervo) e
+// (pergunta, limiar, quantidade) → trechos encontrados (descartado quando a
+// ingestão incrementa corpus_versao; conferido no máximo a cada 15s).
+const embeddingCache = new TtlLruCache<number[]>(2048, 24 * 60 * 60 * 1000);
+const matchCache = new TtlLruCache<any[]>(4096, 10 * 60 * 1000);
+const CORPUS_VERSION_CHECK_MS = 15 * 1000;
+let corpusVersion: number | null = null;
+let corpusVersionCheckedAt = 0;
+
+async function syncCorpusVersion(supabase: Awaited<ReturnType<typeof createServerClient>>) {
+    if (Date.now() - corpusVersionCheckedAt < CORPUS_VERSION_CHECK_MS) return;
+    corpusVersionCheckedAt = Date.now();
+
+    const { data, error } = await supabase.from("corpus_versao").select("versao").eq("id", 1).maybeSingle();
+    if (error || !data) return; // Sem a tabela: fica só o TTL
+    if (data.versao !== corpusVersion) {
+        if (corpusVersion !== null) matchCache.clear();
+        corpusVersion = data.versao;
+    }
+}
+
 export async function searchSchools(query: string): Promise<SchoolEntry[]> {
     if (!query.trim()) return [];
 
@@ -16,26 +42,42 @@ export async function searchSchools(query: string): Promise<SchoolEntry[]> {
     const supabase = await createServerClient();
 
     try {
-        // 1. Gerar Embedding
-        const embeddingResponse = await openai.embeddings.create({
-            model: "text-embedding-3-small", // IMPORTANTE: Verifique se o banco usa este modelo ou o ada-002
-            input: query,
-            encoding_format: "float",
-        });
+        await syncCorpusVersion(supabase);
 
-        const queryEmbedding = embeddingResponse.data[0].embedding;
-        console.log("📊 Embedding gerado com", queryEmbedding.length, "dimensões");
+        const queryKey = normalizeQuery(query);
+        const matchKey = JSON.stringify([queryKey, MATCH_THRESHOLD, MATCH_COUNT]);
+        let documents = matchCache.get(matchKey);
 
-        // 2. Chamar RPC - Threshold reduzido drasticamente para teste
-        const { data: documents, error } = await supabase.rpc("match_documents", {
-            query_embedding: queryEmbedding,
-            match_threshold: 0.1, // BAIXAMOS DE 0.5 PARA 0.1
-            match_count: 10,
-        });
+        if (!documents) {
+            // 1. Gerar Embedding
+            let queryEmbedding = embeddingCache.get(`${EMBEDDING_MODEL}:${queryKey}`);
+            if (!queryEmbedding) {
+                const embeddingResponse = await openai.embeddings.create({
+                    model: EMBEDDING_MODEL, // IMPORTANTE: Verifique se o banco usa este modelo ou o ada-002
+                    input: query,
+                    encoding_format: "float",
+                });
+                queryEmbedding = embeddingResponse.data[0].embedding;
+                embeddingCache.set(`${EMBEDDING_MODEL}:${queryKey}`, queryEmbedding);
+                console.log("📊 Embedding gerado com", queryEmbedding.length, "dimensões");
+            }
+
+            // 2. Chamar RPC - Threshold reduzido drasticamente para teste
+            const { data, error } = await supabase.rpc("match_documents", {
+                query_embedding: queryEmbedding,
+                match_threshold: MATCH_THRESHOLD, // BAIXAMOS DE 0.5 PARA 0.1
+                match_count: MATCH_COUNT,
+            });
 
-        if (error) {
-            console.error("❌ Erro RPC Supabase:", error); // Verifique este log no terminal
-            throw new Error(error.message);
+            if (error) {
+                console.error("❌ Erro RPC Supabase:", error); // Verifique este log no terminal
+                throw new Error(error.message);
+            }
+
+            documents = data ?? [];
+            matchCache.set(matchKey, documents);
+        } else {
+            console.log("⚡ Resultado em cache");
         }
 
         console.log(`✅ Encontrados ${documents?.length || 0} documentos.`);
@@ -44,8 +86,17 @@ export async function searchSchools(query: string): Promise<SchoolEntry[]> {
             return [];
         }
 
-        // 3. Transformar dados
-        const results: SchoolEntry[] = documents.map((doc: any, index: number) => {
+        // 3. Um resultado por documento (o trecho mais similar vem primeiro)
+        const seen = new Set<string>();
+        const uniqueDocuments = documents.filter((doc: any) => {
+            const key = doc.metadata?.titulo ?? String(doc.id);
+            if (seen.has(key)) return false;
+            seen.add(key);
+            return true;
+        }).slice(0, 10);
+
+        // 4. Transformar dados
+        const results: SchoolEntry[] = uniqueDocuments.map((doc: any, index: number) => {
             const meta = doc.metadata;
             const titleParts = meta.titulo?.split("-") || [meta.titulo];
             const schoolName = titleParts[0]?.trim();
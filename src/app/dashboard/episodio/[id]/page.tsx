@@ -2,6 +2,7 @@ import { createServerClient } from "@/lib/supabase-server";
 import { ArrowLeft, MapPin, Calendar, CheckCircle2, PlayCircle, BookOpen } from "lucide-react";
 import Link from "next/link";
 import { notFound } from "next/navigation";
+import { mergeChunkContents } from "@/lib/utils";
 
 // Tipagem dos Metadados
 interface DocumentMetadata {
@@ -12,6 +13,8 @@ interface DocumentMetadata {
     competencias_bncc?: string[];
     temporada?: number;
     episodio?: number;
+    chunk_index?: number;
+    total_chunks?: number;
 }
 
 export default async function EpisodeDetailsPage({ params }: { params: { id: string } }) {
@@ -31,6 +34,20 @@ export default async function EpisodeDetailsPage({ params }: { params: { id: str
 
     const meta = doc.metadata as DocumentMetadata;
 
+    // Documentos divididos em trechos: junta todos para exibir o resumo completo
+    let content: string = doc.content;
+    if ((meta.total_chunks ?? 1) > 1) {
+        const { data: chunks } = await supabase
+            .from("documents")
+            .select("content, metadata")
+            .eq("metadata->>titulo", meta.titulo)
+            .order("metadata->chunk_index");
+
+        if (chunks?.length) {
+            content = mergeChunkContents(chunks.map((chunk) => chunk.content as string));
+        }
+    }
+
     // Processamento de Dados
     const titleParts = meta.titulo?.split("-") || [meta.titulo];
     const schoolName = titleParts[0]?.trim();
@@ -95,7 +112,7 @@ export default async function EpisodeDetailsPage({ params }: { params: { id: str
                             <div className="prose dark:prose-invert max-w-none text-neutral-600 dark:text-neutral-300 leading-relaxed space-y-4">
                                 {/* Exibimos o content (resumo) que veio do banco */}
                                 <p className="whitespace-pre-line">
-                                    {doc.content}
+                                    {content}
                                 </p>
                             </div>
                         </div>
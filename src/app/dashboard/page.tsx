@@ -15,6 +15,8 @@ export default async function DashboardPage() {
     const { data: documents, error } = await supabase
         .from("documents")
         .select("id, metadata")
+        // Um card por documento: só o primeiro trecho (ou linhas antigas, sem trechos)
+        .or("metadata->>chunk_index.is.null,metadata->>chunk_index.eq.0")
         .limit(100);
 
     if (error) {
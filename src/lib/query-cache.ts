@@ -0,0 +1,40 @@
+// Cache em memória com descarte LRU e expiração por TTL.
+// Map preserva a ordem de inserção: o primeiro item é o usado há mais tempo.
+export class TtlLruCache<V> {
+  private items = new Map<string, { value: V; expiresAt: number }>()
+
+  constructor(private capacity: number, private ttlMs: number) {}
+
+  get(key: string): V | undefined {
+    const item = this.items.get(key)
+    if (!item) return undefined
+    this.items.delete(key)
+    if (item.expiresAt < Date.now()) return undefined
+    this.items.set(key, item)
+    return item.value
+  }
+
+  set(key: string, value: V): void {
+    this.items.delete(key)
+    this.items.set(key, { value, expiresAt: Date.now() + this.ttlMs })
+    while (this.items.size > this.capacity) {
+      this.items.delete(this.items.keys().next().value as string)
+    }
+  }
+
+  clear(): void {
+    this.items.clear()
+  }
+}
+
+// Mesma pergunta com outra caixa, espaços ou pontuação final → mesma chave
+// (igual a normalizar_consulta em cache_consultas.py).
+export function normalizeQuery(query: string): string {
+  return query
+    .normalize("NFC")
+    .toLowerCase()
+    .split(/\s+/)
+    .filter(Boolean)
+    .join(" ")
+    .replace(/[\s?!.,;:]+$/, "")
+}
@@ -4,3 +4,27 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs: ClassValue[]) {
   return twMerge(clsx(inputs))
 }
+
+// Reconstrói o pageContent a partir dos trechos (ordenados por chunk_index).
+// Cada trecho começa repetindo o final do anterior (sobreposição da ingestão:
+// parágrafos inteiros e/ou as últimas frases de um parágrafo), que é
+// removido na junção.
+export function mergeChunkContents(chunks: string[]): string {
+  const paragraphs: string[] = []
+  for (const chunk of chunks) {
+    const next = chunk.split(/\n\s*\n/).map((p) => p.trim()).filter(Boolean)
+    const merged = paragraphs.join("\n\n")
+    let overlap = Math.min(paragraphs.length, next.length)
+    while (overlap > 0 && !endsAtWordBoundary(merged, next.slice(0, overlap).join("\n\n"))) {
+      overlap--
+    }
+    paragraphs.push(...next.slice(overlap))
+  }
+  return paragraphs.join("\n\n")
+}
+
+function endsAtWordBoundary(text: string, suffix: string): boolean {
+  if (!text.endsWith(suffix)) return false
+  const start = text.length - suffix.length
+  return start === 0 || /\s/.test(text[start - 1])
+}
@@ -0,0 +1,33 @@
+-- ============================================================================
+-- Chave de idempotência da tabela documents: content_hash
+-- ============================================================================
+-- A ingestão (ingestao_rag.py) grava os documentos em upserts de vários
+-- registros com on_conflict=content_hash. Reingerir o catálogo atualiza as
+-- linhas existentes em vez de duplicá-las.
+--
+-- content_hash = SHA-256 de titulo || chr(31) || chunk_index || chr(31) || content
+-- (calcular_hash_conteudo): a identidade do trecho entra na chave, então um
+-- mesmo texto em duas Cédulas ocupa duas linhas e a remoção dos trechos
+-- obsoletos de um documento não apaga as linhas de outro.
+-- ============================================================================
+
+ALTER TABLE documents
+    ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- Preenche as linhas já existentes (mesmo hash calculado em Python)
+UPDATE documents
+SET content_hash = encode(sha256(convert_to(concat_ws(chr(31),
+        coalesce(metadata->>'titulo', ''),
+        coalesce(metadata->>'chunk_index', ''),
+        content), 'UTF8')), 'hex')
+WHERE content_hash IS NULL;
+
+-- Remove duplicatas antigas antes do índice único (mantém o menor id)
+DELETE FROM documents d
+USING documents outro
+WHERE d.content_hash = outro.content_hash
+  AND d.id > outro.id;
+
+-- Índice único (não parcial) exigido pelo ON CONFLICT do upsert
+CREATE UNIQUE INDEX IF NOT EXISTS documents_content_hash_key
+    ON documents (content_hash);
@@ -0,0 +1,36 @@
+-- Versão do acervo RAG: incrementada pela ingestão (ingestao_rag.py) sempre
+-- que grava documentos. O app usa para invalidar o cache de resultados da busca.
+CREATE TABLE IF NOT EXISTS corpus_versao (
+    id INT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    versao BIGINT NOT NULL DEFAULT 0,
+    atualizado_em TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO corpus_versao (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION incrementar_versao_corpus()
+RETURNS BIGINT
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    UPDATE corpus_versao
+    SET versao = versao + 1, atualizado_em = NOW()
+    WHERE id = 1
+    RETURNING versao;
+$$;
+
+-- SECURITY DEFINER ignora a RLS: só a ingestão (service_role) pode incrementar.
+-- Funções novas são executáveis por PUBLIC por padrão.
+REVOKE EXECUTE ON FUNCTION incrementar_versao_corpus() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION incrementar_versao_corpus() TO service_role;
+
+-- RLS (Segurança): leitura pública, escrita só pela função acima
+ALTER TABLE corpus_versao ENABLE ROW LEVEL SECURITY;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_policies WHERE policyname = 'Public Read' AND tablename = 'corpus_versao') THEN
+        CREATE POLICY "Public Read" ON corpus_versao FOR SELECT USING (true);
+    END IF;
+END $$;
@@ -0,0 +1,13 @@
+-- ============================================================================
+-- Índice de título na tabela documents
+-- ============================================================================
+-- verificar_documento_existe (ingestao_rag.py) procura um documento pelo
+-- título com .eq("metadata->>titulo", titulo).limit(1), ou seja,
+-- WHERE metadata->>'titulo' = $1 LIMIT 1. Sem este índice de expressão a
+-- consulta varria o JSONB da tabela inteira; com ele é uma busca no índice.
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS documents_titulo_idx
+    ON documents ((metadata->>'titulo'));
+
+ANALYZE documents;
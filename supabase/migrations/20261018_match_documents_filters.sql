@@ -0,0 +1,106 @@
+-- ============================================================================
+-- Busca vetorial com filtros de metadata: índices + match_documents
+-- ============================================================================
+-- Até aqui match_documents ignorava o argumento `filter` e calculava `<=>`
+-- em todas as linhas antes de aplicar o limiar. Esta migração:
+-- 1. Indexa as facetas de metadata usadas nos filtros (GIN + expressões)
+-- 2. Cria um índice HNSW em embedding (distância de cosseno)
+-- 3. Recria match_documents aplicando `metadata @> filter`
+--
+-- Filtros suportados (qualquer combinação, semântica de `@>` do jsonb):
+--   {"temporada": 1}
+--   {"pilar_inovacao": "Autonomia do Aluno"}
+--   {"gatilhos_comportamentais": ["bullying"]}
+--   {"gatilhos_conteudo": ["Física"]}
+--   {"competencias_bncc": ["Competência 5 - Cultura Digital"]}
+-- ============================================================================
+
+-- Contenção (@>) em qualquer faceta, inclusive itens das listas
+CREATE INDEX IF NOT EXISTS documents_metadata_gin_idx
+    ON documents USING gin (metadata jsonb_path_ops);
+
+-- Igualdade/intervalo nas facetas escalares (consultas do painel e relatórios)
+CREATE INDEX IF NOT EXISTS documents_temporada_idx
+    ON documents (((metadata->>'temporada')::int));
+
+CREATE INDEX IF NOT EXISTS documents_pilar_inovacao_idx
+    ON documents ((metadata->>'pilar_inovacao'));
+
+-- Vizinhos aproximados por cosseno (pgvector >= 0.5)
+CREATE INDEX IF NOT EXISTS documents_embedding_hnsw_idx
+    ON documents USING hnsw (embedding vector_cosine_ops)
+    WITH (m = 16, ef_construction = 64);
+
+ANALYZE documents;
+
+-- ----------------------------------------------------------------------------
+-- match_documents com filtro
+-- ----------------------------------------------------------------------------
+-- Sem filtro, a ordenação por `embedding <=> query_embedding` com LIMIT usa
+-- o índice HNSW. Com filtro, a busca é exata sobre as linhas que passam em
+-- `metadata @> filter` (o índice GIN pode localizá-las): no HNSW o filtro
+-- seria aplicado depois da varredura, sobre só hnsw.ef_search candidatos
+-- (40 por padrão), e um filtro seletivo devolveria menos resultados que
+-- match_count. O limiar é aplicado sem calcular `<=>` duas vezes por linha.
+-- ----------------------------------------------------------------------------
+create or replace function match_documents (
+  query_embedding vector(1536),
+  match_threshold float,
+  match_count int,
+  filter jsonb DEFAULT '{}'
+) returns table (
+  id bigint,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+language plpgsql stable
+as $$
+#variable_conflict use_column
+begin
+  if coalesce(filter, '{}'::jsonb) = '{}'::jsonb then
+    -- Sem filtro: top-k pelo índice HNSW
+    return query
+    select
+      vizinhos.id,
+      vizinhos.content,
+      vizinhos.metadata,
+      1 - vizinhos.distancia as similarity
+    from (
+      select
+        documents.id,
+        documents.content,
+        documents.metadata,
+        documents.embedding <=> query_embedding as distancia
+      from documents
+      order by documents.embedding <=> query_embedding
+      limit match_count
+    ) as vizinhos
+    where 1 - vizinhos.distancia > match_threshold
+    order by vizinhos.distancia;
+  else
+    -- Com filtro: busca exata nas linhas que passam no filtro. O HNSW
+    -- filtraria só os hnsw.ef_search candidatos do índice e poderia
+    -- devolver menos que match_count linhas (ou nenhuma).
+    return query
+    with filtrados as materialized (
+      select
+        documents.id,
+        documents.content,
+        documents.metadata,
+        documents.embedding <=> query_embedding as distancia
+      from documents
+      where documents.metadata @> filter
+    )
+    select
+      filtrados.id,
+      filtrados.content,
+      filtrados.metadata,
+      1 - filtrados.distancia as similarity
+    from filtrados
+    where 1 - filtrados.distancia > match_threshold
+    order by filtrados.distancia
+    limit match_count;
+  end if;
+end;
+$$;
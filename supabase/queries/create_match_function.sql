@@ -1,13 +1,16 @@
 -- ============================================================================
 -- Função de Busca Vetorial: match_documents
 -- ============================================================================
--- Descrição: Busca documentos por similaridade de cosseno usando embeddings
+-- Descrição: Busca documentos por similaridade de cosseno usando embeddings,
+--            com filtro opcional de metadata (`metadata @> filter`)
 -- Modelo: text-embedding-3-small (1536 dimensões)
 -- Uso: SELECT * FROM match_documents(query_embedding, 0.7, 10);
+--      SELECT * FROM match_documents(query_embedding, 0.7, 10, '{"temporada": 1}');
+-- Índices: supabase/migrations/20261018_match_documents_filters.sql
 -- ============================================================================
 
 create or replace function match_documents (
-  query_embedding vector(1536), -- Assumindo modelo text-embedding-3-small ou ada-002
+  query_embedding vector(1536),
   match_threshold float,
   match_count int,
   filter jsonb DEFAULT '{}'
@@ -17,19 +20,53 @@ create or replace function match_documents (
   metadata jsonb,
   similarity float
 )
-language plpgsql
+language plpgsql stable
 as $$
+#variable_conflict use_column
 begin
-  return query
-  select
-    documents.id,
-    documents.content,
-    documents.metadata,
-    1 - (documents.embedding <=> query_embedding) as similarity
-  from documents
-  where 1 - (documents.embedding <=> query_embedding) > match_threshold
-  -- Lógica simples para aplicar filtros se existirem (opcional por enquanto)
-  order by documents.embedding <=> query_embedding
-  limit match_count;
+  if coalesce(filter, '{}'::jsonb) = '{}'::jsonb then
+    -- Sem filtro: top-k pelo índice HNSW
+    return query
+    select
+      vizinhos.id,
+      vizinhos.content,
+      vizinhos.metadata,
+      1 - vizinhos.distancia as similarity
+    from (
+      select
+        documents.id,
+        documents.content,
+        documents.metadata,
+        documents.embedding <=> query_embedding as distancia
+      from documents
+      order by documents.embedding <=> query_embedding
+      limit match_count
+    ) as vizinhos
+    where 1 - vizinhos.distancia > match_threshold
+    order by vizinhos.distancia;
+  else
+    -- Com filtro: busca exata nas linhas que passam no filtro. O HNSW
+    -- filtraria só os hnsw.ef_search candidatos do índice e poderia
+    -- devolver menos que match_count linhas (ou nenhuma).
+    return query
+    with filtrados as materialized (
+      select
+        documents.id,
+        documents.content,
+        documents.metadata,
+        documents.embedding <=> query_embedding as distancia
+      from documents
+      where documents.metadata @> filter
+    )
+    select
+      filtrados.id,
+      filtrados.content,
+      filtrados.metadata,
+      1 - filtrados.distancia as similarity
+    from filtrados
+    where 1 - filtrados.distancia > match_threshold
+    order by filtrados.distancia
+    limit match_count;
+  end if;
 end;
 $$;
@@ -9,19 +9,27 @@ Data: 2026-01-20
 
 import os
 import sys
+import argparse
 import shutil
-import tempfile
+import hashlib
+import json
+import threading
 import subprocess
 import math
+import time
+import queue
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 # ============================================================
 # 1. SETUP DO STATIC-FFMPEG
 # ============================================================
-def setup_ffmpeg() -> Optional[str]:
+def setup_ffmpeg() -> Tuple[Optional[str], Optional[str]]:
     """
-    Configura o static-ffmpeg e retorna o caminho do executável.
+    Configura o static-ffmpeg e retorna os caminhos do ffmpeg e do ffprobe.
     """
     try:
         import static_ffmpeg
@@ -35,40 +43,309 @@ def setup_ffmpeg() -> Optional[str]:
         print(f"❌ Erro ao configurar FFmpeg: {e}")
         return None, None
 
-FFMPEG_PATH, FFPROBE_PATH = setup_ffmpeg()
-if not FFMPEG_PATH:
-    sys.exit(1)
-
 # ============================================================
 # 2. CONFIGURAÇÃO DA API OPENAI
 # ============================================================
-from openai import OpenAI
+def create_openai_client():
+    """
+    Cria o cliente OpenAI (com limite de taxa e retentativas, ver cliente_openai.py),
+    pedindo a chave no terminal se não estiver no ambiente.
+    """
+    from cliente_openai import criar_cliente_openai
+    
+    api_key = os.getenv("OPENAI_API_KEY")
+    
+    if not api_key:
+        print("=" * 60)
+        print("⚠️  OPENAI_API_KEY não encontrada nas variáveis de ambiente.")
+        print("=" * 60)
+        print("\nCole sua chave abaixo:")
+        api_key = input("API Key: ").strip()
+        
+        if not api_key:
+            raise RuntimeError("Nenhuma chave da OpenAI fornecida")
+    
+    return criar_cliente_openai(api_key)
 
-API_KEY = os.getenv("OPENAI_API_KEY")
 
-if not API_KEY:
-    print("=" * 60)
-    print("⚠️  OPENAI_API_KEY não encontrada nas variáveis de ambiente.")
-    print("=" * 60)
-    print("\nCole sua chave abaixo:")
-    API_KEY = input("API Key: ").strip()
-    
-    if not API_KEY:
-        print("❌ Nenhuma chave fornecida. Encerrando.")
-        sys.exit(1)
+class Runtime:
+    """
+    Dependências pesadas resolvidas na primeira utilização e reaproveitadas:
+    binários do FFmpeg (pode haver download), cliente OpenAI (pode pedir a chave)
+    e NumPy. Importar o módulo, `--help` e `--dry-run` não tocam em nenhuma delas.
+    """
 
-client = OpenAI(api_key=API_KEY)
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Lock próprio: create_openai_client pode esperar a chave no input()
+        # sem travar as threads que só precisam do FFmpeg ou do NumPy
+        self._client_lock = threading.Lock()
+        self._ffmpeg_paths: Optional[Tuple[str, str]] = None
+        self._client = None
+        self._numpy = None
+        self._numpy_checked = False
+
+    def _resolve_ffmpeg(self) -> Tuple[str, str]:
+        with self._lock:
+            if self._ffmpeg_paths is None:
+                ffmpeg_path, ffprobe_path = setup_ffmpeg()
+                if not ffmpeg_path:
+                    raise RuntimeError("FFmpeg indisponível")
+                self._ffmpeg_paths = (ffmpeg_path, ffprobe_path)
+            return self._ffmpeg_paths
+
+    @property
+    def ffmpeg_path(self) -> str:
+        return self._resolve_ffmpeg()[0]
+
+    @property
+    def ffprobe_path(self) -> str:
+        return self._resolve_ffmpeg()[1]
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                self._client = create_openai_client()
+            return self._client
+
+    @property
+    def numpy(self):
+        """Módulo NumPy, ou None se não estiver instalado (análise de silêncio desativada)."""
+        with self._lock:
+            if not self._numpy_checked:
+                try:
+                    import numpy
+                    self._numpy = numpy
+                except ImportError:
+                    self._numpy = None
+                self._numpy_checked = True
+            return self._numpy
+
+
+runtime = Runtime()
 
 # ============================================================
 # 3. CONFIGURAÇÕES DO SCRIPT
 # ============================================================
-VIDEOS_FOLDER = Path("./Videos")
-OUTPUT_FOLDER = Path("./Videos/transcricoes")
+DATA_ROOT = Path(os.getenv("PIPELINE_RAIZ_DADOS", "."))  # Raiz de Videos/ e .cache/ (benchmarks usam uma cópia)
+VIDEOS_FOLDER = DATA_ROOT / "Videos"
+OUTPUT_FOLDER = DATA_ROOT / "Videos" / "transcricoes"
 CHUNK_DURATION_SECONDS = 600  # 10 minutos
+CHUNK_BITRATE_KBPS = 128
+SILENCE_TOLERANCE_SECONDS = 45  # Janela (±) para mover cada corte até um silêncio
+MAX_UPLOAD_BYTES = 25 * 1024 * 1024  # Limite de upload da API Whisper
+ANALYSIS_SAMPLE_RATE = 16000
+ENERGY_FRAME_SECONDS = 0.05  # Resolução da análise de energia (50 ms)
+MAX_CONCURRENT_TRANSCRIPTIONS = int(os.getenv("MAX_CONCURRENT_TRANSCRIPTIONS", "4"))  # Chamadas simultâneas à API
+FFMPEG_WORKERS = int(os.getenv("FFMPEG_WORKERS", str(min(4, os.cpu_count() or 1))))  # Arquivos no FFmpeg ao mesmo tempo
 SUPPORTED_EXTENSIONS = [".mp3", ".wav", ".m4a", ".ogg", ".flac"]
+WHISPER_MODEL = "whisper-1"
+TRANSCRIPTION_LANGUAGE = "pt"
+CACHE_FOLDER = DATA_ROOT / ".cache" / "transcricoes"
+CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPTION_CACHE_MAX_MB", "100")) * 1024 * 1024
+CACHE_DISABLED = os.getenv("PIPELINE_SEM_CACHE", "") == "1"  # Todo chunk vai à API (benchmarks)
+WORK_FOLDER = DATA_ROOT / ".cache" / "trabalho"  # Chunks e manifestos persistentes (retomada)
+
+# ============================================================
+# 4. CACHE DE TRANSCRIÇÕES
+# ============================================================
+
+class TranscriptionCache:
+    """
+    Cache em disco das transcrições, endereçado pelo conteúdo do chunk.
+
+    A chave é o SHA-256 dos bytes do chunk normalizado (MP3 16 kHz mono)
+    somado ao modelo e ao idioma, então reexecuções só pagam pelos chunks novos.
+    Quando o total passa de `max_bytes`, as entradas menos usadas (mtime mais
+    antigo, atualizado a cada acerto) são removidas.
+    """
+
+    def __init__(self, folder: Path, max_bytes: int):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(chunk_path: Path, model: str, language: str) -> str:
+        digest = hashlib.sha256()
+        with open(chunk_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        digest.update(f"|{model}|{language}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path_for(self, key: str) -> Path:
+        return self.folder / key[:2] / f"{key}.txt"
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path_for(key)
+        try:
+            text = path.read_text(encoding="utf-8")
+            os.utime(path)  # Marca como usado recentemente (LRU)
+            return text
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, text: str) -> None:
+        path = self._path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(text, encoding="utf-8")
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            for path in self.folder.glob("*/*.txt"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+
+
+transcription_cache = TranscriptionCache(CACHE_FOLDER, CACHE_MAX_BYTES)
 
 # ============================================================
-# 4. FUNÇÕES DE ÁUDIO (SEM PYDUB)
+# 5. MANIFESTO DE TAREFAS (RETOMADA)
+# ============================================================
+
+class JobManifest:
+    """
+    Manifesto persistente do processamento de um arquivo de origem.
+
+    Guarda o estado do arquivo (pending → split → transcribed | failed → written)
+    e de cada chunk (split → transcribed | failed), junto com o texto já pago.
+    É regravado de forma atômica a cada mudança: uma queda no meio do lote
+    perde no máximo os chunks que estavam em voo.
+    """
+
+    def __init__(self, audio_path: Path, work_folder: Path):
+        self.audio_path = audio_path
+        self.work_dir = JobManifest.work_dir_for(audio_path, work_folder)
+        self.path = self.work_dir / "manifest.json"
+        self._lock = threading.RLock()
+        self.data = self._load()
+
+    def _source_fingerprint(self) -> dict:
+        stat = self.audio_path.stat()
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    def _load(self) -> dict:
+        fingerprint = self._source_fingerprint()
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("source") == fingerprint:
+                return data
+            print("  ♻️  Arquivo de origem mudou: descartando progresso anterior")
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError:
+            print("  ⚠️ Manifesto corrompido: recomeçando este arquivo")
+        
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+        return {"file": self.audio_path.name, "source": fingerprint, "status": "pending", "chunks": []}
+
+    @staticmethod
+    def work_dir_for(audio_path: Path, work_folder: Path) -> Path:
+        """Pasta de trabalho do arquivo, pelo nome com extensão (ep.mp3 e ep.wav não colidem)."""
+        return work_folder / audio_path.name
+
+    @staticmethod
+    def peek_status(audio_path: Path, work_folder: Path) -> str:
+        """Estado registrado para o arquivo, sem criar nem alterar nada no disco."""
+        try:
+            data = json.loads((JobManifest.work_dir_for(audio_path, work_folder) / "manifest.json").read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return "pending"
+        stat = audio_path.stat()
+        if data.get("source") != {"size": stat.st_size, "mtime": stat.st_mtime}:
+            return "changed"
+        return data.get("status", "pending")
+
+    def save(self) -> None:
+        with self._lock:
+            self.work_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+
+    @property
+    def status(self) -> str:
+        return self.data["status"]
+
+    def set_status(self, status: str) -> None:
+        with self._lock:
+            self.data["status"] = status
+            self.save()
+
+    def has_chunks(self) -> bool:
+        """True se a divisão terminou e os chunks ainda pendentes continuam no disco."""
+        chunks = self.data["chunks"]
+        if self.status == "pending" or not chunks:
+            return False
+        return all(
+            (self.work_dir / c["file"]).exists()
+            for c in chunks if c["status"] != "transcribed"
+        )
+
+    def start_split(self) -> None:
+        """Descarta uma divisão incompleta (os textos já pagos continuam no cache)."""
+        with self._lock:
+            self.data["chunks"] = []
+            self.data["status"] = "pending"
+            self.work_dir.mkdir(parents=True, exist_ok=True)
+            self.discard_audio()
+            self.save()
+
+    def add_chunk(self, chunk_path: Path) -> int:
+        """Registra um chunk recém-gravado pelo FFmpeg e devolve o seu índice."""
+        with self._lock:
+            self.data["chunks"].append(
+                {"file": chunk_path.name, "status": "split", "text": None, "latency": None}
+            )
+            self.save()
+            return len(self.data["chunks"]) - 1
+
+    def finish_split(self) -> None:
+        self.set_status("split")
+
+    def pending_chunks(self) -> List[Tuple[int, Path]]:
+        return [
+            (i, self.work_dir / c["file"])
+            for i, c in enumerate(self.data["chunks"]) if c["status"] != "transcribed"
+        ]
+
+    def record_chunk(self, index: int, text: Optional[str], latency: float) -> None:
+        with self._lock:
+            chunk = self.data["chunks"][index]
+            chunk["status"] = "transcribed" if text else "failed"
+            chunk["text"] = text.strip() if text else None
+            chunk["latency"] = round(latency, 2)
+            self.save()
+
+    def count(self, status: str) -> int:
+        return sum(1 for c in self.data["chunks"] if c["status"] == status)
+
+    def texts(self) -> List[str]:
+        return [c["text"] for c in self.data["chunks"]]
+
+    def discard_audio(self) -> None:
+        """Remove os chunks de áudio; o manifesto fica para as próximas execuções."""
+        for chunk in self.work_dir.glob("chunk_*.mp3"):
+            chunk.unlink(missing_ok=True)
+
+# ============================================================
+# 6. FUNÇÕES DE ÁUDIO (SEM PYDUB)
 # ============================================================
 
 def get_audio_duration(audio_path: Path) -> float:
@@ -76,7 +353,7 @@ def get_audio_duration(audio_path: Path) -> float:
     Obtém a duração do áudio em segundos usando ffprobe.
     """
     cmd = [
-        FFPROBE_PATH,
+        runtime.ffprobe_path,
         "-v", "error",
         "-show_entries", "format=duration",
         "-of", "default=noprint_wrappers=1:nokey=1",
@@ -110,13 +387,13 @@ def split_audio_ffmpeg(audio_path: Path, chunk_duration_sec: int, temp_dir: Path
         chunk_filename = temp_dir / f"chunk_{i:03d}.mp3"
         
         cmd = [
-            FFMPEG_PATH,
+            runtime.ffmpeg_path,
             "-y",  # Sobrescrever sem perguntar
             "-i", str(audio_path),
             "-ss", str(start_time),
             "-t", str(chunk_duration_sec),
             "-acodec", "libmp3lame",
-            "-ab", "128k",
+            "-ab", f"{CHUNK_BITRATE_KBPS}k",
             "-ar", "16000",  # 16kHz é ideal para Whisper
             "-ac", "1",  # Mono
             str(chunk_filename)
@@ -133,6 +410,284 @@ def split_audio_ffmpeg(audio_path: Path, chunk_duration_sec: int, temp_dir: Path
     return chunks
 
 
+def stream_audio_segments(
+    audio_path: Path,
+    chunk_duration_sec: int,
+    temp_dir: Path,
+    cut_points: Optional[List[float]] = None
+) -> Iterator[Path]:
+    """
+    Divide um arquivo de áudio em chunks com uma única execução do FFmpeg,
+    entregando cada chunk assim que ele é fechado.
+
+    Usa o segment muxer: o áudio é decodificado e reencodado uma vez só
+    (custo linear na duração) e cada segmento concluído é anunciado em
+    `-segment_list pipe:1`. Se `cut_points` for informado, corta nesses
+    instantes (em segundos) em vez de intervalos fixos de `chunk_duration_sec`.
+    Lança RuntimeError se o FFmpeg terminar com erro.
+    """
+    cmd = [
+        runtime.ffmpeg_path,
+        "-y",
+        "-i", str(audio_path),
+        "-vn",  # Ignorar capa/vídeo embutido
+        "-acodec", "libmp3lame",
+        "-ab", f"{CHUNK_BITRATE_KBPS}k",
+        "-ar", "16000",  # 16kHz é ideal para Whisper
+        "-ac", "1",  # Mono
+        "-f", "segment",
+    ]
+    
+    if cut_points is None:
+        cmd += ["-segment_time", str(chunk_duration_sec)]
+    elif cut_points:
+        cmd += ["-segment_times", ",".join(f"{t:.3f}" for t in cut_points)]
+    else:
+        cmd += ["-segment_time", str(10 ** 7)]  # Nenhum corte planejado: chunk único
+    
+    cmd += [
+        "-segment_list", "pipe:1",
+        "-segment_list_type", "flat",
+        "-reset_timestamps", "1",
+        str(temp_dir / "chunk_%03d.mp3")
+    ]
+    
+    # stderr vai para arquivo: um pipe cheio travaria o FFmpeg enquanto lemos o stdout
+    with tempfile.TemporaryFile(mode="w+") as stderr_file:
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file, text=True) as proc:
+            for line in proc.stdout:
+                name = line.strip()
+                if name:
+                    yield temp_dir / name
+        
+        if proc.returncode != 0:
+            stderr_file.seek(0)
+            raise RuntimeError(stderr_file.read()[-200:] or "desconhecido")
+
+
+def segment_audio_single_pass(
+    audio_path: Path,
+    chunk_duration_sec: int,
+    temp_dir: Path,
+    cut_points: Optional[List[float]] = None
+) -> List[Path]:
+    """
+    Versão em lista de `stream_audio_segments`: espera todos os chunks.
+    Retorna lista vazia (sem chunks parciais no disco) em caso de erro.
+    """
+    print(f"  📂 Segmentando áudio: {audio_path.name}")
+    
+    try:
+        chunks = list(stream_audio_segments(audio_path, chunk_duration_sec, temp_dir, cut_points))
+    except RuntimeError as e:
+        print(f"  ⚠️ Erro na segmentação: {e}")
+        for partial in temp_dir.glob("chunk_*.mp3"):
+            partial.unlink()
+        return []
+    
+    print(f"  ✂️  Dividido em {len(chunks)} chunk(s)")
+    return chunks
+
+
+def max_chunk_seconds_for_upload() -> float:
+    """
+    Duração máxima de um chunk que ainda cabe no limite de upload da API
+    (com 5% de margem para cabeçalhos e variação do encoder).
+    """
+    return MAX_UPLOAD_BYTES * 8 / (CHUNK_BITRATE_KBPS * 1000) * 0.95
+
+
+def compute_energy_profile(audio_path: Path) -> Optional["np.ndarray"]:
+    """
+    Decodifica o áudio uma vez (PCM 16 bits mono via FFmpeg) e calcula a energia
+    RMS em dBFS de cada janela de ENERGY_FRAME_SECONDS.
+
+    O PCM é lido em blocos direto do pipe, sem carregar o arquivo inteiro em memória.
+    """
+    np = runtime.numpy
+    frame_samples = int(ANALYSIS_SAMPLE_RATE * ENERGY_FRAME_SECONDS)
+    block_bytes = frame_samples * 2 * 1200  # ~1 minuto de áudio por leitura
+    
+    cmd = [
+        runtime.ffmpeg_path,
+        "-v", "error",
+        "-i", str(audio_path),
+        "-vn",
+        "-ac", "1",
+        "-ar", str(ANALYSIS_SAMPLE_RATE),
+        "-f", "s16le",
+        "pipe:1"
+    ]
+    
+    profile = []
+    leftover = np.empty(0, dtype=np.float32)
+    
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL) as proc:
+        while True:
+            block = proc.stdout.read(block_bytes)
+            if not block:
+                break
+            # read(n) só devolve menos que n bytes no fim do stream: um byte
+            # solto ali é uma amostra incompleta e é descartado
+            block = block[:len(block) - len(block) % 2]
+            if not block:
+                continue
+            
+            samples = np.concatenate([leftover, np.frombuffer(block, dtype="<i2").astype(np.float32)])
+            usable = len(samples) - len(samples) % frame_samples
+            leftover = samples[usable:]
+            
+            frames = samples[:usable].reshape(-1, frame_samples) / 32768.0
+            rms = np.sqrt(np.mean(frames * frames, axis=1))
+            profile.append(20 * np.log10(rms + 1e-10))
+    
+    if proc.returncode != 0 or not profile:
+        return None
+    
+    return np.concatenate(profile)
+
+
+def choose_cut_points(
+    energy_db: "np.ndarray",
+    target_sec: float,
+    tolerance_sec: float,
+    max_chunk_sec: float
+) -> List[float]:
+    """
+    Escolhe os instantes de corte: parte de cada múltiplo de `target_sec` e move
+    o corte para o trecho mais silencioso mais próximo dentro de ±`tolerance_sec`,
+    sem deixar nenhum chunk passar de `max_chunk_sec`.
+    """
+    np = runtime.numpy
+    
+    # Suaviza ~300 ms para que pausas entre palavras não virem falsos silêncios
+    smooth_frames = max(1, int(0.3 / ENERGY_FRAME_SECONDS))
+    smoothed = np.convolve(energy_db, np.ones(smooth_frames) / smooth_frames, mode="same")
+    
+    total_sec = len(smoothed) * ENERGY_FRAME_SECONDS
+    target_sec = min(target_sec, max_chunk_sec)
+    cut_points = []
+    start = 0.0
+    
+    while True:
+        remaining = total_sec - start
+        # O último trecho absorve a sobra se ainda couber na janela e no limite de upload
+        if remaining <= min(target_sec + tolerance_sec, max_chunk_sec):
+            break
+        
+        ideal = start + target_sec
+        lo = int(max(start + 1.0, ideal - tolerance_sec) / ENERGY_FRAME_SECONDS)
+        hi = int(min(ideal + tolerance_sec, start + max_chunk_sec) / ENERGY_FRAME_SECONDS)
+        window = smoothed[lo:hi]
+        
+        if len(window) == 0:
+            cut = min(ideal, start + max_chunk_sec)
+        else:
+            # Candidatos: janelas até 3 dB acima do ponto mais silencioso; fica o mais próximo do ideal
+            candidates = np.flatnonzero(window <= window.min() + 3.0) + lo
+            ideal_frame = ideal / ENERGY_FRAME_SECONDS
+            best = candidates[np.argmin(np.abs(candidates - ideal_frame))]
+            cut = (best + 0.5) * ENERGY_FRAME_SECONDS
+        
+        cut_points.append(round(float(cut), 3))
+        start = cut
+    
+    return cut_points
+
+
+def plan_chunk_boundaries(audio_path: Path, target_sec: int) -> Optional[List[float]]:
+    """
+    Planeja os cortes alinhados a silêncios. Retorna None quando a análise
+    não está disponível (sem NumPy ou falha na decodificação).
+    """
+    if runtime.numpy is None:
+        print(f"  ℹ️  [{audio_path.name}] NumPy não instalado: usando cortes em intervalos fixos")
+        return None
+    
+    energy_db = compute_energy_profile(audio_path)
+    if energy_db is None:
+        print(f"  ⚠️ [{audio_path.name}] Não foi possível analisar o áudio: usando cortes em intervalos fixos")
+        return None
+    
+    cut_points = choose_cut_points(
+        energy_db, target_sec, SILENCE_TOLERANCE_SECONDS, max_chunk_seconds_for_upload()
+    )
+    print(f"  🔇 [{audio_path.name}] {len(cut_points)} corte(s) alinhado(s) a silêncios")
+    return cut_points
+
+
+def analyze_audio_file(audio_path: Path) -> Tuple[Optional[float], Optional[List[float]]]:
+    """
+    Parte da preparação que roda no processo Python: duração (ffprobe) e
+    planejamento dos cortes (NumPy). Fica no nível do módulo para poder
+    ser executada nos processos do pool.
+    """
+    try:
+        duration = get_audio_duration(audio_path)
+    except Exception:
+        duration = None
+    return duration, plan_chunk_boundaries(audio_path, CHUNK_DURATION_SECONDS)
+
+
+def create_ffmpeg_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    """
+    Pool de processos para a análise de áudio (None se `workers` <= 1).
+    Usa "spawn": o pipeline já tem threads rodando quando o pool é criado.
+    """
+    if workers <= 1:
+        return None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def transcode_audio_file(audio_path: Path, output_dir: Path) -> Tuple[float, int]:
+    """
+    Preparação completa de um arquivo (análise + segmentação), sem chamar a API.
+    Retorna (duração em segundos, número de chunks). Usada no benchmark.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    duration, cut_points = analyze_audio_file(audio_path)
+    chunks = segment_audio_single_pass(audio_path, CHUNK_DURATION_SECONDS, output_dir, cut_points)
+    return duration or 0.0, len(chunks)
+
+
+def benchmark_ffmpeg_workers(audio_files: List[Path], worker_counts: List[int]) -> None:
+    """
+    Mede a vazão da preparação (análise + segmentação) de todos os arquivos
+    para cada quantidade de workers. Os resultados são coletados na ordem dos
+    arquivos (pool.map), então cada rodada produz exatamente os mesmos chunks.
+    """
+    rows = []
+    
+    for workers in worker_counts:
+        bench_dir = Path(tempfile.mkdtemp(prefix="bench_ffmpeg_"))
+        output_dirs = [bench_dir / f"{i:03d}" for i in range(len(audio_files))]
+        started = time.perf_counter()
+        
+        try:
+            pool = create_ffmpeg_pool(workers)
+            if pool is None:
+                results = [transcode_audio_file(f, d) for f, d in zip(audio_files, output_dirs)]
+            else:
+                with pool:
+                    results = list(pool.map(transcode_audio_file, audio_files, output_dirs))
+        finally:
+            shutil.rmtree(bench_dir, ignore_errors=True)
+        
+        elapsed = time.perf_counter() - started
+        audio_minutes = sum(duration for duration, _ in results) / 60
+        rows.append((workers, elapsed, audio_minutes, sum(n for _, n in results)))
+    
+    baseline = rows[0][1] if rows else 0
+    print("\n" + "=" * 60)
+    print("📊 BENCHMARK FFMPEG (análise + segmentação)")
+    print("=" * 60)
+    print(f"   {'workers':>7} | {'tempo (s)':>9} | {'min áudio/s':>11} | {'speedup':>7} | chunks")
+    for workers, elapsed, audio_minutes, n_chunks in rows:
+        print(f"   {workers:>7} | {elapsed:>9.1f} | {audio_minutes / elapsed:>11.2f} | "
+              f"{baseline / elapsed:>6.2f}x | {n_chunks}")
+    print("=" * 60 + "\n")
+
+
 def get_audio_files(folder: Path) -> List[Path]:
     """
     Retorna lista de arquivos de áudio suportados na pasta especificada.
@@ -151,125 +706,390 @@ def get_audio_files(folder: Path) -> List[Path]:
 def transcribe_chunk(chunk_path: Path) -> Optional[str]:
     """
     Envia um chunk para a API Whisper e retorna a transcrição.
+    Chunks já transcritos (mesmo conteúdo, modelo e idioma) vêm do cache em disco,
+    a menos que PIPELINE_SEM_CACHE=1.
     """
     try:
+        cache_key = None
+        if not CACHE_DISABLED:
+            cache_key = transcription_cache.key_for(chunk_path, WHISPER_MODEL, TRANSCRIPTION_LANGUAGE)
+            cached = transcription_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         with open(chunk_path, "rb") as audio_file:
-            response = client.audio.transcriptions.create(
-                model="whisper-1",
+            response = runtime.client.transcrever_audio(
+                model=WHISPER_MODEL,
                 file=audio_file,
                 response_format="text",
-                language="pt"
+                language=TRANSCRIPTION_LANGUAGE
             )
+        
+        if cache_key and response and response.strip():
+            transcription_cache.put(cache_key, response)
         return response
     except Exception as e:
         print(f"    ❌ Erro ao transcrever {chunk_path.name}: {e}")
         return None
 
 
-def transcribe_audio_file(audio_path: Path, output_folder: Path) -> bool:
+# ============================================================
+# 7. PIPELINE DIVISÃO → TRANSCRIÇÃO → GRAVAÇÃO
+# ============================================================
+
+class FileJob:
     """
-    Processa um arquivo de áudio completo.
+    Estado em memória de um arquivo de origem enquanto ele atravessa o pipeline.
     """
-    print(f"\n{'='*60}")
-    print(f"🎧 Processando: {audio_path.name}")
-    print(f"{'='*60}")
-    
-    temp_dir = Path(tempfile.mkdtemp(prefix="transcricao_"))
-    
-    try:
-        # 1. Dividir o áudio em chunks
-        chunks = split_audio_ffmpeg(audio_path, CHUNK_DURATION_SECONDS, temp_dir)
+
+    def __init__(self, audio_path: Path, manifest: JobManifest, output_file: Path):
+        self.audio_path = audio_path
+        self.manifest = manifest
+        self.output_file = output_file
+        self.lock = threading.Lock()
+        self.split_done = False
+        self.split_failed = False
+        self.record_failed = False  # Algum chunk não pôde ser registrado no manifesto
+        self.outstanding = 0  # Chunks enfileirados e ainda não transcritos
+        self.finalized = False
+        self.latencies: List[float] = []
+        self.started = time.perf_counter()
+
+
+class TranscriptionPipeline:
+    """
+    Pipeline produtor/consumidor com filas limitadas entre as etapas.
+
+    - `ffmpeg_workers` threads de divisão rodam o FFmpeg (vários arquivos ao mesmo
+      tempo, cada um no seu processo) e publicam cada chunk na fila assim que ele
+      é fechado; a análise de cada arquivo (ffprobe + NumPy) roda num pool de
+      processos do mesmo tamanho, espalhada pelos núcleos;
+    - `max_in_flight` threads de transcrição consomem essa fila, então o chunk N
+      é transcrito enquanto o N+1 ainda está sendo encodado;
+    - uma thread de gravação monta cada arquivo quando o último chunk termina.
+
+    A fila de chunks é limitada: se a API ficar para trás, a divisão espera.
+    """
+
+    def __init__(
+        self,
+        output_folder: Path,
+        max_in_flight: int = MAX_CONCURRENT_TRANSCRIPTIONS,
+        ffmpeg_workers: int = FFMPEG_WORKERS
+    ):
+        self.output_folder = output_folder
+        self.max_in_flight = max(1, max_in_flight)
+        self.ffmpeg_workers = max(1, ffmpeg_workers)
+        self._analysis_pool: Optional[ProcessPoolExecutor] = None
+        self.chunk_queue: "queue.Queue[Optional[Tuple[FileJob, int, Path]]]" = queue.Queue(
+            maxsize=self.max_in_flight * 2
+        )
+        self.write_queue: "queue.Queue[Optional[FileJob]]" = queue.Queue()
+        self.results: Dict[Path, bool] = {}
+        self._results_lock = threading.Lock()
+
+    def run(self, audio_files: List[Path]) -> Dict[Path, bool]:
+        """
+        Processa todos os arquivos e retorna {arquivo: sucesso}.
+        """
+        file_queue: "queue.Queue[Optional[Path]]" = queue.Queue()
+        for audio_path in audio_files:
+            file_queue.put(audio_path)
         
-        if not chunks:
-            print("  ❌ Nenhum chunk criado!")
-            return False
+        splitters = [
+            threading.Thread(target=self._split_worker, args=(file_queue,), daemon=True)
+            for _ in range(min(self.ffmpeg_workers, len(audio_files)) or 1)
+        ]
+        for _ in splitters:
+            file_queue.put(None)
+        transcribers = [
+            threading.Thread(target=self._transcribe_worker, daemon=True)
+            for _ in range(self.max_in_flight)
+        ]
+        writer = threading.Thread(target=self._write_worker, daemon=True)
         
-        # 2. Transcrever cada chunk
-        transcriptions = []
-        for i, chunk_path in enumerate(chunks, 1):
-            print(f"  🎤 Transcrevendo chunk {i}/{len(chunks)}...", end=" ", flush=True)
-            
-            text = transcribe_chunk(chunk_path)
-            if text:
-                transcriptions.append(text.strip())
-                print("✅")
+        self._analysis_pool = create_ffmpeg_pool(len(splitters))
+        for thread in splitters + transcribers + [writer]:
+            thread.start()
+        
+        for thread in splitters:
+            thread.join()
+        if self._analysis_pool:
+            self._analysis_pool.shutdown()
+        for _ in transcribers:
+            self.chunk_queue.put(None)
+        for thread in transcribers:
+            thread.join()
+        self.write_queue.put(None)
+        writer.join()
+        
+        return {audio_path: self.results.get(audio_path, False) for audio_path in audio_files}
+
+    def _record_result(self, job: FileJob, success: bool) -> None:
+        with self._results_lock:
+            self.results[job.audio_path] = success
+
+    def _enqueue(self, job: FileJob, index: int, chunk_path: Path) -> None:
+        with job.lock:
+            job.outstanding += 1
+        self.chunk_queue.put((job, index, chunk_path))
+
+    def _maybe_finish(self, job: FileJob) -> None:
+        with job.lock:
+            if job.finalized or not job.split_done or job.outstanding:
+                return
+            job.finalized = True
+        self.write_queue.put(job)
+
+    # --------------------------------------------------------
+    # Etapa 1: divisão
+    # --------------------------------------------------------
+    def _split_worker(self, file_queue: "queue.Queue[Optional[Path]]") -> None:
+        while True:
+            audio_path = file_queue.get()
+            if audio_path is None:
+                return
+            self._split(audio_path)
+
+    def _split(self, audio_path: Path) -> None:
+        name = audio_path.name
+        print(f"\n🎧 Processando: {name}")
+        
+        output_file = self.output_folder / f"{audio_path.stem}.txt"
+        manifest = JobManifest(audio_path, WORK_FOLDER)
+        job = FileJob(audio_path, manifest, output_file)
+        
+        if manifest.status == "written" and output_file.exists():
+            print(f"  ⏭️  [{name}] Já transcrito anteriormente: {output_file}")
+            self._record_result(job, True)
+            return
+        
+        try:
+            if manifest.has_chunks():
+                print(f"  ♻️  [{name}] Retomando: {manifest.count('transcribed')}/"
+                      f"{len(manifest.data['chunks'])} chunk(s) já transcritos")
+                for index, chunk_path in manifest.pending_chunks():
+                    self._enqueue(job, index, chunk_path)
             else:
-                transcriptions.append("[ERRO NA TRANSCRIÇÃO DESTE TRECHO]")
-                print("⚠️")
+                # Cortes em silêncios, passada única com entrega contínua; fallback chunk a chunk
+                manifest.start_split()
+                if self._analysis_pool:
+                    duration, cut_points = self._analysis_pool.submit(analyze_audio_file, audio_path).result()
+                else:
+                    duration, cut_points = analyze_audio_file(audio_path)
+                if duration:
+                    print(f"  ⏱️  [{name}] Duração total: {duration / 60:.1f} minutos")
+                
+                try:
+                    for chunk_path in stream_audio_segments(
+                        audio_path, CHUNK_DURATION_SECONDS, manifest.work_dir, cut_points
+                    ):
+                        self._enqueue(job, manifest.add_chunk(chunk_path), chunk_path)
+                except RuntimeError as e:
+                    if manifest.data["chunks"]:
+                        raise
+                    print(f"  ⚠️ [{name}] Erro na segmentação ({e}); dividindo chunk a chunk")
+                    for chunk_path in split_audio_ffmpeg(audio_path, CHUNK_DURATION_SECONDS, manifest.work_dir):
+                        self._enqueue(job, manifest.add_chunk(chunk_path), chunk_path)
+                
+                if manifest.data["chunks"]:
+                    manifest.finish_split()
+                    print(f"  ✂️  [{name}] Dividido em {len(manifest.data['chunks'])} chunk(s)")
+                else:
+                    print(f"  ❌ [{name}] Nenhum chunk criado!")
+                    job.split_failed = True
+        
+        except Exception as e:
+            print(f"\n  ❌ [{name}] Erro fatal na divisão: {e}")
+            import traceback
+            traceback.print_exc()
+            job.split_failed = True
+        
+        finally:
+            with job.lock:
+                job.split_done = True
+            self._maybe_finish(job)
+
+    # --------------------------------------------------------
+    # Etapa 2: transcrição
+    # --------------------------------------------------------
+    def _transcribe_worker(self) -> None:
+        while True:
+            item = self.chunk_queue.get()
+            if item is None:
+                return
+            job, index, chunk_path = item
+            
+            started = time.perf_counter()
+            latency = 0.0
+            try:
+                text = transcribe_chunk(chunk_path)
+                latency = time.perf_counter() - started
+                
+                job.manifest.record_chunk(index, text, latency)
+                status = "✅" if text else "⚠️"
+                print(f"  🎤 [{job.audio_path.name}] Chunk {index + 1} {status} ({latency:.1f}s)")
+            except Exception as e:
+                print(f"  ❌ [{job.audio_path.name}] Erro ao registrar chunk {index + 1}: {e}")
+                with job.lock:
+                    job.record_failed = True
+            finally:
+                # Sempre libera o chunk: senão o arquivo nunca é finalizado e o pipeline trava
+                with job.lock:
+                    job.outstanding -= 1
+                    job.latencies.append(latency)
+                self._maybe_finish(job)
+
+    # --------------------------------------------------------
+    # Etapa 3: gravação
+    # --------------------------------------------------------
+    def _write_worker(self) -> None:
+        while True:
+            job = self.write_queue.get()
+            if job is None:
+                return
+            try:
+                self._record_result(job, self._write(job))
+            except Exception as e:
+                print(f"\n  ❌ [{job.audio_path.name}] Erro ao gravar: {e}")
+                self._record_result(job, False)
+
+    def _write(self, job: FileJob) -> bool:
+        name = job.audio_path.name
+        manifest = job.manifest
         
-        # 3. Concatenar transcrições
-        full_transcription = "\n\n".join(transcriptions)
+        if job.latencies:
+            wall_time = time.perf_counter() - job.started
+            print(f"  ⏱️  [{name}] Tempo total: {wall_time:.1f}s "
+                  f"(soma das latências: {sum(job.latencies):.1f}s, "
+                  f"chunk mais lento: {max(job.latencies):.1f}s)")
+        
+        if job.split_failed:
+            print(f"  💾 [{name}] Progresso mantido em: {manifest.work_dir}")
+            return False
         
-        # 4. Salvar resultado
-        output_folder.mkdir(parents=True, exist_ok=True)
-        output_file = output_folder / f"{audio_path.stem}.txt"
+        if job.record_failed:
+            manifest.set_status("failed")
+            print(f"  ❌ [{name}] Falha ao registrar chunk(s). "
+                  f"Progresso salvo: execute novamente para repetir só os pendentes.")
+            return False
+        
+        failed = manifest.count("failed")
+        if failed:
+            manifest.set_status("failed")
+            print(f"  ❌ [{name}] {failed} chunk(s) falharam. "
+                  f"Progresso salvo: execute novamente para repetir só esses.")
+            return False
         
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(f"# Transcrição: {audio_path.name}\n")
-            f.write(f"# Chunks processados: {len(chunks)}\n")
+        manifest.set_status("transcribed")
+        
+        # Concatenar e salvar
+        full_transcription = "\n\n".join(manifest.texts())
+        self.output_folder.mkdir(parents=True, exist_ok=True)
+        
+        with open(job.output_file, "w", encoding="utf-8") as f:
+            f.write(f"# Transcrição: {name}\n")
+            f.write(f"# Chunks processados: {len(manifest.data['chunks'])}\n")
             f.write("=" * 60 + "\n\n")
             f.write(full_transcription)
         
-        print(f"\n  💾 Salvo em: {output_file}")
-        return True
+        manifest.set_status("written")
+        print(f"\n  💾 [{name}] Salvo em: {job.output_file}")
         
-    except Exception as e:
-        print(f"\n  ❌ Erro fatal ao processar {audio_path.name}: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
-        
-    finally:
-        # 5. Limpeza
-        try:
-            shutil.rmtree(temp_dir)
-            print(f"  🧹 Chunks temporários removidos")
-        except Exception as e:
-            print(f"  ⚠️ Aviso: Não foi possível limpar temp: {e}")
+        # Limpeza (só depois de gravar; em caso de falha os chunks ficam para a retomada)
+        manifest.discard_audio()
+        return True
+
+
+def transcribe_audio_file(
+    audio_path: Path,
+    output_folder: Path,
+    max_in_flight: int = MAX_CONCURRENT_TRANSCRIPTIONS
+) -> bool:
+    """
+    Processa um único arquivo de áudio pelo pipeline.
+
+    O progresso fica no manifesto em WORK_FOLDER: numa nova execução, chunks já
+    transcritos são reaproveitados e só os que falharam são enviados de novo.
+    """
+    pipeline = TranscriptionPipeline(output_folder, max_in_flight, ffmpeg_workers=1)
+    return pipeline.run([audio_path])[audio_path]
+
 
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Lê as opções de linha de comando.
+    """
+    parser = argparse.ArgumentParser(description="Transcritor de áudio em lote (OpenAI Whisper)")
+    parser.add_argument("--input", type=Path, default=VIDEOS_FOLDER,
+                        help=f"Pasta com os áudios (padrão: {VIDEOS_FOLDER})")
+    parser.add_argument("--output", type=Path, default=OUTPUT_FOLDER,
+                        help=f"Pasta das transcrições (padrão: {OUTPUT_FOLDER})")
+    parser.add_argument("--max-concurrent", type=int, default=MAX_CONCURRENT_TRANSCRIPTIONS,
+                        help="Chamadas simultâneas à API Whisper (todas as faixas somadas)")
+    parser.add_argument("--ffmpeg-workers", type=int, default=FFMPEG_WORKERS,
+                        help="Arquivos no FFmpeg ao mesmo tempo (análise em processos separados)")
+    parser.add_argument("--benchmark-ffmpeg", metavar="N,N,...",
+                        help="Mede a vazão da preparação de áudio para cada número de workers e sai")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Apenas lista os arquivos e o estado de cada um (sem FFmpeg nem API)")
+    return parser.parse_args(argv)
 
-def main():
+
+def main(argv: Optional[List[str]] = None):
     """
     Função principal.
     """
+    args = parse_args(argv)
+    
     print("\n" + "=" * 60)
     print("🎙️  TRANSCRITOR DE ÁUDIO EM LOTE - OpenAI Whisper")
     print("    (Compatível com Python 3.13+)")
     print("=" * 60)
     
-    audio_files = get_audio_files(VIDEOS_FOLDER)
+    audio_files = get_audio_files(args.input)
     
     if not audio_files:
-        print(f"\n❌ Nenhum arquivo de áudio encontrado em '{VIDEOS_FOLDER}'")
+        print(f"\n❌ Nenhum arquivo de áudio encontrado em '{args.input}'")
         print(f"   Extensões suportadas: {', '.join(SUPPORTED_EXTENSIONS)}")
         return
     
-    print(f"\n📁 Pasta de entrada: {VIDEOS_FOLDER.absolute()}")
-    print(f"📁 Pasta de saída: {OUTPUT_FOLDER.absolute()}")
+    print(f"\n📁 Pasta de entrada: {args.input.absolute()}")
+    print(f"📁 Pasta de saída: {args.output.absolute()}")
     print(f"\n🔍 Encontrados {len(audio_files)} arquivo(s):")
     for f in audio_files:
         size_mb = f.stat().st_size / (1024 * 1024)
-        print(f"   • {f.name} ({size_mb:.1f} MB)")
+        print(f"   • {f.name} ({size_mb:.1f} MB) [{JobManifest.peek_status(f, WORK_FOLDER)}]")
     
-    success_count = 0
-    fail_count = 0
+    if args.dry_run:
+        print("\n🔎 Dry run: nenhum arquivo foi processado.")
+        return
     
-    for audio_file in audio_files:
-        try:
-            if transcribe_audio_file(audio_file, OUTPUT_FOLDER):
-                success_count += 1
-            else:
-                fail_count += 1
-        except Exception as e:
-            print(f"\n❌ Erro inesperado em {audio_file.name}: {e}")
-            fail_count += 1
+    if args.benchmark_ffmpeg:
+        worker_counts = [int(n) for n in args.benchmark_ffmpeg.split(",") if n.strip()]
+        benchmark_ffmpeg_workers(audio_files, worker_counts)
+        return
+    
+    # Resolve FFmpeg e cliente antes de abrir as threads (falha cedo, prompt da chave no terminal)
+    try:
+        runtime.ffmpeg_path
+        runtime.client
+    except RuntimeError as e:
+        print(f"❌ {e}. Encerrando.")
+        sys.exit(1)
+    
+    pipeline = TranscriptionPipeline(args.output, args.max_concurrent, args.ffmpeg_workers)
+    results = pipeline.run(audio_files)
+    
+    success_count = sum(1 for ok in results.values() if ok)
+    fail_count = len(results) - success_count
     
     print("\n" + "=" * 60)
     print("📊 RESUMO FINAL")
     print("=" * 60)
     print(f"   ✅ Sucesso: {success_count}")
     print(f"   ❌ Falhas:  {fail_count}")
-    print(f"   📁 Transcrições salvas em: {OUTPUT_FOLDER.absolute()}")
+    print(f"   📁 Transcrições salvas em: {args.output.absolute()}")
     print("=" * 60 + "\n")
 
 